@@ -0,0 +1,207 @@
+import math
+import time
+from dataclasses import dataclass
+from app.cache import redis, aredis
+from app.config import settings
+from app.worker import IO_QUEUE, INFERENCE_QUEUE, queue_keys
+
+ADMISSION_PREFIX = "admission"
+# Stages on the path of every annotation, in the order they are reported
+STAGES = (IO_QUEUE, INFERENCE_QUEUE)
+RUNTIME_SAMPLES = 100
+
+# Refills the bucket for the time since its last request, then takes `cost` tokens if it
+# has them. Redis' own clock is used, so every API process sees the same bucket state.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+token_bucket = aredis.register_script(TOKEN_BUCKET_SCRIPT)
+
+
+def _in_flight_key(queue: str) -> str:
+    return f"{ADMISSION_PREFIX}:inflight:{queue}"
+
+
+def _runtime_key(queue: str) -> str:
+    return f"{ADMISSION_PREFIX}:runtime:{queue}"
+
+
+def _bucket_key(client: str) -> str:
+    return f"{ADMISSION_PREFIX}:bucket:{client}"
+
+
+def task_started(queue: str, task_id: str) -> None:
+    """Marks a task of `queue` as running; called from the worker's task_prerun signal."""
+    redis.zadd(_in_flight_key(queue), {task_id: time.time()})
+
+
+def task_finished(queue: str, task_id: str, runtime: float) -> None:
+    """Clears a running task and records its runtime; called from the worker's task_postrun signal."""
+    pipe = redis.pipeline(transaction=False)
+    pipe.zrem(_in_flight_key(queue), task_id)
+    pipe.lpush(_runtime_key(queue), f"{runtime:.4f}")
+    pipe.ltrim(_runtime_key(queue), 0, RUNTIME_SAMPLES - 1)
+    pipe.execute()
+
+
+@dataclass
+class StageLoad:
+    queue: str
+    depth: int
+    in_flight: int
+    avg_runtime: float
+
+    def drain_seconds(self, items: int) -> float:
+        """
+        Estimates how long the running workers need to work off `items` queued tasks.
+        While messages are queued every worker slot is busy, so the slots in use are the
+        stage's capacity, and each processes one task per `avg_runtime` seconds.
+        """
+        return max(items, 0) * self.avg_runtime / max(self.in_flight, 1)
+
+    @property
+    def estimated_wait(self) -> float:
+        return self.drain_seconds(self.depth)
+
+
+def is_saturated(load: list[StageLoad], wait: float) -> bool:
+    return wait > settings.ADMISSION_MAX_WAIT_SECONDS or any(
+        stage.depth > settings.ADMISSION_MAX_QUEUE_DEPTH for stage in load
+    )
+
+
+@dataclass
+class Admission:
+    admitted: bool
+    estimated_wait: float
+    reason: str | None = None
+    retry_after: float = 0.0
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class AdmissionController:
+    """
+    Decides whether a new annotation job is accepted.
+    The load of every stage is read from Redis: the messages waiting in its queue (all
+    priority lists), the tasks its workers are running, and the mean runtime of its
+    last RUNTIME_SAMPLES tasks. Their estimated queueing delay adds up to the wait of a
+    new job. A job is refused when that wait exceeds ADMISSION_MAX_WAIT_SECONDS, when a
+    queue holds more than ADMISSION_MAX_QUEUE_DEPTH messages, or when its client has run
+    out of tokens (ADMISSION_RATE_PER_SECOND, ADMISSION_BURST). The load is read at most
+    once per ADMISSION_REFRESH_MS per process, so admission costs one round trip per
+    request for the token bucket.
+    Messages already prefetched by a worker are not counted; keep the inference prefetch
+    multiplier low for an accurate estimate.
+    """
+
+    def __init__(self):
+        self._load: list[StageLoad] = []
+        self._loaded_at = 0.0
+
+    async def load(self) -> list[StageLoad]:
+        """Returns the current load of every stage, refreshed at most once per ADMISSION_REFRESH_MS."""
+        if time.monotonic() - self._loaded_at < settings.ADMISSION_REFRESH_MS / 1000:
+            return self._load
+        stale = time.time() - settings.ADMISSION_IN_FLIGHT_TIMEOUT_SECONDS
+        pipe = aredis.pipeline(transaction=False)
+        for queue in STAGES:
+            for key in queue_keys(queue):
+                pipe.llen(key)
+            # Tasks of killed workers never finish, so forget marks older than the timeout
+            pipe.zremrangebyscore(_in_flight_key(queue), "-inf", stale)
+            pipe.zcard(_in_flight_key(queue))
+            pipe.lrange(_runtime_key(queue), 0, -1)
+        replies = iter(await pipe.execute())
+
+        load = []
+        for queue in STAGES:
+            depth = sum(next(replies) for _ in queue_keys(queue))
+            next(replies)
+            in_flight = next(replies)
+            runtimes = [float(sample) for sample in next(replies)]
+            avg_runtime = sum(runtimes) / len(runtimes) if runtimes else 0.0
+            load.append(StageLoad(queue, depth, in_flight, avg_runtime))
+        self._load, self._loaded_at = load, time.monotonic()
+        return load
+
+    async def admit(self, client: str, cost: int = 1) -> Admission:
+        """
+        Admits or refuses a job of `client`.
+        Args:
+            client (str): Identity the rate limit applies to, e.g. the client address
+            cost (int, optional): Number of tokens the job takes
+        Returns:
+            Admission: The decision; refused jobs carry the `reason` ("saturated" or
+            "rate_limited") and the seconds after which a retry may be admitted
+        """
+
+        if not settings.ADMISSION_ENABLED:
+            return Admission(admitted=True, estimated_wait=0.0)
+        load = await self.load()
+        wait = sum(stage.estimated_wait for stage in load)
+        if is_saturated(load, wait):
+            # Time until the backlog is back under both limits
+            retry_after = wait - settings.ADMISSION_MAX_WAIT_SECONDS
+            for stage in load:
+                retry_after = max(retry_after, stage.drain_seconds(stage.depth - settings.ADMISSION_MAX_QUEUE_DEPTH))
+            return Admission(admitted=False, estimated_wait=wait, reason="saturated", retry_after=retry_after)
+
+        if settings.ADMISSION_RATE_PER_SECOND > 0:
+            allowed, refill = await token_bucket(
+                keys=[_bucket_key(client)],
+                args=[settings.ADMISSION_RATE_PER_SECOND, settings.ADMISSION_BURST, cost],
+            )
+            if not allowed:
+                return Admission(admitted=False, estimated_wait=wait, reason="rate_limited", retry_after=float(refill))
+        return Admission(admitted=True, estimated_wait=wait)
+
+    async def stats(self) -> dict:
+        """
+        Returns the load of every stage and the resulting estimate.
+        Returns:
+            dict: Dictionary containing:
+                - stages: depth, in_flight, avg_runtime and estimated_wait per queue
+                - estimated_wait: Estimated queueing delay of a new job, in seconds
+                - saturated: Whether new jobs are currently refused
+        """
+
+        load = await self.load()
+        wait = sum(stage.estimated_wait for stage in load)
+        return {
+            "stages": {
+                stage.queue: {
+                    "depth": stage.depth,
+                    "in_flight": stage.in_flight,
+                    "avg_runtime": stage.avg_runtime,
+                    "estimated_wait": stage.estimated_wait,
+                }
+                for stage in load
+            },
+            "estimated_wait": wait,
+            "saturated": is_saturated(load, wait),
+        }
+
+
+admission = AdmissionController()
\ No newline at end of file
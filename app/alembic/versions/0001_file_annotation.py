@@ -0,0 +1,36 @@
+"""Create the file annotation table
+
+The table as the first release created it with `SQLModel.metadata.create_all`. Databases
+created that way already have it, and are adopted by this revision as they are.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+revision: str = "0001"
+down_revision: str | None = None
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("fileannotation"):
+        return
+    op.create_table(
+        "fileannotation",
+        sa.Column("task_id", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("file_url", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("annotation", sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        sa.PrimaryKeyConstraint("task_id"),
+        sa.UniqueConstraint("task_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("fileannotation")
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""Track batches, images, near-duplicate hashes and the status of file annotations
+
+Pending rows are inserted before their upload is stored, so file_url becomes nullable.
+Rows written before the status column existed all hold a finished annotation and are
+marked completed.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from alembic import op
+
+revision: str = "0002"
+down_revision: str | None = "0001"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+COLUMNS = [
+    ("batch_id", sqlmodel.sql.sqltypes.AutoString()),
+    ("image_id", sqlmodel.sql.sqltypes.AutoString()),
+    ("phash", sa.BigInteger()),
+    ("prompt", sqlmodel.sql.sqltypes.AutoString()),
+    ("model", sqlmodel.sql.sqltypes.AutoString()),
+    ("status", sqlmodel.sql.sqltypes.AutoString()),
+    ("error", sqlmodel.sql.sqltypes.AutoString()),
+]
+INDEXED = ["batch_id", "image_id", "status"]
+
+
+def upgrade() -> None:
+    # Databases created by `create_all` while these columns were being added have some of them already
+    inspector = sa.inspect(op.get_bind())
+    existing = {column["name"] for column in inspector.get_columns("fileannotation")}
+    indexes = {index["name"] for index in inspector.get_indexes("fileannotation")}
+    with op.batch_alter_table("fileannotation") as batch:
+        batch.alter_column("file_url", existing_type=sqlmodel.sql.sqltypes.AutoString(), nullable=True)
+        for name, type_ in COLUMNS:
+            if name not in existing:
+                batch.add_column(sa.Column(name, type_, nullable=True))
+    for name in INDEXED:
+        if f"ix_fileannotation_{name}" not in indexes:
+            op.create_index(f"ix_fileannotation_{name}", "fileannotation", [name])
+    op.execute("UPDATE fileannotation SET status = 'completed' WHERE status IS NULL AND annotation IS NOT NULL")
+
+
+def downgrade() -> None:
+    for name in INDEXED:
+        op.drop_index(f"ix_fileannotation_{name}", table_name="fileannotation")
+    op.execute("DELETE FROM fileannotation WHERE file_url IS NULL")
+    with op.batch_alter_table("fileannotation") as batch:
+        for name, _ in reversed(COLUMNS):
+            batch.drop_column(name)
+        batch.alter_column("file_url", existing_type=sqlmodel.sql.sqltypes.AutoString(), nullable=False)
\ No newline at end of file
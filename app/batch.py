@@ -0,0 +1,125 @@
+import os
+import tarfile
+import zipfile
+from collections.abc import Iterable, Iterator
+from typing import BinaryIO
+from app.cache import redis
+from app.config import settings
+
+BATCH_PREFIX = "batch"
+
+# Leading bytes of the archives accepted by /annotate/batch; tar is also recognized by
+# the "ustar" magic at offset 257, and may be compressed with gzip, bzip2 or xz
+ZIP_SIGNATURE = b"PK\x03\x04"
+COMPRESSED_TAR_SIGNATURES = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00")
+TAR_MAGIC_OFFSET = 257
+
+
+def archive_kind(fileobj: BinaryIO) -> str | None:
+    """
+    Detects whether an uploaded file is a zip or tar archive from its magic bytes.
+    Args:
+        fileobj (BinaryIO): The uploaded file, positioned at its start
+    Returns:
+        str | None: "zip", "tar" or None for anything else; the file is rewound either way
+    """
+
+    head = fileobj.read(TAR_MAGIC_OFFSET + 8)
+    fileobj.seek(0)
+    if head.startswith(ZIP_SIGNATURE):
+        return "zip"
+    if head.startswith(COMPRESSED_TAR_SIGNATURES) or head[TAR_MAGIC_OFFSET:].startswith(b"ustar"):
+        return "tar"
+    return None
+
+
+def _is_hidden(name: str) -> bool:
+    # Skips OS metadata such as __MACOSX/ folders and ._ resource forks
+    return any(part.startswith((".", "__MACOSX")) for part in name.split("/"))
+
+
+def iter_archive_entries(fileobj: BinaryIO, kind: str) -> Iterator[tuple[str, BinaryIO]]:
+    """
+    Streams the regular files out of a zip or tar archive without extracting it to disk.
+    Each entry is decompressed while it is read, and a tar archive is read as a stream
+    in a single pass, so an entry must be fully consumed before the next one is requested.
+    Args:
+        fileobj (BinaryIO): The archive
+        kind (str): "zip" or "tar", see `archive_kind`
+    Yields:
+        tuple[str, BinaryIO]: The base name of the entry and a file object over its content
+    """
+
+    if kind == "zip":
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_hidden(info.filename):
+                    continue
+                with archive.open(info) as entry:
+                    yield os.path.basename(info.filename), entry  # type: ignore[misc]
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile() or _is_hidden(member.name):
+                    continue
+                entry = archive.extractfile(member)
+                if entry is not None:
+                    yield os.path.basename(member.name), entry  # type: ignore[misc]
+
+
+def iter_batch_entries(files: Iterable[tuple[str, BinaryIO]]) -> Iterator[tuple[str, BinaryIO]]:
+    """
+    Yields the images of a batch upload, expanding any zip or tar archive among the files.
+    Args:
+        files (Iterable[tuple[str, BinaryIO]]): Name and content of every uploaded file
+    Yields:
+        tuple[str, BinaryIO]: Name and content of every image to annotate
+    """
+
+    for filename, fileobj in files:
+        kind = archive_kind(fileobj)
+        if kind is None:
+            yield filename, fileobj
+        else:
+            yield from iter_archive_entries(fileobj, kind)
+
+
+def batch_key(batch_id: str) -> str:
+    return f"{BATCH_PREFIX}:{batch_id}"
+
+
+def start_batch_progress(batch_id: str, total: int, email: str = "") -> None:
+    """
+    Creates the progress counters of a batch.
+    Args:
+        batch_id (str): ID of the batch
+        total (int): Number of items in the batch
+        email (str, optional): Address notified once every item has finished
+    """
+
+    pipe = redis.pipeline()
+    pipe.hset(batch_key(batch_id), mapping={"total": total, "completed": 0, "failed": 0, "email": email})
+    pipe.expire(batch_key(batch_id), settings.BATCH_PROGRESS_TTL_SECONDS)
+    pipe.execute()
+
+
+def record_batch_item(batch_id: str, failed: bool = False) -> str | None:
+    """
+    Counts a finished batch item.
+    The increment and the read run in one MULTI/EXEC, so exactly one caller, the one
+    that finishes the last item, sees the batch as complete.
+    Args:
+        batch_id (str): ID of the batch
+        failed (bool, optional): Whether the item failed. Defaults to False
+    Returns:
+        str | None: The notification address ("" if none) when this call completed the
+        batch, None otherwise
+    """
+
+    pipe = redis.pipeline()
+    pipe.hincrby(batch_key(batch_id), "failed" if failed else "completed", 1)
+    pipe.hmget(batch_key(batch_id), "total", "completed", "failed", "email")
+    _, (total, completed, failed_count, email) = pipe.execute()
+    if total is None or int(completed) + int(failed_count) != int(total):
+        return None
+    return email.decode("utf-8") if email else ""
@@ -0,0 +1,126 @@
+import os
+import mmap
+import time
+import uuid
+import shutil
+from contextlib import contextmanager
+from typing import BinaryIO, Iterator, Union
+from app.cache import redis
+from app.config import settings
+from app.logging import logger
+
+BlobData = Union[bytes, mmap.mmap]
+
+SPOOL_SCHEME = "spool"
+REDIS_SCHEME = "redis"
+BLOB_PREFIX = "blob"
+
+
+def _spool_path(blob_id: str) -> str:
+    return os.path.join(settings.BLOB_SPOOL_DIR, blob_id)
+
+
+def stage_blob(data: Union[bytes, bytearray, memoryview, BinaryIO]) -> str:
+    """
+    Writes upload content to the staging area and returns a reference to it.
+    The reference is a short string (e.g. `spool:3f0c...`) that is passed down the
+    Celery chain instead of the bytes themselves. The backend is chosen by
+    `BLOB_BACKEND`: a spool directory shared by the API and the workers, or a Redis
+    key that expires after `BLOB_TTL_SECONDS`. File objects are copied to the spool
+    directory in chunks, from their current position, without loading them into memory.
+    Args:
+        data (bytes | bytearray | memoryview | BinaryIO): The binary content to stage
+    Returns:
+        str: Blob reference to be resolved with `open_blob`
+    Raises:
+        ValueError: If `BLOB_BACKEND` is not a supported backend
+    """
+
+    blob_id = uuid.uuid4().hex
+    if settings.BLOB_BACKEND == REDIS_SCHEME:
+        payload = data.read() if hasattr(data, "read") else bytes(data)  # type: ignore[union-attr, arg-type]
+        redis.set(f"{BLOB_PREFIX}:{blob_id}", payload, ex=settings.BLOB_TTL_SECONDS)
+    elif settings.BLOB_BACKEND == SPOOL_SCHEME:
+        os.makedirs(settings.BLOB_SPOOL_DIR, exist_ok=True)
+        path = _spool_path(blob_id)
+        # Write to a temporary name first so readers never see a partial file
+        with open(f"{path}.part", "wb") as f:
+            if hasattr(data, "read"):
+                shutil.copyfileobj(data, f)  # type: ignore[arg-type]
+            else:
+                f.write(data)  # type: ignore[arg-type]
+        os.replace(f"{path}.part", path)
+    else:
+        raise ValueError(f"Unsupported blob backend: {settings.BLOB_BACKEND}")
+    return f"{settings.BLOB_BACKEND}:{blob_id}"
+
+
+@contextmanager
+def open_blob(ref: str) -> Iterator[BlobData]:
+    """
+    Resolves a blob reference to its bytes.
+    Spooled blobs are memory-mapped read-only, so workers do not copy the file into
+    the heap; the mapping is closed when the context exits.
+    Args:
+        ref (str): Blob reference returned by `stage_blob`
+    Yields:
+        bytes | mmap.mmap: The staged content
+    Raises:
+        FileNotFoundError: If the blob was already discarded or has expired
+    """
+
+    scheme, _, blob_id = ref.partition(":")
+    if scheme == REDIS_SCHEME:
+        data = redis.get(f"{BLOB_PREFIX}:{blob_id}")
+        if data is None:
+            raise FileNotFoundError(f"Blob {ref} not found")
+        yield data
+    elif scheme == SPOOL_SCHEME:
+        with open(_spool_path(blob_id), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    else:
+        raise ValueError(f"Unsupported blob reference: {ref}")
+
+
+def discard_blob(ref: str) -> None:
+    """Deletes a staged blob. Discarding an unknown blob is a no-op."""
+    scheme, _, blob_id = ref.partition(":")
+    if scheme == REDIS_SCHEME:
+        redis.delete(f"{BLOB_PREFIX}:{blob_id}")
+    elif scheme == SPOOL_SCHEME:
+        try:
+            os.remove(_spool_path(blob_id))
+        except FileNotFoundError:
+            pass
+
+
+def sweep_spool(max_age: int | None = None) -> int:
+    """
+    Removes spooled blobs older than `max_age` seconds.
+    Blobs are normally discarded when their chain finishes or fails; this catches the
+    ones left behind when a worker was killed mid-chain.
+    Args:
+        max_age (int, optional): Age threshold in seconds. Defaults to `BLOB_TTL_SECONDS`
+    Returns:
+        int: Number of files removed
+    """
+
+    if not os.path.isdir(settings.BLOB_SPOOL_DIR):
+        return 0
+    cutoff = time.time() - (max_age if max_age is not None else settings.BLOB_TTL_SECONDS)
+    removed = 0
+    with os.scandir(settings.BLOB_SPOOL_DIR) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        logger.info(f"Swept {removed} stale blobs from {settings.BLOB_SPOOL_DIR}")
+    return removed
\ No newline at end of file
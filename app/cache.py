@@ -0,0 +1,163 @@
+import json
+import time
+import hashlib
+from typing import Any
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from app.config import settings
+from app.logging import logger
+
+redis = Redis.from_url(settings.REDIS_URL)
+# Used by the API routes, so cache lookups do not block the event loop
+aredis = AsyncRedis.from_url(settings.REDIS_URL)
+
+DEDUP_PREFIX = "dedup"
+DEDUP_INDEX_KEY = f"{DEDUP_PREFIX}:index"
+DEDUP_HITS_KEY = f"{DEDUP_PREFIX}:hits"
+DEDUP_MISSES_KEY = f"{DEDUP_PREFIX}:misses"
+
+RESULT_PREFIX = "result"
+# Stored in place of a body while a task has no FileAnnotation yet
+RESULT_PENDING = b""
+
+
+def dedup_key(digest: str, prompt: str, model: str) -> str:
+    """
+    Builds the dedup index key for an upload.
+    The key covers the content digest together with the prompt and model name, so the
+    same image annotated with a different prompt or model is treated as a new job.
+    Args:
+        digest (str): SHA-256 hex digest of the uploaded bytes
+        prompt (str): The prompt used for annotation
+        model (str): The VLM model name
+    Returns:
+        str: Redis key under which the owning task id is stored
+    """
+
+    material = "\0".join((model, prompt, digest)).encode("utf-8")
+    return f"{DEDUP_PREFIX}:{hashlib.sha256(material).hexdigest()}"
+
+
+def claim_dedup_entry(key: str, task_id: str) -> str | None:
+    """
+    Looks up a dedup key and claims it for a new task on a miss.
+    The claim is a single `SET NX`, so concurrent requests for the same key agree on
+    one owner: the first request starts the chain and every later request gets the
+    owner's task id back, whether that job has completed or is still in flight.
+    Entries expire after `DEDUP_TTL_SECONDS`, and the oldest entries are evicted once
+    the index grows past `DEDUP_MAX_ENTRIES`.
+    Args:
+        key (str): Dedup key built with `dedup_key`
+        task_id (str): Task id to register if the key is not claimed yet
+    Returns:
+        str | None: The existing task id on a hit, None if `task_id` now owns the key
+    """
+
+    while True:
+        if redis.set(key, task_id, nx=True, ex=settings.DEDUP_TTL_SECONDS):
+            now = time.time()
+            pipe = redis.pipeline()
+            pipe.incr(DEDUP_MISSES_KEY)
+            pipe.zremrangebyscore(DEDUP_INDEX_KEY, 0, now - settings.DEDUP_TTL_SECONDS)
+            pipe.zadd(DEDUP_INDEX_KEY, {key: now})
+            pipe.zcard(DEDUP_INDEX_KEY)
+            size = pipe.execute()[-1]
+            if size > settings.DEDUP_MAX_ENTRIES:
+                _evict_oldest(size - settings.DEDUP_MAX_ENTRIES)
+            return None
+
+        existing = redis.get(key)
+        if existing is not None:
+            redis.incr(DEDUP_HITS_KEY)
+            return existing.decode("utf-8")
+        # The entry expired between SET NX and GET, try to claim it again
+
+
+def _evict_oldest(count: int) -> None:
+    """Drops the `count` oldest entries from the dedup index."""
+    evicted = redis.zpopmin(DEDUP_INDEX_KEY, count)
+    if evicted:
+        redis.delete(*[key for key, _ in evicted])
+        logger.info(f"Evicted {len(evicted)} dedup entries")
+
+
+def release_dedup_entry(key: str) -> None:
+    """Removes a dedup entry, e.g. when its annotation chain failed."""
+    pipe = redis.pipeline()
+    pipe.delete(key)
+    pipe.zrem(DEDUP_INDEX_KEY, key)
+    pipe.execute()
+
+
+def dedup_stats() -> dict[str, float | int]:
+    """
+    Returns the dedup cache counters.
+    Returns:
+        dict[str, float | int]: Dictionary containing:
+            - hits: Number of uploads resolved to an existing task
+            - misses: Number of uploads that started a new chain
+            - hit_rate: hits / (hits + misses), 0.0 before any lookup
+            - entries: Number of keys currently held in the index
+    """
+
+    hits, misses, entries = redis.pipeline().get(DEDUP_HITS_KEY).get(DEDUP_MISSES_KEY).zcard(DEDUP_INDEX_KEY).execute()
+    hits, misses = int(hits or 0), int(misses or 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else 0.0,
+        "entries": entries,
+    }
+
+
+def result_cache_key(task_id: str) -> str:
+    return f"{RESULT_PREFIX}:{task_id}"
+
+
+def encode_result(payload: dict[str, Any]) -> bytes:
+    """Serializes a result the way it is cached and served by `/api/results/{id}`."""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def cache_result(task_id: str, payload: dict[str, Any]) -> None:
+    """
+    Stores the result of a task in the result cache, replacing any pending marker.
+    Called by the workers right after the FileAnnotation is written, so readers switch
+    from the pending marker to the stored result without waiting for a TTL to expire.
+    Args:
+        task_id (str): ID of the task
+        payload (dict[str, Any]): The response body, i.e. annotation and file_url
+    """
+
+    redis.set(result_cache_key(task_id), encode_result(payload), ex=settings.RESULT_CACHE_TTL_SECONDS)
+
+
+async def aget_cached_result(task_id: str) -> bytes | None:
+    """
+    Looks up a task in the result cache.
+    Returns:
+        bytes | None: The cached body, `RESULT_PENDING` if the task was recently seen
+        without a result, or None on a miss
+    """
+
+    return await aredis.get(result_cache_key(task_id))
+
+
+async def afill_result_cache(task_id: str, body: bytes | None) -> None:
+    """
+    Fills the result cache after a database read.
+    A stored result is kept for `RESULT_CACHE_TTL_SECONDS`, a missing one is remembered
+    as pending for `RESULT_CACHE_PENDING_TTL_SECONDS`. The write is NX, so a result that
+    a worker cached after the database read is never overwritten with an older view.
+    Args:
+        task_id (str): ID of the task
+        body (bytes | None): The encoded result, or None if there is no FileAnnotation yet
+    """
+
+    if body is None:
+        await aredis.set(
+            result_cache_key(task_id), RESULT_PENDING, nx=True, ex=settings.RESULT_CACHE_PENDING_TTL_SECONDS
+        )
+    else:
+        await aredis.set(result_cache_key(task_id), body, nx=True, ex=settings.RESULT_CACHE_TTL_SECONDS)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import time
+from celery import Celery, Signature
+from celery.signals import before_task_publish
+from app.config import settings
+from app.worker import IO_QUEUE, INFERENCE_QUEUE, NOTIFY_QUEUE, PRIORITY_STEPS, PRIORITY_SEP
+
+# The API only enqueues work, so it talks to the broker through this app, which knows the task
+# names, queues and broker options but none of the task code: importing it leaves out the
+# worker side (LangChain, the Ollama pool, Cloudinary, SMTP). Workers register app/tasks.py on it.
+
+# Task names, as registered by app/tasks.py
+UPLOAD_TASK = "app.tasks.upload_to_cloudinary_task"
+INVOKE_LLM_TASK = "app.tasks.invoke_llm"
+DB_COMMIT_TASK = "app.tasks.db_commit_file_annotation"
+DISCARD_BLOB_TASK = "app.tasks.discard_blob_task"
+FLOW_FAILED_TASK = "app.tasks.annotation_flow_failed"
+SEND_EMAIL_TASK = "app.tasks.send_email_task"
+FLUSH_NOTIFICATIONS_TASK = "app.tasks.flush_notifications_task"
+SEND_BATCH_EMAIL_TASK = "app.tasks.send_batch_email_task"
+
+celery = Celery(
+    "tasks",
+    broker=settings.REDIS_URL,
+    backend=settings.REDIS_URL,
+    # Loaded by workers only, when they start
+    include=["app.tasks"],
+)
+
+# Each stage runs on its own queue, so slow VLM calls never hold the slots of uploads,
+# database writes or emails. Every queue is consumed by its own worker pool, see app/worker.py
+celery.conf.update(
+    task_default_queue=IO_QUEUE,
+    task_routes={
+        UPLOAD_TASK: {"queue": IO_QUEUE},
+        DB_COMMIT_TASK: {"queue": IO_QUEUE},
+        DISCARD_BLOB_TASK: {"queue": IO_QUEUE},
+        FLOW_FAILED_TASK: {"queue": IO_QUEUE},
+        INVOKE_LLM_TASK: {"queue": INFERENCE_QUEUE},
+        SEND_EMAIL_TASK: {"queue": NOTIFY_QUEUE},
+        FLUSH_NOTIFICATIONS_TASK: {"queue": NOTIFY_QUEUE},
+        SEND_BATCH_EMAIL_TASK: {"queue": NOTIFY_QUEUE},
+    },
+    # Redis keeps one list per priority and queue; 0 is served first
+    broker_transport_options={
+        "priority_steps": PRIORITY_STEPS,
+        "sep": PRIORITY_SEP,
+        "queue_order_strategy": "priority",
+    },
+    # Messages and results are binary; JSON is still accepted, so messages sent by a
+    # previous release are not rejected while workers are upgraded
+    task_serializer=settings.CELERY_SERIALIZER,
+    result_serializer=settings.CELERY_SERIALIZER,
+    accept_content=["msgpack", "json"],
+    result_accept_content=["msgpack", "json"],
+    # Only chord header results are stored (see app/envelope.py); they are read once, by the callback
+    result_expires=settings.CELERY_RESULT_EXPIRES_SECONDS,
+)
+
+
+def task(name: str, *args, **kwargs) -> Signature:
+    """
+    Returns the signature of a pipeline task by name, without importing its code.
+    Args:
+        name (str): Task name, e.g. UPLOAD_TASK
+        *args: Positional arguments of the task
+        **kwargs: Keyword arguments of the task
+    Returns:
+        celery.Signature: The signature, not yet applied
+    """
+
+    return celery.signature(name, args=args, kwargs=kwargs)
+
+
+def immutable_task(name: str, *args, **kwargs) -> Signature:
+    """Like `task`, for a task that ignores the result of its parent."""
+    return celery.signature(name, args=args, kwargs=kwargs, immutable=True)
+
+
+@before_task_publish.connect
+def _stamp_published_at(headers: dict | None = None, **kwargs) -> None:
+    """Stamps every task message with its publish time, so workers can measure queue wait."""
+    if headers is not None:
+        headers["published_at"] = time.time()
\ No newline at end of file
@@ -28,6 +28,18 @@ class Settings(BaseSettings):
     
     DATABASE_URL: str
 
+    # Database pool settings: the API uses an asyncpg pool, the workers a sync pool
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    WORKER_DB_POOL_SIZE: int = 5
+    WORKER_DB_MAX_OVERFLOW: int = 10
+    DB_WRITE_BUFFER_ENABLED: bool = False
+    DB_WRITE_BATCH_SIZE: int = 50
+    DB_WRITE_BATCH_WINDOW_MS: int = 20
+
     # Email Settings (for notifications)
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
@@ -39,6 +51,11 @@ class Settings(BaseSettings):
     # TODO: update type to EmailStr when sqlmodel supports it
     EMAILS_FROM_EMAIL: str | None = None
     EMAILS_FROM_NAME: str | None = None
+    SMTP_TIMEOUT_SECONDS: float = 30.0
+    SMTP_POOL_SIZE: int = 4
+    SMTP_POOL_MAX_IDLE_SECONDS: float = 60.0
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    EMAIL_DIGEST_WINDOW_SECONDS: int = 30
 
     @model_validator(mode="after")
     def _set_default_emails_from(self) -> Self:
@@ -53,19 +70,150 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str
     REDIS_DB: int
     REDIS_URL: str
+    SSE_HEARTBEAT_SECONDS: float = 15.0
 
     MAX_UPLOAD_SIZE: int = 2097152
     ALLOWED_UPLOAD_EXTENSIONS: List[str] = [".jpg", ".jpeg", ".png"]
+    INGEST_SPOOL_MAX_MEMORY: int = 1048576
+
+    # Frame stream settings (/ws/stream/{camera_id})
+    STREAM_CHANGE_THRESHOLD: int = 10
+    STREAM_MAX_IN_FLIGHT: int = 4
+    STREAM_RESULT_TIMEOUT_SECONDS: float = 300.0
+
+    # Batch settings (/annotate/batch)
+    MAX_BATCH_UPLOAD_SIZE: int = 268435456
+    MAX_BATCH_ITEMS: int = 1000
+    BATCH_PROGRESS_TTL_SECONDS: int = 604800
+
+    # Image normalization settings (downscale and re-encode before upload and inference)
+    IMAGE_NORMALIZE_ENABLED: bool = True
+    IMAGE_MAX_SIDE: int = 768
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_PROCESS_WORKERS: int = 2
 
     CLOUDINARY_CLOUD_NAME: str
     CLOUDINARY_API_KEY: str
     CLOUDINARY_API_SECRET: str
+    # Base URL of the Upload API, e.g. the fake server of benchmarks/fakes.py; None uses Cloudinary's
+    CLOUDINARY_UPLOAD_PREFIX: str | None = None
 
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
 
-    OLLAMA_BASE_URL:str
+    OLLAMA_BASE_URL: str | None = None
+    # Several Ollama hosts serving OLLAMA_MODEL (comma-separated), used instead of OLLAMA_BASE_URL
+    OLLAMA_BASE_URLS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = []
+    OLLAMA_MODEL: str = "moondream:v2"
+    # How long Ollama keeps the model loaded after a request, so the prompts of an image hit a resident model
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    # Ollama pool settings: every host is warmed up when an inference worker starts, and
+    # hosts that fail or answer slowly are taken out of rotation, see app/inference.py
+    OLLAMA_WARMUP_TIMEOUT_SECONDS: float = 300.0
+    OLLAMA_HEALTH_INTERVAL_SECONDS: float = 10.0
+    OLLAMA_HEALTH_TIMEOUT_SECONDS: float = 2.0
+    OLLAMA_EJECT_AFTER_FAILURES: int = 3
+    OLLAMA_EJECT_SECONDS: float = 30.0
+    OLLAMA_SLOW_FACTOR: float = 3.0
+    OLLAMA_LATENCY_EWMA_WEIGHT: float = 0.3
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def ollama_endpoints(self) -> list[str]:
+        urls = self.OLLAMA_BASE_URLS or [self.OLLAMA_BASE_URL]
+        return list(dict.fromkeys(str(url).rstrip("/") for url in urls if url))
+
+    @model_validator(mode="after")
+    def _check_ollama_endpoints(self) -> Self:
+        if not self.ollama_endpoints:
+            raise ValueError("Set OLLAMA_BASE_URL or OLLAMA_BASE_URLS")
+        return self
+
+    # Prompt settings: requests pick prompts with `prompts` or a named `prompt_set`, DEFAULT_PROMPT otherwise
+    DEFAULT_PROMPT: str = "What's in this image?"
+    PROMPT_SETS: dict[str, list[str]] = {
+        "caption": ["Write a one-sentence caption for this image."],
+        "tags": ["List the main objects in this image as comma-separated tags."],
+        "ocr": ["Transcribe all text visible in this image. Answer 'none' if there is no text."],
+        "full": [
+            "Write a one-sentence caption for this image.",
+            "List the main objects in this image as comma-separated tags.",
+            "Transcribe all text visible in this image. Answer 'none' if there is no text.",
+        ],
+    }
+    MAX_PROMPTS_PER_REQUEST: int = 8
+
+    # Inference settings: VLM calls in flight per Ollama host and worker process
+    INFERENCE_MAX_CONCURRENCY: int = 4
+    # Token streaming settings: workers stream the model output into a short-lived Redis buffer,
+    # which /api/results/{id}/tokens relays to the results page as it is generated
+    INFERENCE_STREAMING: bool = True
+    TOKEN_BUFFER_TTL_SECONDS: int = 300
+    TOKEN_FLUSH_MS: int = 50
+
+    # Worker runtime settings (shared event loop, HTTP pools, blocking-call thread pool)
+    WORKER_BLOCKING_THREADS: int = 8
+    HTTP_MAX_CONNECTIONS: int = 32
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 16
+    HTTP_TIMEOUT_SECONDS: float = 30.0
+
+    # Worker queue settings: every stage has its own queue and worker pool, see app/worker.py
+    IO_WORKER_POOL: str = "threads"
+    IO_WORKER_CONCURRENCY: int = 32
+    IO_WORKER_PREFETCH_MULTIPLIER: int = 4
+    INFERENCE_WORKER_POOL: str = "threads"
+    INFERENCE_WORKER_CONCURRENCY: int = 16
+    INFERENCE_WORKER_PREFETCH_MULTIPLIER: int = 1
+    NOTIFY_WORKER_POOL: str = "threads"
+    NOTIFY_WORKER_CONCURRENCY: int = 4
+    NOTIFY_WORKER_PREFETCH_MULTIPLIER: int = 4
+    # Redis serves priority 0 first; single uploads and streams run ahead of batch items
+    INTERACTIVE_TASK_PRIORITY: int = 0
+    BATCH_TASK_PRIORITY: int = 6
+    # Task message settings: the chain hands compact envelopes to each other (app/envelope.py),
+    # and only the chord header results, which the chord callback collects, are kept in Redis
+    CELERY_SERIALIZER: str = "msgpack"
+    CELERY_RESULT_EXPIRES_SECONDS: int = 3600
+
+    # Retry settings: transient failures are retried by Celery after an exponential, jittered delay
+    TASK_MAX_RETRIES: int = 5
+    TASK_RETRY_BACKOFF_SECONDS: float = 2.0
+    TASK_RETRY_BACKOFF_MAX_SECONDS: float = 120.0
+    # Circuit breaker settings, one breaker per external service (Cloudinary, Ollama, SMTP)
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_RESET_SECONDS: float = 30.0
+
+    # Metrics settings (Prometheus exporter of each worker, the API serves /metrics)
+    METRICS_WORKER_PORT: int = 9100
+
+    # Admission control settings (/annotate, /annotate/batch and camera streams)
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_WAIT_SECONDS: float = 60.0
+    ADMISSION_MAX_QUEUE_DEPTH: int = 10000
+    ADMISSION_RATE_PER_SECOND: float = 5.0
+    ADMISSION_BURST: int = 20
+    ADMISSION_REFRESH_MS: int = 500
+    ADMISSION_IN_FLIGHT_TIMEOUT_SECONDS: int = 900
+
+    # Dedup cache settings
+    DEDUP_ENABLED: bool = True
+    DEDUP_TTL_SECONDS: int = 86400
+    DEDUP_MAX_ENTRIES: int = 100000
+
+    # Near-duplicate cache settings (perceptual hash distance, in bits of 64)
+    NEAR_DUP_ENABLED: bool = True
+    NEAR_DUP_MAX_DISTANCE: int = 6
+
+    # Result cache settings
+    RESULT_CACHE_TTL_SECONDS: int = 86400
+    RESULT_CACHE_PENDING_TTL_SECONDS: int = 2
+    RESULT_HTTP_MAX_AGE: int = 300
+
+    # Blob staging settings ("spool" needs BLOB_SPOOL_DIR shared by API and workers)
+    BLOB_BACKEND: str = "spool"
+    BLOB_SPOOL_DIR: str = "/tmp/pipeline-blobs"
+    BLOB_TTL_SECONDS: int = 3600
 
     class Config:
         case_sensitive = True
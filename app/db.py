@@ -1,46 +1,107 @@
-from collections.abc import Generator
+import asyncio
+from collections.abc import AsyncGenerator, Generator
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
 from sqlmodel import SQLModel, Field, Session
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import BigInteger, Connection, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from typing import Annotated, Optional
 from fastapi import Depends
 from app.logging import logger
 
 from app.config import settings
 
+# Lifecycle of a FileAnnotation: pending until its chord stores the annotation or gives up
+STATUS_PENDING = "pending"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+
 class FileAnnotation(SQLModel, table=True):
     task_id: str = Field(primary_key=True, unique=True)
-    file_url: str
+    # Batch items are inserted as pending rows, without file_url and annotation
+    file_url: Optional[str]
     annotation: Optional[str]
+    batch_id: Optional[str] = Field(default=None, index=True)
+    # Rows annotated from the same upload with different prompts share one image_id and file_url
+    image_id: Optional[str] = Field(default=None, index=True)
+    # Perceptual hash (signed 64-bit) and the prompt and model it was annotated with,
+    # loaded into the near-duplicate index at startup
+    phash: Optional[int] = Field(default=None, sa_type=BigInteger)
+    prompt: Optional[str] = None
+    model: Optional[str] = None
+    # Failed rows keep the error of the step that gave up, so clients can stop waiting
+    status: Optional[str] = Field(default=STATUS_PENDING, index=True)
+    error: Optional[str] = None
 
 
-# DATABASE_URL = str(settings.DATABASE_URL).replace("postgresql://", "postgresql+asyncpg://")
-# engine = create_async_engine(DATABASE_URL, echo=True, future=True)
-# async def get_db() -> AsyncGenerator[AsyncSession, None]:
-#     async with AsyncSession(engine) as session:
-#         yield session
+# The workers run synchronous tasks and keep a sync pool sized for their concurrency
+engine = create_engine(
+    str(settings.DATABASE_URL),
+    echo=False,
+    future=True,
+    pool_size=settings.WORKER_DB_POOL_SIZE,
+    max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
 
-engine = create_engine(str(settings.DATABASE_URL), echo=False, future=True)
+# The API serves its routes from the event loop through asyncpg
+ASYNC_DATABASE_URL = make_url(str(settings.DATABASE_URL)).set(drivername="postgresql+asyncpg")
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 def get_db() -> Generator[Session, None]:
     with Session(engine) as session:
         yield session
 
-SessionDep = Annotated[AsyncSession, Depends(get_db)]
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker() as session:
+        yield session
+
+SessionDep = Annotated[Session, Depends(get_db)]
+AsyncSessionDep = Annotated[AsyncSession, Depends(get_async_db)]
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
 # otherwise, SQLModel might fail to initialize relationships properly
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
 
-# async def create_db_and_tables():
-#     logger.info("Creating database tables")
-#     async with engine.begin() as conn:
-#         conn.run_sync(SQLModel.metadata.create_all)
-#     logger.info("Database tables created")
-
-def create_db_and_tables():
-    logger.info("Creating database tables")
-    with engine.begin() as conn:
-        SQLModel.metadata.create_all(conn)
-    logger.info("Database tables created")
\ No newline at end of file
+MIGRATIONS_DIR = Path(__file__).parent / "alembic"
+
+
+def run_migrations(connection: Connection | None = None) -> None:
+    """
+    Upgrades the database schema to the latest Alembic revision, see app/alembic.
+    `SQLModel.metadata.create_all` only creates missing tables and never alters one that
+    exists, so every change to a table goes through a migration instead.
+    Args:
+        connection (Connection, optional): Connection to migrate, a connection of `engine` by default
+    """
+
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    if connection is not None:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        return
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+
+
+async def create_db_and_tables():
+    logger.info("Migrating the database")
+    await asyncio.to_thread(run_migrations)
+    logger.info("Database migrated")
\ No newline at end of file
@@ -1,5 +1,11 @@
 # type: ignore
 
+import os
+import time
+import queue
+import smtplib
+import functools
+import threading
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
@@ -9,6 +15,9 @@ import emails
 from jinja2 import Template
 
 from app.config import settings
+from app.runtime import runtime
+from app.metrics import observe_call
+from app.resilience import breakers
 
 from app.logging import logger
 
@@ -19,10 +28,20 @@ class EmailData:
     subject: str
 
 
+@functools.lru_cache(maxsize=32)
+def get_email_template(template_name: str) -> Template:
+    """Reads and compiles an email template once; later calls reuse the compiled template."""
+    template_str = (
+        Path(__file__).parent / "templates" / "emails" / "build" / template_name
+    ).read_text()
+    return Template(template_str)
+
+
 def render_email_template(*, template_name: str, context: dict[str, Any]) -> str:
     """Renders an email template with the given context.
-    This function takes a template name and a context dictionary, reads the template file,
-    and returns the rendered HTML content using Jinja2 templating.
+    This function takes a template name and a context dictionary, and returns the rendered
+    HTML content using Jinja2 templating. Templates are compiled once per process and
+    kept in an LRU cache, see `get_email_template`.
     Args:
         template_name (str): Name of the template file to render
         context (dict[str, Any]): Dictionary containing variables to be passed to the template
@@ -33,13 +52,127 @@ def render_email_template(*, template_name: str, context: dict[str, Any]) -> str
         jinja2.exceptions.TemplateError: If there are errors in template syntax or rendering
     """
 
-    template_str = (
-        Path(__file__).parent / "templates" / "emails" / "build" / template_name
-    ).read_text()
-    html_content = Template(template_str).render(context)
+    html_content = get_email_template(template_name).render(context)
     return html_content
 
 
+@dataclass
+class _SMTPConnection:
+    smtp: smtplib.SMTP
+    last_used: float
+    sent: int = 0
+
+
+class SMTPPool:
+    """
+    Keeps authenticated SMTP sessions open and sends many messages over each of them.
+    Up to `size` sessions are used at once; a sender waits for a free one instead of
+    opening more. Idle sessions are checked with NOOP before reuse, and a session is
+    retired after `max_messages` messages. A message that fails because the server
+    dropped the session is retried once on a fresh session.
+    Args:
+        size (int): Maximum number of concurrent SMTP sessions
+        max_idle (float): Seconds after which an idle session is checked before reuse
+        max_messages (int): Number of messages after which a session is closed
+    """
+
+    def __init__(self, size: int, max_idle: float, max_messages: int):
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: queue.LifoQueue[_SMTPConnection] = queue.LifoQueue()
+        self._pid = os.getpid()
+
+    def _connect(self) -> _SMTPConnection:
+        if settings.SMTP_SSL:
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(
+                settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS
+            )
+        else:
+            smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS)
+            if settings.SMTP_TLS:
+                smtp.starttls()
+        if settings.SMTP_USER and settings.SMTP_PASSWORD:
+            smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        logger.info(f"Opened SMTP connection to {settings.SMTP_HOST}:{settings.SMTP_PORT}")
+        return _SMTPConnection(smtp=smtp, last_used=time.monotonic())
+
+    @staticmethod
+    def _close(connection: _SMTPConnection) -> None:
+        try:
+            connection.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            connection.smtp.close()
+
+    def _checkout(self) -> _SMTPConnection:
+        if self._pid != os.getpid():
+            # Sockets inherited from the parent process must not be shared with it
+            self._idle = queue.LifoQueue()
+            self._pid = os.getpid()
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - connection.last_used < self.max_idle:
+                return connection
+            try:
+                if connection.smtp.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            connection.smtp.close()
+
+    def _checkin(self, connection: _SMTPConnection) -> None:
+        connection.sent += 1
+        connection.last_used = time.monotonic()
+        if connection.sent >= self.max_messages:
+            self._close(connection)
+        else:
+            self._idle.put(connection)
+
+    def send(self, from_addr: str, to_addrs: list[str], message: str) -> None:
+        """
+        Sends a message over a pooled session. Blocking, run it with `runtime.run_blocking`.
+        Raises:
+            smtplib.SMTPException: If the server rejects the message
+            OSError: If the server cannot be reached
+        """
+
+        with self._slots:
+            for attempt in range(2):
+                connection = self._checkout()
+                try:
+                    connection.smtp.sendmail(from_addr, to_addrs, message)
+                except (smtplib.SMTPServerDisconnected, OSError):
+                    connection.smtp.close()
+                    if attempt:
+                        raise
+                    logger.warning("SMTP connection dropped, retrying on a new connection")
+                    continue
+                except smtplib.SMTPException:
+                    # The message was refused, but the session is still usable
+                    self._checkin(connection)
+                    raise
+                self._checkin(connection)
+                return
+
+    def close(self) -> None:
+        """Closes every idle session."""
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+smtp_pool = SMTPPool(
+    size=settings.SMTP_POOL_SIZE,
+    max_idle=settings.SMTP_POOL_MAX_IDLE_SECONDS,
+    max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+)
+
+
 async def send_email(
     *,
     email_to: str,
@@ -47,8 +180,10 @@ async def send_email(
     html_content: str = "",
 ) -> None:
     """Send an email using SMTP settings from configuration.
-    This asynchronous function sends an email using the emails library and configured SMTP settings.
-    It supports both TLS and SSL connections and includes optional SMTP authentication.
+    This asynchronous function renders the message with the emails library and sends it
+    over a pooled SMTP session (`smtp_pool`), so consecutive messages reuse one TLS
+    handshake and login instead of opening a new connection each. The blocking SMTP
+    exchange runs in the worker runtime's thread pool, behind the SMTP circuit breaker.
     Args:
         email_to (str): Recipient's email address
         subject (str, optional): Email subject line. Defaults to empty string.
@@ -57,6 +192,7 @@ async def send_email(
         None
     Raises:
         Exception: If there's an error during SMTP connection or sending the email
+        app.resilience.CircuitOpenError: If the SMTP server has been failing
     Example:
         >>> await send_email(
         ...     email_to="recipient@example.com",
@@ -64,37 +200,17 @@ async def send_email(
         ...     html_content="<h1>Hello World!</h1>"
         ... )
     """
-    
+
     try:
         message = emails.Message(
             subject=subject,
             html=html_content,
             mail_from=(settings.EMAILS_FROM_NAME, settings.EMAILS_FROM_EMAIL),
         )
-        smtp_options: dict[str, Any] = {
-            "host": settings.SMTP_HOST,
-            "port": settings.SMTP_PORT,
-            "debug": False  # Add this to get detailed SMTP communication logs
-        }
-        if settings.SMTP_TLS:
-            smtp_options["tls"] = True
-        elif settings.SMTP_SSL:
-            smtp_options["ssl"] = True
-        if settings.SMTP_USER:
-            smtp_options["user"] = settings.SMTP_USER
-        if settings.SMTP_PASSWORD:
-            smtp_options["password"] = settings.SMTP_PASSWORD
-            
-        try:
-            response = message.send(to=email_to, smtp=smtp_options)
-            logger.info(f"Raw SMTP response: {response}")
-            logger.info(f"SMTP response status code: {response.status_code}")
-            logger.info(f"SMTP response status text: {response.status_text}")
-            logger.info(f"SMTP response error: {getattr(response, 'error', None)}")
-        except Exception as smtp_err:
-            logger.error(f"SMTP error during send: {str(smtp_err)}")
-            raise
-            
+        message.mail_to = email_to
+        with observe_call("smtp"), breakers["smtp"].guard():
+            await runtime.run_blocking(smtp_pool.send, settings.EMAILS_FROM_EMAIL, [email_to], message.as_string())
+        logger.info(f"Email sent to {email_to}")
     except Exception as e:
         logger.error(f"Error in send_email: {str(e)}")
         raise
@@ -120,4 +236,22 @@ def generate_reminder_email(email_to: str, link: str) -> EmailData:
         template_name="notification.html",
         context={"project_name": settings.PROJECT_NAME, "link": link, "email": email_to},
     )
+    return EmailData(html_content=html_content, subject=subject)
+
+
+def generate_digest_email(email_to: str, links: list[str]) -> EmailData:
+    """
+    Generate a single email listing several result links.
+    Args:
+        email_to (str): Recipient email address.
+        links (list[str]): URL links to be included in the email content.
+    Returns:
+        EmailData: An object containing the formatted HTML content and subject line for the email.
+    """
+
+    subject = f"{settings.PROJECT_NAME} - {len(links)} results ready"
+    html_content = render_email_template(
+        template_name="digest.html",
+        context={"project_name": settings.PROJECT_NAME, "links": links, "email": email_to},
+    )
     return EmailData(html_content=html_content, subject=subject)
\ No newline at end of file
@@ -0,0 +1,71 @@
+from dataclasses import dataclass, field
+from typing import Any
+
+# What the tasks of an annotation chain hand to each other: the chord header results
+# travel to `db_commit_file_annotation`, and its own result to `send_email_task`. On the
+# wire an envelope is a positional list, so messages and stored results carry no key
+# names, and only the final text of each annotation goes along, not the whole LangChain
+# message with its response metadata.
+
+ENVELOPE_VERSION = 1
+
+
+@dataclass(slots=True)
+class JobEnvelope:
+    """
+    Compact output of a task of the annotation chain.
+    Args:
+        image_id (str, optional): ID of the image
+        file_url (str, optional): URL of the uploaded file on Cloudinary
+        annotations (dict[str, str | None]): The annotation text of every task, by task ID
+        task_ids (list[str]): IDs of the image's FileAnnotation rows, in prompt order
+    """
+
+    image_id: str | None = None
+    file_url: str | None = None
+    annotations: dict[str, str | None] = field(default_factory=dict)
+    task_ids: list[str] = field(default_factory=list)
+
+    @property
+    def task_id(self) -> str:
+        """ID of the first FileAnnotation of the image, the one notifications link to."""
+        return self.task_ids[0]
+
+    def pack(self) -> list[Any]:
+        """Returns the envelope as the positional list that is serialized."""
+        return [ENVELOPE_VERSION, self.image_id, self.file_url, self.annotations, self.task_ids]
+
+    @classmethod
+    def unpack(cls, data: list[Any] | dict[str, Any]) -> "JobEnvelope":
+        """
+        Reads an envelope from a task message or result.
+        The dictionaries sent before the envelope existed are still read, so messages
+        that are in flight while workers are upgraded are not lost.
+        Args:
+            data (list[Any] | dict[str, Any]): A packed envelope, or a legacy result dictionary
+        Returns:
+            JobEnvelope: The envelope
+        Raises:
+            ValueError: If the envelope was packed by an unknown version
+        """
+
+        if isinstance(data, dict):
+            annotations = {
+                task_id: message.get("content") if isinstance(message, dict) else message
+                for task_id, message in (data.get("annotations") or {}).items()
+            }
+            task_ids = data.get("task_ids") or ([data["task_id"]] if "task_id" in data else [])
+            return cls(data.get("image_id"), data.get("file_url"), annotations, list(task_ids))
+        version, image_id, file_url, annotations, task_ids = data
+        if version != ENVELOPE_VERSION:
+            raise ValueError(f"Unsupported job envelope version: {version}")
+        return cls(image_id, file_url, dict(annotations or {}), list(task_ids or []))
+
+    def merge(self, other: "JobEnvelope") -> "JobEnvelope":
+        """Returns the envelope completed with the fields set by `other`, e.g. another chord branch."""
+        return JobEnvelope(
+            other.image_id or self.image_id,
+            other.file_url or self.file_url,
+            {**self.annotations, **other.annotations},
+            other.task_ids or self.task_ids,
+        )
\ No newline at end of file
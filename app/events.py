@@ -0,0 +1,207 @@
+import json
+import time
+import asyncio
+from typing import Any
+from redis.asyncio import Redis as AsyncRedis
+from app.cache import redis, aredis
+from app.config import settings
+from app.logging import logger
+
+RESULTS_CHANNEL_PREFIX = "results"
+TOKENS_CHANNEL_PREFIX = "tokens"
+
+
+def result_channel(task_id: str) -> str:
+    return f"{RESULTS_CHANNEL_PREFIX}:{task_id}"
+
+
+def token_channel(task_id: str) -> str:
+    return f"{TOKENS_CHANNEL_PREFIX}:{task_id}"
+
+
+def token_buffer_key(task_id: str) -> str:
+    return f"{TOKENS_CHANNEL_PREFIX}:buffer:{task_id}"
+
+
+def publish_result(task_id: str, payload: dict[str, Any]) -> None:
+    """
+    Publishes the completion event of an annotation task on Redis pub/sub.
+    Args:
+        task_id (str): ID of the completed task
+        payload (dict[str, Any]): JSON-serializable result, e.g. annotation and file_url
+    """
+
+    redis.publish(result_channel(task_id), json.dumps(payload))
+
+
+async def aget_token_buffer(task_id: str) -> str:
+    """Returns the text streamed so far for a task, empty if none (yet, or any more)."""
+    text = await aredis.get(token_buffer_key(task_id))
+    return text.decode("utf-8", errors="replace") if text else ""
+
+
+class TokenStream:
+    """
+    Streams the partial output of one VLM call of a task to its waiting clients.
+    Text is collected and written every TOKEN_FLUSH_MS: appended to a Redis buffer that
+    expires TOKEN_BUFFER_TTL_SECONDS after the last write, so late clients can catch up,
+    and published on `tokens:{task_id}` with its offset in the buffer. Only the final text
+    is stored in FileAnnotation. Streaming is best effort: if Redis fails, the call goes on
+    without it.
+    Args:
+        task_id (str): ID of the annotation task
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.length = 0
+        self._pending: list[str] = []
+        self._flushed_at = time.monotonic()
+        self._broken = False
+
+    async def _send(self, *commands: tuple[str, tuple]) -> None:
+        if self._broken:
+            return
+        try:
+            async with aredis.pipeline(transaction=False) as pipe:
+                for command, args in commands:
+                    getattr(pipe, command)(*args)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Token streaming of {self.task_id} stopped: {e!r}")
+            self._broken = True
+
+    async def reset(self) -> None:
+        """Drops the text of an earlier attempt, e.g. before a retry or on another host."""
+        self._pending.clear()
+        self.length = 0
+        self._flushed_at = time.monotonic()
+        await self._send(
+            ("delete", (token_buffer_key(self.task_id),)),
+            ("publish", (token_channel(self.task_id), json.dumps({"reset": True}))),
+        )
+
+    async def write(self, text: str) -> None:
+        if not text:
+            return
+        self._pending.append(text)
+        if (time.monotonic() - self._flushed_at) * 1000 >= settings.TOKEN_FLUSH_MS:
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        if not self._pending:
+            return
+        text = "".join(self._pending)
+        self._pending.clear()
+        key = token_buffer_key(self.task_id)
+        await self._send(
+            ("append", (key, text)),
+            ("expire", (key, settings.TOKEN_BUFFER_TTL_SECONDS)),
+            ("publish", (token_channel(self.task_id), json.dumps({"offset": self.length, "text": text}))),
+        )
+        self.length += len(text)
+
+
+class ResultBroadcaster:
+    """
+    Fans annotation completion events out to the clients waiting in this process.
+    The API process holds a single pattern subscription on `results:*` and `tokens:*`
+    no matter how many clients are waiting; each waiting client only costs an
+    asyncio.Queue, and nothing touches the database while it waits.
+    """
+
+    def __init__(self):
+        self._waiters: dict[str, set[asyncio.Queue]] = {}
+        self._token_waiters: dict[str, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def register(self, task_id: str) -> asyncio.Queue:
+        """
+        Returns a queue that receives the completion event of `task_id`.
+        A None item means events may have been missed while the subscription was
+        reconnecting, and the waiter should check the database again.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._waiters.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unregister(self, task_id: str, queue: asyncio.Queue) -> None:
+        waiters = self._waiters.get(task_id)
+        if waiters is not None:
+            waiters.discard(queue)
+            if not waiters:
+                del self._waiters[task_id]
+
+    def register_tokens(self, task_id: str) -> asyncio.Queue:
+        """
+        Returns a queue that receives the token messages of `task_id`, see `TokenStream`:
+        `{"offset": n, "text": "..."}` for new text and `{"reset": true}` when it restarts.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._token_waiters.setdefault(task_id, set()).add(queue)
+        return queue
+
+    def unregister_tokens(self, task_id: str, queue: asyncio.Queue) -> None:
+        waiters = self._token_waiters.get(task_id)
+        if waiters is not None:
+            waiters.discard(queue)
+            if not waiters:
+                del self._token_waiters[task_id]
+
+    def _dispatch(self, channel: str, data: str) -> None:
+        prefix, _, task_id = channel.partition(":")
+        if prefix == TOKENS_CHANNEL_PREFIX:
+            waiters = self._token_waiters.get(task_id)
+            if waiters:
+                message = json.loads(data)
+                for queue in waiters:
+                    queue.put_nowait(message)
+            return
+        for queue in self._waiters.get(task_id, ()):
+            if queue.empty():
+                queue.put_nowait(json.loads(data))
+
+    def _resync(self) -> None:
+        for waiters in self._waiters.values():
+            for queue in waiters:
+                if queue.empty():
+                    queue.put_nowait(None)
+
+    async def _listen(self) -> None:
+        reconnecting = False
+        while True:
+            client = AsyncRedis.from_url(settings.REDIS_URL, decode_responses=True)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(f"{RESULTS_CHANNEL_PREFIX}:*", f"{TOKENS_CHANNEL_PREFIX}:*")
+                    logger.info("Subscribed to annotation result events")
+                    if reconnecting:
+                        self._resync()
+                    async for message in pubsub.listen():
+                        if message["type"] == "pmessage":
+                            self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Result event subscription failed: {e}, reconnecting")
+                reconnecting = True
+                await asyncio.sleep(1)
+            finally:
+                await client.aclose()
+
+
+broadcaster = ResultBroadcaster()
\ No newline at end of file
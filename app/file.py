@@ -1,35 +1,81 @@
-from cloudinary.uploader import upload # type: ignore
+from cloudinary.utils import sign_request, cloudinary_api_url # type: ignore
 from app.logging import logger
 from fastapi import HTTPException
 from app.config import settings
+from app.runtime import runtime
+from app.resilience import breakers
+import time
 import os
 
 
+class CloudinaryError(Exception):
+    """An upload refused by the Cloudinary Upload API, with the HTTP status of its answer."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 async def upload_to_cloudinary_bytes(file_content: bytes, filename: str, folder_path: str, resource_type: str):
-    """Upload the media file to Cloudinary given file bytes and metadata."""
-    try:
-        name_without_ext = os.path.splitext(filename)[0]
-        logger.info(f"Uploading {filename} to Cloudinary...")
-        logger.info(f"Folder path: {folder_path}")
-        logger.info(f"File content size: {len(file_content)} bytes")
-
-        # Upload the file to Cloudinary
-        result = upload(
-            file=file_content,
-            resource_type=resource_type,
-            public_id=name_without_ext,
-            folder=folder_path,
-            format="jpg"
+    """Upload the media file to Cloudinary given file bytes and metadata.
+
+    The signed request is sent through the worker runtime's pooled HTTP client, so
+    consecutive uploads reuse the same keep-alive connection to the Upload API. Calls
+    go through the Cloudinary circuit breaker and fail fast while it is open.
+
+    Raises:
+        CloudinaryError: If the Upload API refuses the file
+        httpx.HTTPError: If the Upload API cannot be reached
+        app.resilience.CircuitOpenError: If Cloudinary has been failing
+    """
+    name_without_ext = os.path.splitext(filename)[0]
+    logger.info(f"Uploading {filename} to Cloudinary...")
+    logger.info(f"Folder path: {folder_path}")
+    logger.info(f"File content size: {len(file_content)} bytes")
+
+    options = {
+        "cloud_name": settings.CLOUDINARY_CLOUD_NAME,
+        "api_key": settings.CLOUDINARY_API_KEY,
+        "api_secret": settings.CLOUDINARY_API_SECRET,
+    }
+    if settings.CLOUDINARY_UPLOAD_PREFIX:
+        options["upload_prefix"] = settings.CLOUDINARY_UPLOAD_PREFIX
+    params = sign_request({
+        "timestamp": int(time.time()),
+        "public_id": name_without_ext,
+        "folder": folder_path,
+        "format": "jpg"
+    }, options)
+
+    # httpx can only size bytes or real files, and a sized body avoids a chunked upload
+    if not isinstance(file_content, bytes):
+        file_content = bytes(file_content)
+
+    # Upload the file to Cloudinary
+    with breakers["cloudinary"].guard():
+        response = await runtime.http("cloudinary").post(
+            cloudinary_api_url("upload", resource_type=resource_type, **options),
+            data=params,
+            files={"file": (filename or "file", file_content)},
         )
+        if response.status_code != 200:
+            try:
+                message = response.json().get("error", {}).get("message", response.text)
+            except ValueError:
+                message = response.text
+            logger.error(f"Error in upload_to_cloudinary: {response.status_code} {message}")
+            raise CloudinaryError(message, response.status_code)
 
-        logger.info(f"Uploaded {filename} to Cloudinary successfully")
-        return result
-    except Exception as e:
-        logger.error(f"Error in upload_to_cloudinary: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error in upload: {str(e)}")
+    logger.info(f"Uploaded {filename} to Cloudinary successfully")
+    return response.json()
 
-async def upload_picture_to_cloudinary(file_content: bytes, filename: str, id: str) -> str | None:
-    """Upload the profile picture file to Cloudinary using file bytes."""
+async def upload_picture_to_cloudinary(file_content: bytes, filename: str, id: str) -> str:
+    """Upload the profile picture file to Cloudinary using file bytes and return its URL.
+
+    Raises:
+        HTTPException: 400 if the file type or size is not accepted
+        CloudinaryError: If the upload fails, see `upload_to_cloudinary_bytes`
+    """
     # Validate file type
     allowed_extensions = ['.jpg', '.jpeg', '.png', '.gif']
     file_extension = '.' + filename.split('.')[-1].lower()  # type: ignore
@@ -47,16 +93,11 @@ async def upload_picture_to_cloudinary(file_content: bytes, filename: str, id: s
             detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / (1024 * 1024)}MB."
         )
 
-    # Upload to Cloudinary
-    try:
-        drive_file = await upload_to_cloudinary_bytes(
-            file_content,
-            filename,
-            f"pictures/{id}",
-            "image"
-        )
-        url = drive_file["secure_url"]
-        return url
-    except Exception as e:
-        logger.error(f"Error uploading picture: {str(e)}")
-        return None
\ No newline at end of file
+    # Upload to Cloudinary; failures propagate, so the task can retry or record them
+    drive_file = await upload_to_cloudinary_bytes(
+        file_content,
+        filename,
+        f"pictures/{id}",
+        "image"
+    )
+    return drive_file["secure_url"]
\ No newline at end of file
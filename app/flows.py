@@ -0,0 +1,365 @@
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, BinaryIO
+from collections.abc import Iterable
+from celery import chord, group
+from fastapi import HTTPException
+from sqlmodel import Session
+from app.config import settings
+from app.logging import logger
+from app.db import engine
+from app.repository import add_pending_file_annotations
+from app.notifications import is_valid_email
+from app.cache import dedup_key, claim_dedup_entry, release_dedup_entry
+from app.blob import stage_blob, discard_blob
+from app.client import (
+    task, immutable_task,
+    UPLOAD_TASK, INVOKE_LLM_TASK, DB_COMMIT_TASK, DISCARD_BLOB_TASK, FLOW_FAILED_TASK, SEND_EMAIL_TASK,
+)
+from app.metrics import PAYLOAD_BYTES, FLOW_STAGE_SECONDS
+from app.ingest import IngestedUpload, ingest_fileobj
+from app.batch import start_batch_progress
+from app.image import normalize_upload, fingerprint_upload
+from app.neardup import near_duplicates, stored_annotation, to_signed64
+
+# API side of the annotation pipeline: stages uploads and enqueues the task chords of
+# app/tasks.py by name through the thin client of app/client.py
+
+
+def annotation_chord(
+    blob_ref: str,
+    filename: str,
+    image_id: str,
+    prompts: dict[str, str],
+    dedup_keys: list[str] | None = None,
+    batch_id: str | None = None,
+    phash: int | None = None,
+    reused: dict[str, str] | None = None,
+    priority: int | None = None,
+    email: str | None = None,
+):
+    """
+    Builds the upload/inference chord of one staged image and all of its prompts.
+    The Cloudinary upload and the LLM calls run in parallel, and `db_commit_file_annotation`
+    stores one row per prompt once they finish. The image is uploaded and encoded once,
+    and a single `invoke_llm` task runs every prompt that has no `reused` annotation from
+    the near-duplicate cache; if all of them do, only the upload runs. The staged blob is
+    discarded after the write, and `annotation_flow_failed` cleans up and marks the rows
+    failed if any step fails for good, i.e. after its retries. Every task of the chord is
+    sent with the same `priority`, so an image stays in its lane on each queue.
+    The notification email is linked to the write like the cleanup, instead of being
+    chained after the chord: a chained body would be a chain without the errback, which
+    Celery then skips when a header task fails.
+    Args:
+        blob_ref (str): Reference to the staged file content
+        filename (str): Name of the file on Cloudinary
+        image_id (str): ID of the image, shared by its FileAnnotation rows
+        prompts (dict[str, str]): The prompt of every FileAnnotation of the image, by task ID
+        dedup_keys (list[str], optional): Dedup keys claimed for the image's prompts
+        batch_id (str, optional): ID of the batch the image belongs to
+        phash (int, optional): Perceptual hash of the image, stored for the near-duplicate cache
+        reused (dict[str, str], optional): Annotations of near-duplicate images to store
+            instead of calling the LLM, by task ID
+        priority (int, optional): Broker priority of every task, see `INTERACTIVE_TASK_PRIORITY`
+            and `BATCH_TASK_PRIORITY`
+        email (str, optional): Address notified once the rows are written
+    Returns:
+        celery.canvas.chord: The chord, not yet applied
+    """
+
+    columns: dict[str, Any] = {"model": settings.OLLAMA_MODEL}
+    if phash is not None:
+        columns["phash"] = to_signed64(phash)
+    header = [task(UPLOAD_TASK, blob_ref, filename, image_id).set(priority=priority)]
+    pending = {task_id: prompt for task_id, prompt in prompts.items() if not reused or task_id not in reused}
+    if pending:
+        header.append(task(INVOKE_LLM_TASK, blob_ref, pending).set(priority=priority))
+
+    persist = task(
+        DB_COMMIT_TASK,
+        image_id=image_id, prompts=prompts, batch_id=batch_id, columns=columns, reused=reused
+    ).set(priority=priority)
+    persist.link(immutable_task(DISCARD_BLOB_TASK, blob_ref).set(priority=priority))
+    if email:
+        persist.link(task(SEND_EMAIL_TASK, email=email).set(priority=priority))
+    # Header failures surface as a ChordError on the callback, so one errback covers both branches
+    persist.link_error(
+        task(
+            FLOW_FAILED_TASK,
+            dedup_keys=dedup_keys, blob_ref=blob_ref, batch_id=batch_id, image_id=image_id, task_ids=list(prompts)
+        ).set(priority=priority)
+    )
+    return chord(header, persist)
+
+def find_near_duplicate(upload: IngestedUpload, prompt: str) -> str | None:
+    """
+    Looks up the annotation of an already annotated image that looks like the upload.
+    Args:
+        upload (IngestedUpload): The normalized or fingerprinted upload
+        prompt (str): The prompt to be used for LLM annotation
+    Returns:
+        str | None: The annotation to reuse, None on a miss or if the cache is disabled
+    """
+
+    if not settings.NEAR_DUP_ENABLED or upload.phash is None:
+        return None
+    match = near_duplicates.lookup(upload.phash, prompt, settings.OLLAMA_MODEL)
+    # The closest image may still be in flight, which counts as a miss
+    annotation = stored_annotation(match[0]) if match is not None else None
+    near_duplicates.record(annotation is not None)
+    if annotation is not None:
+        logger.info(f"Near-duplicate hit: reusing annotation of {match[0]} at distance {match[1]}")  # type: ignore[index]
+    return annotation
+
+def prepare_upload(upload: IngestedUpload) -> IngestedUpload:
+    """Normalizes an upload, or only computes its perceptual hash if normalization is disabled."""
+    if settings.IMAGE_NORMALIZE_ENABLED:
+        return normalize_upload(upload)
+    if settings.NEAR_DUP_ENABLED:
+        return fingerprint_upload(upload)
+    return upload
+
+def reuse_near_duplicates(upload: IngestedUpload, prompts: dict[str, str]) -> dict[str, str]:
+    """Returns the reusable annotation of every prompt with a near-duplicate hit, by task ID."""
+    reused = {}
+    for task_id, prompt in prompts.items():
+        annotation = find_near_duplicate(upload, prompt)
+        if annotation is not None:
+            reused[task_id] = annotation
+    return reused
+
+def index_near_duplicates(phash: int | None, prompts: dict[str, str], reused: dict[str, str]) -> None:
+    """Adds the prompts of an image that go to the LLM to the near-duplicate index."""
+    if phash is None:
+        return
+    for task_id, prompt in prompts.items():
+        if task_id not in reused:
+            near_duplicates.add(phash, prompt, settings.OLLAMA_MODEL, task_id)
+
+@dataclass
+class AnnotationFlow:
+    """
+    The FileAnnotation task IDs of an upload, one per prompt in request order.
+    `image_id` is None if every prompt resolved to an earlier task and nothing was enqueued.
+    """
+
+    image_id: str | None
+    ids: list[str]
+    prompts: list[str]
+
+    @property
+    def id(self) -> str:
+        """Task ID of the first prompt."""
+        return self.ids[0]
+
+def full_annotation_flow(upload: IngestedUpload, prompts: list[str], email: str = "") -> AnnotationFlow:
+    """
+    Orchestrates a complete file annotation workflow using a Celery chord.
+    The Cloudinary upload and the LLM processing run in parallel on the staged file content;
+    once both finish, the database records are written in one step, followed by an optional
+    email notification. Every prompt gets its own FileAnnotation and task ID, but the image
+    is normalized, staged, uploaded and base64-encoded only once.
+    Single uploads run at INTERACTIVE_TASK_PRIORITY, ahead of queued batch items.
+    Uploads are deduplicated per prompt on their content, prompt and model: if the same
+    image was already annotated with a prompt, or is being annotated right now, the existing
+    task ID is returned for that prompt, and only the remaining prompts start a new chain.
+    New uploads are downscaled and re-encoded to the model input size
+    (`app.image.normalize_upload`), then staged once with `app.blob.stage_blob`; only the
+    blob reference travels through the broker.
+    Args:
+        upload (IngestedUpload): The validated upload, see `app.ingest`
+        prompts (list[str]): The distinct prompts to be used for LLM annotation
+        email (str, optional): Email address for notification. Defaults to empty string
+    Returns:
+        AnnotationFlow: The image ID and the task ID of every prompt
+    Example:
+        >>> flow = full_annotation_flow(upload, ["What's in this image?"], "user@example.com")
+        >>> print(flow.id)
+    """
+
+    image_id = str(uuid.uuid4())
+    ids: list[str] = []
+    claimed: dict[str, str] = {}
+    keys: list[str] = []
+    try:
+        for prompt in prompts:
+            task_id = str(uuid.uuid4())
+            if settings.DEDUP_ENABLED:
+                key = dedup_key(upload.digest, prompt, settings.OLLAMA_MODEL)
+                existing_id = claim_dedup_entry(key, task_id)
+                if existing_id is not None:
+                    logger.info(f"Dedup hit, reusing task {existing_id}")
+                    ids.append(existing_id)
+                    continue
+                keys.append(key)
+            ids.append(task_id)
+            claimed[task_id] = prompt
+        if not claimed:
+            return AnnotationFlow(image_id=None, ids=ids, prompts=prompts)
+
+        started = time.perf_counter()
+        upload = prepare_upload(upload)
+        reused = reuse_near_duplicates(upload, claimed)
+        normalized = time.perf_counter()
+        blob_ref = stage_blob(upload.file)
+        staged = time.perf_counter()
+
+        annotation_chord(
+            blob_ref, upload.filename, image_id, claimed,
+            dedup_keys=keys, phash=upload.phash, reused=reused,
+            priority=settings.INTERACTIVE_TASK_PRIORITY,
+            email=email if is_valid_email(email) else None,
+        ).apply_async(task_id=image_id)
+        index_near_duplicates(upload.phash, claimed, reused)
+    except Exception:
+        for key in keys:
+            release_dedup_entry(key)
+        raise
+    enqueued = time.perf_counter()
+    FLOW_STAGE_SECONDS.labels("normalize").observe(normalized - started)
+    FLOW_STAGE_SECONDS.labels("stage").observe(staged - normalized)
+    FLOW_STAGE_SECONDS.labels("enqueue").observe(enqueued - staged)
+    PAYLOAD_BYTES.labels("staged").observe(upload.size)
+    logger.info(
+        f"Flow {image_id}: {len(claimed)} prompt(s), normalize {normalized - started:.3f}s, "
+        f"stage {staged - normalized:.3f}s ({upload.size} bytes), enqueue {enqueued - staged:.3f}s"
+    )
+    logger.info(f"Full annotation workflow started, image id = {image_id}")
+    return AnnotationFlow(image_id=image_id, ids=ids, prompts=prompts)
+
+def batch_annotation_flow(
+    entries: Iterable[tuple[str, BinaryIO]], prompts: list[str], email: str = ""
+) -> dict[str, Any]:
+    """
+    Orchestrates the annotation of a batch of images with a single Celery group.
+    Every entry is ingested, normalized and staged like a single upload, but nothing is
+    enqueued until the whole batch has been read. Entries are read one after the other,
+    but normalized concurrently, at most IMAGE_PROCESS_WORKERS × 2 at a time, so the
+    normalization process pool stays busy while the archive is read. The pending FileAnnotation rows of the
+    batch, one per image and prompt, are then inserted in one multi-row INSERT, and one
+    group of per-image chords is sent. Each chord fills in the rows of its image; progress
+    is counted in Redis, and only the item that finishes the batch sends the notification email.
+    Batch items run at BATCH_TASK_PRIORITY, so interactive uploads overtake them on every queue.
+    Entries that are not valid images are reported back instead of failing the batch.
+    Batch items are not deduplicated, so every entry gets its rows in the batch.
+    Args:
+        entries (Iterable[tuple[str, BinaryIO]]): Name and content of every image, see
+            `app.batch.iter_batch_entries`
+        prompts (list[str]): The distinct prompts to be used for LLM annotation
+        email (str, optional): Email address notified once the batch has finished
+    Returns:
+        dict[str, Any]: Dictionary containing:
+            - batch_id (str): ID of the batch
+            - ids (list[str]): FileAnnotation task ids of the accepted entries, image by image
+            - images (list[dict]): image_id, filename and per-prompt ids of every accepted entry
+            - prompts (list[str]): The prompts, in the order of each image's ids
+            - rejected (list[dict]): filename and detail of every rejected entry
+    Raises:
+        HTTPException: 400 if the batch has no valid image, 413 if it has more than
+        MAX_BATCH_ITEMS images
+    """
+
+    batch_id = str(uuid.uuid4())
+    started = time.perf_counter()
+    staged: list[tuple[str, str, str, int | None, dict[str, str], dict[str, str]]] = []
+    rejected: list[dict[str, Any]] = []
+    # Normalizations in flight, oldest first, so entries are staged in upload order
+    pending: deque[tuple[str, IngestedUpload, Future]] = deque()
+
+    def stage_next() -> None:
+        filename, _, future = pending.popleft()
+        try:
+            upload = future.result()
+        except HTTPException as e:
+            rejected.append({"filename": filename, "detail": e.detail})
+            return
+        try:
+            PAYLOAD_BYTES.labels("staged").observe(upload.size)
+            image_prompts = {str(uuid.uuid4()): prompt for prompt in prompts}
+            staged.append((
+                str(uuid.uuid4()),
+                stage_blob(upload.file),
+                upload.filename,
+                upload.phash,
+                image_prompts,
+                reuse_near_duplicates(upload, image_prompts),
+            ))
+        finally:
+            upload.close()
+
+    in_flight = max(1, settings.IMAGE_PROCESS_WORKERS * 2)
+    try:
+        with ThreadPoolExecutor(max_workers=in_flight, thread_name_prefix="batch-normalize") as executor:
+            try:
+                for filename, fileobj in entries:
+                    # Entries still being normalized may be rejected, so only count them once known
+                    while pending and len(staged) + len(pending) >= settings.MAX_BATCH_ITEMS:
+                        stage_next()
+                    if len(staged) >= settings.MAX_BATCH_ITEMS:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"Too many images. Maximum batch size is {settings.MAX_BATCH_ITEMS}.",
+                        )
+                    # Archive members can only be read in order, so ingesting stays sequential
+                    try:
+                        upload = ingest_fileobj(fileobj, filename)
+                    except HTTPException as e:
+                        rejected.append({"filename": filename, "detail": e.detail})
+                        continue
+                    pending.append((filename, upload, executor.submit(prepare_upload, upload)))
+                    if len(pending) >= in_flight:
+                        stage_next()
+                while pending:
+                    stage_next()
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+        if not staged:
+            raise HTTPException(status_code=400, detail="No valid images in batch.")
+        prepared = time.perf_counter()
+
+        with Session(engine) as session:
+            add_pending_file_annotations(session, batch_id=batch_id, rows=[
+                {"task_id": task_id, "image_id": image_id, "prompt": prompt}
+                for image_id, _, _, _, image_prompts, _ in staged
+                for task_id, prompt in image_prompts.items()
+            ])
+        start_batch_progress(batch_id, len(staged), email if is_valid_email(email) else "")
+        group(
+            annotation_chord(
+                blob_ref, filename, image_id, image_prompts,
+                batch_id=batch_id, phash=phash, reused=reused,
+                priority=settings.BATCH_TASK_PRIORITY,
+            )
+            for image_id, blob_ref, filename, phash, image_prompts, reused in staged
+        ).apply_async()
+        for _, _, _, phash, image_prompts, reused in staged:
+            index_near_duplicates(phash, image_prompts, reused)
+    except Exception:
+        for _, blob_ref, *_ in staged:
+            discard_blob(blob_ref)
+        for _, upload, future in pending:
+            upload.close()
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+        raise
+    FLOW_STAGE_SECONDS.labels("batch_prepare").observe(prepared - started)
+    FLOW_STAGE_SECONDS.labels("batch_enqueue").observe(time.perf_counter() - prepared)
+    logger.info(
+        f"Batch {batch_id}: {len(staged)} images x {len(prompts)} prompt(s) ({len(rejected)} rejected), "
+        f"prepare {prepared - started:.3f}s, enqueue {time.perf_counter() - prepared:.3f}s"
+    )
+    images = [
+        {"image_id": image_id, "filename": filename, "ids": list(image_prompts)}
+        for image_id, _, filename, _, image_prompts, _ in staged
+    ]
+    return {
+        "batch_id": batch_id,
+        "ids": [task_id for image in images for task_id in image["ids"]],
+        "images": images,
+        "prompts": prompts,
+        "rejected": rejected,
+    }
\ No newline at end of file
@@ -0,0 +1,187 @@
+import io
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from fastapi import HTTPException
+from app.config import settings
+from app.ingest import IngestedUpload
+from app.logging import logger
+
+_process_pool: ProcessPoolExecutor | None = None
+
+
+def phash_image(image: np.ndarray) -> int:
+    """
+    Computes the 64-bit perceptual hash (pHash) of a decoded image.
+    The image is reduced to 32x32 grayscale, and the 8x8 lowest frequencies of its DCT
+    are compared with their median. The hash survives re-encoding, resizing and small
+    shifts in framing or light, so shots of the same scene land a few bits apart.
+    Args:
+        image (np.ndarray): BGR or grayscale image
+    Returns:
+        int: The hash as an unsigned 64-bit integer
+    """
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def phash(data: bytes) -> int:
+    """
+    Decodes an image and returns its pHash, see `phash_image`.
+    Raises:
+        ValueError: If the content cannot be decoded as an image
+    """
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_2)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return phash_image(image)
+
+
+def normalize_image(data: bytes, max_side: int, quality: int) -> tuple[bytes, bool, int]:
+    """
+    Decodes an image, downscales it to the model input size and re-encodes it as JPEG.
+    Decoding applies the EXIF orientation, so the output is upright without metadata.
+    The perceptual hash is computed on the same decoded image, so it costs no extra decode.
+    Runs in a worker process of the normalization pool, see `normalize_upload`.
+    Args:
+        data (bytes): The original image content
+        max_side (int): Maximum width or height of the output in pixels
+        quality (int): JPEG quality of the output, 0-100
+    Returns:
+        tuple[bytes, bool, int]: The JPEG content, whether the image was resized and its pHash
+    Raises:
+        ValueError: If the content cannot be decoded as an image
+    """
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    image_hash = phash_image(image)
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    resized = scale < 1
+    if resized:
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode image")
+    return encoded.tobytes(), resized, image_hash
+
+
+def dhash(data: bytes, hash_size: int = 8) -> int:
+    """
+    Computes the difference hash (dHash) of an image.
+    The image is decoded in reduced grayscale, shrunk to (hash_size + 1) x hash_size and
+    every pixel is compared with its right neighbour, which gives a hash_size² bit
+    fingerprint that barely changes with noise, compression or exposure drift but
+    flips many bits when the scene changes.
+    Args:
+        data (bytes): The encoded image
+        hash_size (int, optional): Number of rows and comparisons per row. Defaults to 8
+    Returns:
+        int: The hash as an unsigned integer of hash_size² bits
+    Raises:
+        ValueError: If the content cannot be decoded as an image
+    """
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        raise ValueError("Could not decode image")
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Returns the number of bits in which two hashes differ."""
+    return (a ^ b).bit_count()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Returns the process pool used for image normalization, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        # spawn, not fork: the API process runs threads that must not be forked mid-flight
+        _process_pool = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def normalize_upload(upload: IngestedUpload) -> IngestedUpload:
+    """
+    Runs the normalization stage on an ingested upload.
+    The CPU-bound work happens in the normalization process pool, so neither the event
+    loop nor the calling thread burns CPU on it. The original is kept when it was not
+    resized and re-encoding would not make it smaller. The digest of the original is
+    preserved, so dedup keys are unaffected, and the perceptual hash of the image is
+    attached for the near-duplicate cache.
+    Args:
+        upload (IngestedUpload): The validated upload
+    Returns:
+        IngestedUpload: The upload to stage, either normalized or the original
+    Raises:
+        HTTPException: 400 if the upload cannot be decoded as an image
+    """
+
+    started = time.perf_counter()
+    try:
+        normalized, resized, image_hash = get_process_pool().submit(
+            normalize_image, upload.read(), settings.IMAGE_MAX_SIDE, settings.IMAGE_JPEG_QUALITY
+        ).result()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    elapsed = time.perf_counter() - started
+
+    if not resized and len(normalized) >= upload.size:
+        upload.file.seek(0)
+        upload.phash = image_hash
+        logger.info(f"Normalize: kept original {upload.filename} ({upload.size} bytes) in {elapsed:.3f}s")
+        return upload
+
+    saved = upload.size - len(normalized)
+    logger.info(
+        f"Normalize: {upload.filename} {upload.size} -> {len(normalized)} bytes "
+        f"(saved {saved} bytes, {saved / upload.size:.0%}) in {elapsed:.3f}s"
+    )
+    upload.close()
+    return IngestedUpload(
+        file=io.BytesIO(normalized),
+        filename=f"{os.path.splitext(upload.filename)[0]}.jpg",
+        size=len(normalized),
+        digest=upload.digest,
+        extension=".jpg",
+        phash=image_hash,
+    )
+
+
+def fingerprint_upload(upload: IngestedUpload) -> IngestedUpload:
+    """
+    Attaches the perceptual hash to an upload that skips normalization.
+    Raises:
+        HTTPException: 400 if the upload cannot be decoded as an image
+    """
+
+    try:
+        upload.phash = get_process_pool().submit(phash, upload.read()).result()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    upload.file.seek(0)
+    return upload
\ No newline at end of file
@@ -0,0 +1,304 @@
+import os
+import time
+import random
+import asyncio
+from functools import cached_property
+from concurrent.futures import Future
+from typing import Any, TYPE_CHECKING
+import httpx
+from app.config import settings
+from app.logging import logger
+from app.metrics import OLLAMA_ENDPOINT_UP, OLLAMA_ENDPOINT_OUTSTANDING, OLLAMA_ENDPOINT_LATENCY, FIRST_TOKEN_SECONDS
+from app.events import TokenStream
+from app.resilience import is_transient
+from app.runtime import runtime, http_transport
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+    from langchain_core.messages import BaseMessage
+
+
+class OllamaUnavailableError(ConnectionError):
+    """Raised when no Ollama host of the pool is in rotation. Transient, so the task is retried."""
+
+
+def _model_names(model: str) -> set[str]:
+    # Ollama reports untagged models as "<name>:latest"
+    return {model, f"{model}:latest"} if ":" not in model else {model}
+
+
+class OllamaEndpoint:
+    """
+    One Ollama host of the inference pool, with its client and routing state.
+    A host is in rotation while its last health check passed and it is not ejected. It is
+    ejected for OLLAMA_EJECT_SECONDS after OLLAMA_EJECT_AFTER_FAILURES transient failures in
+    a row, or when its latency grows past OLLAMA_SLOW_FACTOR times the fastest other host.
+    Args:
+        url (str): Base URL of the Ollama API
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        # Exponentially weighted moving average of the request latency, None until measured
+        self.latency: float | None = None
+        self.failures = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.warming = False
+
+    @cached_property
+    def client(self) -> "ChatOllama":
+        """The host's ChatOllama, created on first use, so only inference workers import LangChain."""
+        from langchain_ollama import ChatOllama
+
+        # The async client is only ever used from the worker runtime loop, so its pool is reused across tasks
+        return ChatOllama(
+            model=settings.OLLAMA_MODEL,
+            base_url=self.url,
+            # Keeps the model resident between the prompts of an image and across tasks
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            async_client_kwargs={"transport": http_transport("ollama"), "timeout": settings.HTTP_TIMEOUT_SECONDS},
+        )
+
+    @property
+    def in_rotation(self) -> bool:
+        return self.healthy and time.monotonic() >= self.ejected_until
+
+    def observe(self, seconds: float) -> None:
+        weight = settings.OLLAMA_LATENCY_EWMA_WEIGHT
+        self.latency = seconds if self.latency is None else weight * seconds + (1 - weight) * self.latency
+
+    def report(self) -> None:
+        OLLAMA_ENDPOINT_UP.labels(self.url).set(1 if self.in_rotation else 0)
+        OLLAMA_ENDPOINT_OUTSTANDING.labels(self.url).set(self.outstanding)
+        OLLAMA_ENDPOINT_LATENCY.labels(self.url).set(self.latency or 0.0)
+
+
+class OllamaPool:
+    """
+    Balances VLM calls over the Ollama hosts of OLLAMA_BASE_URLS.
+    Each call goes to the host with the lowest expected wait, its requests in flight plus
+    this one times its latency EWMA, among the hosts in rotation with fewer than
+    `max_concurrency` calls in flight; callers wait while every host is full. A call that
+    fails transiently is tried once more on another host. `warm_up` loads the model on
+    every host, and a health check polls `/api/ps` every OLLAMA_HEALTH_INTERVAL_SECONDS,
+    takes hosts that fail or time out out of rotation, and loads the model again on hosts
+    that unloaded it. State is kept per worker process and lives on the runtime loop.
+    Args:
+        urls (list[str]): Base URLs of the Ollama hosts
+        max_concurrency (int): Calls in flight per host
+    """
+
+    def __init__(self, urls: list[str], max_concurrency: int):
+        self.endpoints = [OllamaEndpoint(url) for url in urls]
+        self.max_concurrency = max_concurrency
+        self._pid: int | None = None
+        self._capacity: asyncio.Condition | None = None
+        self._health_task: asyncio.Task | None = None
+
+    def _ensure_started(self) -> None:
+        # Must run on the runtime loop; a forked worker process starts its own health check
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._capacity = asyncio.Condition()
+        for endpoint in self.endpoints:
+            endpoint.outstanding = 0
+            endpoint.report()
+        if settings.OLLAMA_HEALTH_INTERVAL_SECONDS > 0:
+            self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+
+    def _score(self, endpoint: OllamaEndpoint) -> float:
+        # Hosts without a latency yet are assumed as fast as the others, so they get traffic
+        known = [other.latency for other in self.endpoints if other.latency is not None]
+        typical = sum(known) / len(known) if known else 1.0
+        latency = endpoint.latency if endpoint.latency is not None else typical
+        return (endpoint.outstanding + 1) * latency
+
+    def _pick(self, exclude: list[OllamaEndpoint]) -> OllamaEndpoint | None:
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.in_rotation and endpoint not in exclude]
+        if not candidates:
+            raise OllamaUnavailableError(f"No Ollama host in rotation out of {len(self.endpoints)}")
+        free = [endpoint for endpoint in candidates if endpoint.outstanding < self.max_concurrency]
+        if not free:
+            return None
+        best = min(self._score(endpoint) for endpoint in free)
+        return random.choice([endpoint for endpoint in free if self._score(endpoint) == best])
+
+    async def _acquire(self, exclude: list[OllamaEndpoint]) -> OllamaEndpoint:
+        async with self._capacity:  # type: ignore[union-attr]
+            while (endpoint := self._pick(exclude)) is None:
+                await self._capacity.wait()  # type: ignore[union-attr]
+            endpoint.outstanding += 1
+        endpoint.report()
+        return endpoint
+
+    async def _release(self, endpoint: OllamaEndpoint) -> None:
+        async with self._capacity:  # type: ignore[union-attr]
+            endpoint.outstanding -= 1
+            self._capacity.notify()  # type: ignore[union-attr]
+        endpoint.report()
+
+    def _eject(self, endpoint: OllamaEndpoint, reason: str) -> None:
+        endpoint.ejected_until = time.monotonic() + settings.OLLAMA_EJECT_SECONDS
+        endpoint.failures = 0
+        # Forget the latency, so the host is probed again when it comes back
+        endpoint.latency = None
+        logger.warning(f"Ollama host {endpoint.url} out of rotation for {settings.OLLAMA_EJECT_SECONDS:.0f}s: {reason}")
+        endpoint.report()
+
+    def _record_success(self, endpoint: OllamaEndpoint, seconds: float) -> None:
+        endpoint.failures = 0
+        endpoint.observe(seconds)
+        others = [
+            other.latency for other in self.endpoints
+            if other is not endpoint and other.in_rotation and other.latency is not None
+        ]
+        if others and endpoint.latency > settings.OLLAMA_SLOW_FACTOR * min(others):  # type: ignore[operator]
+            self._eject(endpoint, f"latency {endpoint.latency:.2f}s against {min(others):.2f}s")
+
+    def _record_failure(self, endpoint: OllamaEndpoint, exc: Exception) -> None:
+        if not is_transient(exc):
+            return
+        endpoint.failures += 1
+        if endpoint.failures >= settings.OLLAMA_EJECT_AFTER_FAILURES:
+            self._eject(endpoint, f"{endpoint.failures} failures in a row, last {exc!r}")
+
+    async def _astream(self, endpoint: OllamaEndpoint, input: Any, tokens: TokenStream) -> "BaseMessage":
+        from langchain_core.messages import message_chunk_to_message
+
+        await tokens.reset()
+        started = time.perf_counter()
+        message = None
+        async for chunk in endpoint.client.astream(input):
+            if message is None:
+                FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started)
+            message = chunk if message is None else message + chunk
+            if isinstance(chunk.content, str):
+                await tokens.write(chunk.content)
+        await tokens.flush()
+        if message is None:
+            raise ValueError(f"Ollama host {endpoint.url} returned an empty stream")
+        return message_chunk_to_message(message)
+
+    async def ainvoke(self, input: Any, tokens: TokenStream | None = None) -> "BaseMessage":
+        """
+        Runs one VLM call on the best host in rotation.
+        With `tokens`, the answer is streamed and its text written to `tokens` as it is
+        generated; a try on another host starts the stream over.
+        Raises:
+            OllamaUnavailableError: If no host is in rotation
+            Exception: The error of the call, after one more try on another host if it was transient
+        """
+
+        self._ensure_started()
+        tried: list[OllamaEndpoint] = []
+        while True:
+            endpoint = await self._acquire(tried)
+            started = time.perf_counter()
+            try:
+                if tokens is None:
+                    result = await endpoint.client.ainvoke(input)
+                else:
+                    result = await self._astream(endpoint, input, tokens)
+            except Exception as e:
+                self._record_failure(endpoint, e)
+                tried.append(endpoint)
+                others = [other for other in self.endpoints if other.in_rotation and other not in tried]
+                if len(tried) > 1 or not others or not is_transient(e):
+                    raise
+                logger.warning(f"Ollama host {endpoint.url} failed ({e!r}), trying another host")
+                continue
+            finally:
+                await self._release(endpoint)
+            self._record_success(endpoint, time.perf_counter() - started)
+            return result
+
+    async def _warm(self, endpoint: OllamaEndpoint) -> bool:
+        # A generate request without a prompt only loads the model, for OLLAMA_KEEP_ALIVE
+        endpoint.warming = True
+        started = time.perf_counter()
+        try:
+            response = await runtime.http("ollama").post(
+                f"{endpoint.url}/api/generate",
+                json={"model": settings.OLLAMA_MODEL, "keep_alive": settings.OLLAMA_KEEP_ALIVE},
+                timeout=settings.OLLAMA_WARMUP_TIMEOUT_SECONDS,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not load {settings.OLLAMA_MODEL} on {endpoint.url}: {e!r}")
+            return False
+        finally:
+            endpoint.warming = False
+        logger.info(f"Loaded {settings.OLLAMA_MODEL} on {endpoint.url} in {time.perf_counter() - started:.1f}s")
+        return True
+
+    async def warm_up(self) -> None:
+        """
+        Loads the model on every host; hosts that fail stay out of rotation until a health
+        check passes. With health checks disabled (OLLAMA_HEALTH_INTERVAL_SECONDS <= 0)
+        nothing could bring them back, so they stay in rotation and are only ejected
+        after failing calls, like any other host.
+        """
+
+        self._ensure_started()
+        loaded = await asyncio.gather(*(self._warm(endpoint) for endpoint in self.endpoints))
+        health_checked = settings.OLLAMA_HEALTH_INTERVAL_SECONDS > 0
+        for endpoint, ok in zip(self.endpoints, loaded):
+            endpoint.healthy = ok or not health_checked
+            endpoint.report()
+        logger.info(f"Warmed up {sum(loaded)} of {len(self.endpoints)} Ollama hosts")
+
+    async def _check(self, endpoint: OllamaEndpoint) -> None:
+        try:
+            response = await runtime.http("ollama").get(
+                f"{endpoint.url}/api/ps", timeout=settings.OLLAMA_HEALTH_TIMEOUT_SECONDS
+            )
+            response.raise_for_status()
+            models = response.json().get("models") or []
+        except (httpx.HTTPError, ValueError) as e:
+            if endpoint.healthy:
+                logger.warning(f"Ollama host {endpoint.url} failed its health check: {e!r}")
+            endpoint.healthy = False
+            endpoint.report()
+            return
+        if not endpoint.healthy:
+            logger.info(f"Ollama host {endpoint.url} passed its health check, back in rotation")
+        endpoint.healthy = True
+        endpoint.report()
+        loaded = {name for model in models for name in (model.get("name"), model.get("model"))}
+        if not loaded & _model_names(settings.OLLAMA_MODEL) and not endpoint.warming:
+            # The host unloaded the model, e.g. after a restart: load it again in the background
+            asyncio.get_running_loop().create_task(self._warm(endpoint))
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.OLLAMA_HEALTH_INTERVAL_SECONDS)
+            try:
+                await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+                # Hosts may have come back: wake callers waiting for a free host
+                async with self._capacity:  # type: ignore[union-attr]
+                    self._capacity.notify_all()  # type: ignore[union-attr]
+            except Exception as e:
+                logger.error(f"Ollama health check failed: {e!r}")
+
+
+pool = OllamaPool(settings.ollama_endpoints, max_concurrency=settings.INFERENCE_MAX_CONCURRENCY)
+
+
+def submit_inference(input: Any, task_id: str | None = None) -> Future:
+    """
+    Starts a VLM call on the worker runtime loop right away and returns a Future for its answer.
+    The calls of all tasks in the process share `pool`, which runs at most
+    INFERENCE_MAX_CONCURRENCY of them per Ollama host and queues the rest until a host
+    frees up, so no call waits for a batch to fill.
+    Args:
+        input (Any): The model input
+        task_id (str, optional): ID of the task whose tokens are streamed, see `app.events.TokenStream`
+    Returns:
+        Future: Resolves to the model's message, or raises the error of the call
+    """
+
+    tokens = TokenStream(task_id) if settings.INFERENCE_STREAMING and task_id is not None else None
+    return runtime.submit(pool.ainvoke(input, tokens))
\ No newline at end of file
@@ -0,0 +1,174 @@
+import os
+import time
+import hashlib
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO
+from fastapi import HTTPException, UploadFile
+from app.config import settings
+from app.logging import logger
+from app.metrics import PAYLOAD_BYTES
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each supported image format and the extensions they map to
+MAGIC_SIGNATURES: list[tuple[bytes, tuple[str, ...]]] = [
+    (b"\xff\xd8\xff", (".jpg", ".jpeg")),
+    (b"\x89PNG\r\n\x1a\n", (".png",)),
+    (b"GIF87a", (".gif",)),
+    (b"GIF89a", (".gif",)),
+]
+MAGIC_LENGTH = max(len(signature) for signature, _ in MAGIC_SIGNATURES)
+
+
+@dataclass
+class IngestedUpload:
+    file: BinaryIO
+    filename: str
+    size: int
+    digest: str
+    extension: str
+    # Perceptual hash, set by `app.image.normalize_upload` / `fingerprint_upload`
+    phash: int | None = None
+
+    def read(self) -> bytes:
+        """Returns the whole upload content."""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def sniff_extension(head: bytes) -> str | None:
+    """
+    Detects the image format of an upload from its magic bytes.
+    Args:
+        head (bytes): The first bytes of the file
+    Returns:
+        str | None: The first allowed extension matching the format, None if the
+        format is unknown or not in `ALLOWED_UPLOAD_EXTENSIONS`
+    """
+
+    for signature, extensions in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            allowed = [ext for ext in extensions if ext in settings.ALLOWED_UPLOAD_EXTENSIONS]
+            return allowed[0] if allowed else None
+    return None
+
+
+def sniff_extension_for(extension: str) -> str | None:
+    """Returns the extension `sniff_extension` reports for files named with `extension`."""
+    for _, extensions in MAGIC_SIGNATURES:
+        if extension.lower() in extensions:
+            allowed = [ext for ext in extensions if ext in settings.ALLOWED_UPLOAD_EXTENSIONS]
+            return allowed[0] if allowed else None
+    return None
+
+
+class UploadIngestor:
+    """
+    Incrementally validates, hashes and spools an upload fed in chunks.
+    The size limit is enforced on every chunk and the magic bytes are checked as soon
+    as enough of the file has arrived, so invalid uploads are rejected before the
+    rest is read. Content is spooled to a temporary file once it outgrows
+    `INGEST_SPOOL_MAX_MEMORY` bytes instead of being held on the heap.
+    Args:
+        filename (str): Client-supplied name of the file
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.size = 0
+        self.extension: str | None = None
+        self._head = b""
+        self._hasher = hashlib.sha256()
+        self._spool = SpooledTemporaryFile(max_size=settings.INGEST_SPOOL_MAX_MEMORY)
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Adds a chunk of the upload.
+        Raises:
+            HTTPException: 413 if the upload exceeds `MAX_UPLOAD_SIZE`, 415 if its
+            magic bytes do not match an allowed image format
+        """
+
+        self.size += len(chunk)
+        if self.size > settings.MAX_UPLOAD_SIZE:
+            self._spool.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"File too large. Maximum size is {settings.MAX_UPLOAD_SIZE / (1024 * 1024)}MB."
+            )
+        if self.extension is None and len(self._head) < MAGIC_LENGTH:
+            self._head += chunk[:MAGIC_LENGTH - len(self._head)]
+            if len(self._head) >= MAGIC_LENGTH:
+                self._check_format()
+        self._hasher.update(chunk)
+        self._spool.write(chunk)
+
+    def _check_format(self) -> None:
+        self.extension = sniff_extension(self._head)
+        if self.extension is None:
+            self._spool.close()
+            raise HTTPException(
+                status_code=415,
+                detail=f"Unsupported file format. Allowed formats: {', '.join(settings.ALLOWED_UPLOAD_EXTENSIONS)}"
+            )
+
+    def finish(self) -> IngestedUpload:
+        """
+        Completes the upload and returns it rewound to the start.
+        Raises:
+            HTTPException: 400 if the upload is empty, 415 if its format is not allowed
+        """
+
+        if self.size == 0:
+            self._spool.close()
+            raise HTTPException(status_code=400, detail="Empty file.")
+        if self.extension is None:
+            self._check_format()
+        self._spool.seek(0)
+        # Name the file after its actual format, e.g. a PNG posted as "frame.jpg" becomes "frame.png"
+        stem, ext = os.path.splitext(self.filename)
+        if sniff_extension_for(ext) != self.extension:
+            self.filename = f"{stem or 'upload'}{self.extension}"
+        PAYLOAD_BYTES.labels("upload").observe(self.size)
+        return IngestedUpload(
+            file=self._spool,  # type: ignore[arg-type]
+            filename=self.filename,
+            size=self.size,
+            digest=self._hasher.hexdigest(),
+            extension=self.extension,  # type: ignore[arg-type]
+        )
+
+
+async def ingest_upload(file: UploadFile) -> IngestedUpload:
+    """
+    Streams a FastAPI upload through an `UploadIngestor` in `CHUNK_SIZE` reads.
+    Starlette has already spooled the request body by then, so this validates and
+    hashes that copy rather than the network stream; the request itself is bounded by
+    the upload size middlewares of `app.main`.
+    Args:
+        file (UploadFile): The uploaded file
+    Returns:
+        IngestedUpload: The validated upload with its size and SHA-256 digest
+    Raises:
+        HTTPException: If the upload is empty, too large or not an allowed image
+    """
+
+    started = time.perf_counter()
+    ingestor = UploadIngestor(file.filename or "")
+    while chunk := await file.read(CHUNK_SIZE):
+        ingestor.feed(chunk)
+    upload = ingestor.finish()
+    logger.info(f"Ingest: {upload.filename} {upload.size} bytes in {time.perf_counter() - started:.3f}s")
+    return upload
+
+
+def ingest_fileobj(fileobj: BinaryIO, filename: str) -> IngestedUpload:
+    """Synchronous counterpart of `ingest_upload` for any binary file object."""
+    ingestor = UploadIngestor(filename)
+    while chunk := fileobj.read(CHUNK_SIZE):
+        ingestor.feed(chunk)
+    return ingestor.finish()
\ No newline at end of file
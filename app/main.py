@@ -1,28 +1,32 @@
 import os
+import json
 import base64
-import cloudinary # type: ignore[no-stub]
-from redis import Redis
+import asyncio
+import time
+import hashlib
 from typing import Union
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, UploadFile, Body, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, UploadFile, Body, Form, HTTPException, Request, WebSocket
+from fastapi.responses import JSONResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from sqlmodel.ext.asyncio.session import AsyncSession
 from app.config import settings
-from app.tasks import full_annotation_flow
+from app.flows import full_annotation_flow, batch_annotation_flow
+from app.batch import iter_batch_entries
+from app.stream import CameraStream
+from app.admission import admission
+from app.metrics import HTTP_REQUESTS, exposition_registry
+from app.neardup import near_duplicates
+from app.ingest import ingest_upload
+from app.image import shutdown_process_pool
 from app.logging import logger
-from app.db import FileAnnotation, engine, create_db_and_tables
-from sqlmodel import select, Session
-
-redis = Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
-
-cloudinary.config(  # type: ignore
-    cloud_name = settings.CLOUDINARY_CLOUD_NAME, 
-    api_key = settings.CLOUDINARY_API_KEY, 
-    api_secret = settings.CLOUDINARY_API_SECRET,
-    secure = True
-)
-
+from app.db import AsyncSessionDep, async_engine, async_session_maker, create_db_and_tables, STATUS_COMPLETED, STATUS_FAILED
+from app.events import broadcaster, aget_token_buffer
+from app.repository import aget_file_annotation, aget_batch_annotations, aget_batch_progress, aget_image_annotations
+from app.cache import dedup_stats, aget_cached_result, afill_result_cache, encode_result
 
 
 def encode_image_from_path(image_path: str) -> str:
@@ -34,20 +38,150 @@ def encode_to_base64_string(image: Union[bytes, bytearray, memoryview]) -> str:
     return base64.b64encode(image).decode("utf-8")
 
 
+async def load_near_duplicate_index() -> None:
+    if not settings.NEAR_DUP_ENABLED:
+        return
+    try:
+        async with async_session_maker() as session:
+            await near_duplicates.load(session)
+    except Exception as e:
+        logger.error(f"Failed to load the near-duplicate index: {e}")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Initializing application")
     try:
-        create_db_and_tables()
+        await create_db_and_tables()
     except Exception as e:
         logger.error(f"Failed to initialize the database: {e}")
         raise
+    await broadcaster.start()
+    # Fill the near-duplicate index in the background, so startup does not wait for it
+    index_loader = asyncio.create_task(load_near_duplicate_index())
     yield
     logger.info("Shutting down application")
+    index_loader.cancel()
+    await broadcaster.stop()
+    shutdown_process_pool()
+    await async_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
 
+# Upload routes with their size limits, and the allowance for multipart boundaries and form fields
+UPLOAD_ROUTES = {
+    "/annotate": lambda: settings.MAX_UPLOAD_SIZE,
+    "/annotate/batch": lambda: settings.MAX_BATCH_UPLOAD_SIZE,
+}
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def upload_too_large(limit: int) -> str:
+    return f"File too large. Maximum size is {limit / (1024 * 1024)}MB."
+
+
+class CountUploadBytes:
+    """
+    Aborts uploads whose body grows past the limit of their route while it is received.
+    `enforce_upload_size` can only refuse a declared Content-Length, so a chunked upload
+    without one is counted here instead of being spooled to the end. It is the innermost
+    middleware, so the 413 raised while the form is parsed reaches FastAPI's exception
+    handler directly.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in UPLOAD_ROUTES:
+            return await self.app(scope, receive, send)
+        limit = UPLOAD_ROUTES[scope["path"]]()
+        received = 0
+
+        async def counted_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit + MULTIPART_OVERHEAD:
+                    raise HTTPException(status_code=413, detail=upload_too_large(limit))
+            return message
+
+        await self.app(scope, counted_receive, send)
+
+
+app.add_middleware(CountUploadBytes)
+
+
+@app.middleware("http")
+async def admit_uploads(request: Request, call_next):
+    """
+    Applies admission control to the upload routes before their body is received.
+    Requests are refused with 429 and a `Retry-After` header when the pipeline is
+    saturated or the client has exceeded its rate limit, see `app.admission`. Admitted
+    requests carry the current estimated queueing delay in `X-Estimated-Wait` (seconds),
+    so clients can pace themselves before they are refused.
+    """
+
+    if request.method != "POST" or request.url.path not in UPLOAD_ROUTES:
+        return await call_next(request)
+    decision = await admission.admit(request.client.host if request.client else "unknown")
+    if not decision.admitted:
+        detail = "Too many requests." if decision.reason == "rate_limited" else "Service is saturated."
+        return JSONResponse(
+            {
+                "detail": f"{detail} Retry in {decision.retry_after_header}s.",
+                "reason": decision.reason,
+                "retry_after": decision.retry_after,
+                "estimated_wait": decision.estimated_wait,
+            },
+            status_code=429,
+            headers={"Retry-After": decision.retry_after_header},
+        )
+    response = await call_next(request)
+    response.headers["X-Estimated-Wait"] = f"{decision.estimated_wait:.1f}"
+    return response
+
+
+@app.middleware("http")
+async def enforce_upload_size(request: Request, call_next):
+    """
+    Rejects uploads whose declared Content-Length exceeds the limit of their route,
+    MAX_UPLOAD_SIZE for single images and MAX_BATCH_UPLOAD_SIZE for batches.
+    The check runs before the multipart body is received, so oversized uploads are
+    refused without being buffered. Uploads without a Content-Length are aborted
+    once their body passes the limit, see `CountUploadBytes`.
+    """
+
+    if request.method == "POST" and request.url.path in UPLOAD_ROUTES:
+        limit = UPLOAD_ROUTES[request.url.path]()
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > limit + MULTIPART_OVERHEAD:
+            return JSONResponse({"detail": upload_too_large(limit)}, status_code=413)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Records the duration of every request by method, route template and status code.
+    It is the outermost middleware, so refused uploads (413, 429) are counted too. Paths
+    that match no route share one label, so scanners cannot blow up the label set.
+    """
+
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUESTS.labels(
+            request.method, route.path if route is not None else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
 
 static_directory = os.path.join(os.path.dirname(__file__), "static")
 app.mount("/static", StaticFiles(directory=static_directory), name="static")
@@ -83,62 +217,492 @@ def results(id: str, request: Request) -> HTMLResponse:
 
     return templates.TemplateResponse("results.html", context={"request": request, "id": id})
 
+@app.get("/batches/{id}")
+def batch_results(id: str, request: Request) -> HTMLResponse:
+    """
+    Renders the progress and results page of a batch, the page its email links to.
+    Args:
+        id (str): The batch ID returned by `/annotate/batch`.
+        request (Request): The FastAPI request object.
+    Returns:
+        HTMLResponse: The rendered 'batch.html' template, which polls `/api/batches/{id}`.
+    """
+
+    return templates.TemplateResponse(request, "batch.html", context={"id": id})
+
+
+def resolve_prompts(prompts: list[str] | None, prompt_set: str | None) -> list[str]:
+    """
+    Returns the distinct prompts of a request, in the order given.
+    Args:
+        prompts (list[str] | None): Prompts sent with the request
+        prompt_set (str | None): Name of a prompt set of PROMPT_SETS
+    Returns:
+        list[str]: The prompts, or [DEFAULT_PROMPT] if the request names none
+    Raises:
+        HTTPException: 400 if both or an unknown prompt set are given, or there are more
+        than MAX_PROMPTS_PER_REQUEST prompts
+    """
 
-prompt = "What's in this image?"
+    if prompt_set:
+        if prompts:
+            raise HTTPException(status_code=400, detail="Send either prompts or prompt_set, not both.")
+        if prompt_set not in settings.PROMPT_SETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown prompt set. Available sets: {', '.join(settings.PROMPT_SETS)}",
+            )
+        prompts = settings.PROMPT_SETS[prompt_set]
+    resolved = list(dict.fromkeys(text.strip() for text in prompts or [] if text.strip()))
+    if len(resolved) > settings.MAX_PROMPTS_PER_REQUEST:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many prompts. Maximum is {settings.MAX_PROMPTS_PER_REQUEST} per request.",
+        )
+    return resolved or [settings.DEFAULT_PROMPT]
 
 
 @app.post("/annotate")
-async def annotate(file: UploadFile, email: str = Body(...)) -> JSONResponse:
+async def annotate(
+    file: UploadFile,
+    email: str = Body(...),
+    prompts: list[str] | None = Form(None),
+    prompt_set: str | None = Form(None),
+) -> JSONResponse:
     """
     Asynchronously handles file annotation requests.
     This endpoint receives a file and an email address, initiates the annotation process,
-    and returns a response with a tracking ID.
+    and returns a response with a tracking ID per prompt. The image is stored and encoded
+    once however many prompts it is annotated with, and every (image, prompt) pair gets its
+    own result. Identical uploads with the same prompt resolve to the tracking ID of the
+    first request instead of starting a new chain.
+    The upload is read in chunks, hashed and validated by its magic bytes before
+    anything is enqueued.
     Args:
         file (UploadFile): The file to be annotated, uploaded through FastAPI
         email (str): Email address of the user requesting annotation, passed in request body
+        prompts (list[str], optional): Prompts to annotate the image with, one form field each
+        prompt_set (str, optional): Name of a prompt set of PROMPT_SETS, instead of `prompts`
     Returns:
         JSONResponse: A JSON response containing:
             - message: Status message indicating annotation has started
-            - id: Unique identifier for tracking the annotation process
+            - id: Unique identifier for tracking the annotation of the first prompt
+            - ids: Tracking ID of every prompt, in the order of `prompts`
+            - prompts: The prompts the image is annotated with
+            - image_id: Identifier of the image, see `/api/images/{image_id}`; null if every
+              prompt resolved to an earlier upload
     Raises:
-        HTTPException: If file upload fails or file format is invalid
+        HTTPException: 400 if the prompts are invalid, 413 if the file is too large, 415 if
+        its format is not allowed
     Example:
         {
             "message": "Annotation in progress",
-            "id": "66a3183c-969c-47c8-9039-26892c6bd911"
+            "id": "66a3183c-969c-47c8-9039-26892c6bd911",
+            "ids": ["66a3183c-969c-47c8-9039-26892c6bd911"],
+            "prompts": ["What's in this image?"],
+            "image_id": "9b1f0c5e-7f0d-4a43-9d7e-2f7c1f3b7c11"
         }
     """
 
-    file_bytes = await file.read()
-    filename = file.filename or ""
-
-    result = full_annotation_flow(file_bytes, filename, prompt, email=email)
-    response = {"message": "Annotation in progress", "id": result.id}
+    resolved = resolve_prompts(prompts, prompt_set)
+    upload = await ingest_upload(file)
+    try:
+        result = await run_in_threadpool(full_annotation_flow, upload, resolved, email=email)
+    finally:
+        upload.close()
+    response = {
+        "message": "Annotation in progress",
+        "id": result.id,
+        "ids": result.ids,
+        "prompts": result.prompts,
+        "image_id": result.image_id,
+    }
     return JSONResponse(response)
 
 
+@app.post("/annotate/batch")
+async def annotate_batch(
+    files: list[UploadFile],
+    email: str = Body(""),
+    prompts: list[str] | None = Form(None),
+    prompt_set: str | None = Form(None),
+) -> JSONResponse:
+    """
+    Handles batch annotation requests.
+    Accepts many image files, or zip/tar archives of images, in one request. Archive
+    entries are streamed out of the archive without extracting it to disk. The whole
+    batch gets one batch ID, its rows are inserted in one statement and its work is
+    fanned out as one Celery group. A single email is sent once every image is done.
+    Args:
+        files (list[UploadFile]): Images and/or zip or tar archives of images
+        email (str, optional): Email address notified once the whole batch has finished
+        prompts (list[str], optional): Prompts to annotate every image with
+        prompt_set (str, optional): Name of a prompt set of PROMPT_SETS, instead of `prompts`
+    Returns:
+        JSONResponse: A JSON response containing:
+            - message: Status message indicating annotation has started
+            - batch_id: Identifier for tracking the batch, see `/api/batches/{batch_id}`
+            - ids: Task ID of every accepted (image, prompt) pair, usable with `/api/results/{id}`
+            - images: image_id, filename and per-prompt ids of every accepted image
+            - prompts: The prompts every image is annotated with
+            - rejected: filename and detail of every entry that is not a valid image
+    Raises:
+        HTTPException: 400 if the prompts are invalid or no entry is a valid image, 413 if
+        the request or the number of images exceeds the batch limits
+    Example:
+        {
+            "message": "Batch annotation in progress",
+            "batch_id": "0f4c9c1e-3c44-4e8e-a0f5-8f0a1f5d2b7e",
+            "ids": ["66a3183c-969c-47c8-9039-26892c6bd911"],
+            "images": [{"image_id": "9b1f...", "filename": "cat.jpg", "ids": ["66a3183c-969c-47c8-9039-26892c6bd911"]}],
+            "prompts": ["What's in this image?"],
+            "rejected": [{"filename": "notes.txt", "detail": "Unsupported file format. ..."}]
+        }
+    """
+
+    resolved = resolve_prompts(prompts, prompt_set)
+    entries = iter_batch_entries((file.filename or "", file.file) for file in files)  # type: ignore[misc]
+    batch = await run_in_threadpool(batch_annotation_flow, entries, resolved, email=email)
+    return JSONResponse({"message": "Batch annotation in progress", **batch})
+
+
+async def load_result(id: str, session: AsyncSession) -> bytes | None:
+    """
+    Reads the encoded result of a task through the Redis result cache.
+    The database is only queried on a cache miss, and the answer is written back so
+    repeated reads of the same task, stored or still pending, are served from Redis.
+    The session connects lazily, so a cache hit never checks out a pooled connection.
+    Parameters:
+        id (str): The task ID to look up.
+        session (AsyncSession): Session used on a cache miss.
+    Returns:
+        bytes | None: The JSON body with annotation, file_url and status, or None if pending.
+    """
+
+    cached = await aget_cached_result(id)
+    if cached is not None:
+        return cached or None
+
+    result = await aget_file_annotation(session, id)
+    body = None
+    # Batch items exist as pending rows until their annotation is written
+    if result is not None and result.annotation is not None:
+        body = encode_result({"annotation": result.annotation, "file_url": result.file_url, "status": STATUS_COMPLETED})
+    elif result is not None and result.status == STATUS_FAILED:
+        body = encode_result({"annotation": None, "file_url": None, "status": STATUS_FAILED, "error": result.error})
+    await afill_result_cache(id, body)
+    return body
+
+
+async def lookup_result(id: str) -> dict | None:
+    """Returns the stored result of a task, or None if pending, on a short-lived session."""
+    async with async_session_maker() as session:
+        body = await load_result(id, session)
+    return json.loads(body) if body is not None else None
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
 @app.get("/api/results/{id}")
-def api_results(id: str):
+async def api_results(id: str, request: Request, session: AsyncSessionDep):
     """
-    Retrieves annotation results for a specific task ID from the database.
+    Retrieves annotation results for a specific task ID.
     Parameters:
         id (str): The task ID to search for in the database.
+        request (Request): Used to read the `If-None-Match` header.
+        session (AsyncSession): Pooled asyncpg session, see `app.db.get_async_db`.
+    Returns:
+        Response: A JSON response containing:
+            - annotation: The annotation data for the task (None if not found or failed)
+            - file_url: The associated file URL (None if not found or failed)
+            - status: "completed", or "failed" once the annotation gave up after its retries
+            - error: Why the annotation failed (failed tasks only)
+            With status code 200 if found or failed, 304 if the client's ETag still matches,
+            404 if still pending or not found.
+    Note:
+        Reads go through `load_result`, so most requests never reach PostgreSQL.
+        A stored result carries an ETag and may be reused by browsers and proxies for
+        RESULT_HTTP_MAX_AGE seconds; a pending one must not be cached by the client.
+    """
+
+    body = await load_result(id, session)
+    if body is None:
+        return JSONResponse(
+            {"annotation": None, "file_url": None},
+            status_code=404,
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.RESULT_HTTP_MAX_AGE}"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/images/{id}")
+async def api_image(id: str, session: AsyncSessionDep) -> JSONResponse:
+    """
+    Lists the annotation of every prompt of an image.
+    Parameters:
+        id (str): The image ID returned by `/annotate` or `/annotate/batch`.
+        session (AsyncSession): Pooled asyncpg session, see `app.db.get_async_db`.
     Returns:
         JSONResponse: A JSON response containing:
-            - annotation: The annotation data for the task (None if not found)
-            - file_url: The associated file URL (None if not found)
+            - image_id: The image ID
+            - file_url: URL of the uploaded image, None until it is stored
+            - results: id, prompt, status, annotation and error of every prompt
             With status code 200 if found, 404 if not found.
     Note:
-        Uses SQLModel Session to query the FileAnnotation table.
-        Returns 404 if no matching task_id is found.
-    """
-
-    with Session(engine) as session:
-        stmt = select(FileAnnotation).where(FileAnnotation.task_id == id)
-        result = session.exec(stmt).first()
-        if not result:
-            return JSONResponse({"annotation": None, "file_url": None}, status_code=404)
-        return JSONResponse({
-            "annotation": result.annotation,
-            "file_url": result.file_url
-        })
\ No newline at end of file
+        Rows of a single upload are written when its annotations are stored, so this is
+        404 until then; each prompt can also be read on its own with `/api/results/{id}`.
+    """
+
+    rows = await aget_image_annotations(session, id)
+    if not rows:
+        return JSONResponse({"detail": "Image not found"}, status_code=404)
+    return JSONResponse({
+        "image_id": id,
+        "file_url": next((row.file_url for row in rows if row.file_url), None),
+        "results": [
+            {
+                "id": row.task_id,
+                "prompt": row.prompt,
+                "status": row.status,
+                "annotation": row.annotation,
+                "error": row.error,
+            }
+            for row in rows
+        ],
+    })
+
+
+@app.get("/api/batches/{id}")
+async def api_batch(id: str, session: AsyncSessionDep) -> JSONResponse:
+    """
+    Reports the progress of a batch.
+    Parameters:
+        id (str): The batch ID returned by `/annotate/batch`.
+        session (AsyncSession): Pooled asyncpg session, see `app.db.get_async_db`.
+    Returns:
+        JSONResponse: A JSON response containing:
+            - batch_id: The batch ID
+            - total: Number of images in the batch
+            - completed: Number of annotated images
+            - failed: Number of images whose annotation failed
+            - pending: Number of images still in progress
+            - done: Whether every image has finished
+            - items: id, image_id, prompt and status of every result, by image and prompt
+            With status code 200 if found, 404 if not found.
+    Note:
+        Counts come from one aggregate query over the batch rows.
+    """
+
+    total, completed, failed = await aget_batch_progress(session, id)
+    if total == 0:
+        return JSONResponse({"detail": "Batch not found"}, status_code=404)
+    pending = max(total - completed - failed, 0)
+    rows = await aget_batch_annotations(session, id)
+    return JSONResponse({
+        "batch_id": id,
+        "total": total,
+        "completed": completed,
+        "failed": failed,
+        "pending": pending,
+        "done": pending == 0,
+        "items": [
+            {"id": row.task_id, "image_id": row.image_id, "prompt": row.prompt, "status": row.status}
+            for row in rows
+        ],
+    })
+
+
+@app.get("/api/cache/stats")
+def api_cache_stats():
+    """
+    Returns the dedup cache counters.
+    Returns:
+        JSONResponse: A JSON response containing hits, misses, hit_rate and entries of
+        the exact dedup cache, and under `near_duplicate` the counters and lookup
+        latency of this process's near-duplicate cache.
+    """
+
+    return JSONResponse({**dedup_stats(), "near_duplicate": near_duplicates.stats()})
+
+
+@app.get("/api/admission")
+async def api_admission():
+    """
+    Returns the load that admission control decides on.
+    Returns:
+        JSONResponse: A JSON response containing, per stage (`io`, `inference`), the
+        queue depth, running tasks, mean task runtime and estimated wait, the overall
+        `estimated_wait` of a new job in seconds, and whether uploads are being refused.
+    """
+
+    return JSONResponse(await admission.stats())
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """
+    Exports the API's metrics in the Prometheus text format.
+    Task runtimes, queue waits, retries and outbound calls made by the workers are served
+    by each worker's exporter on METRICS_WORKER_PORT.
+    """
+
+    return Response(generate_latest(exposition_registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.get("/api/results/{id}/events")
+async def api_result_events(id: str) -> StreamingResponse:
+    """
+    Streams the annotation result for a task ID as Server-Sent Events.
+    The stream emits a single `result` event, carrying the same body as `/api/results/{id}`,
+    as soon as the annotation is stored or has failed (`status` tells which), and then closes.
+    While waiting, it sends a comment line every SSE_HEARTBEAT_SECONDS to keep proxies
+    from dropping the connection. Waiting clients hold no database connection: the
+    database is checked once, and completion is pushed by the workers over Redis pub/sub.
+    Parameters:
+        id (str): The task ID to wait for.
+    Returns:
+        StreamingResponse: A `text/event-stream` response.
+    """
+
+    # Register before checking the database, so a completion between the two is not missed
+    queue = broadcaster.register(id)
+
+    async def stream():
+        try:
+            payload = await lookup_result(id)
+            while payload is None:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if payload is None:
+                    # The subscription reconnected and may have missed the event
+                    payload = await lookup_result(id)
+            yield format_sse("result", payload)
+        finally:
+            broadcaster.unregister(id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/results/{id}/tokens")
+async def api_result_tokens(id: str) -> StreamingResponse:
+    """
+    Streams the annotation of a task as it is generated, as Server-Sent Events.
+    The stream emits:
+        - `tokens`: `{"text": "..."}`, text to append to what was received so far
+        - `reset`: the answer restarted, e.g. on a retry; drop the text received so far
+        - `result`: the stored result, with the same body as `/api/results/{id}`, then closes
+    Text generated before the client connected is sent first, from the token buffer of
+    `app.events.TokenStream`. Without INFERENCE_STREAMING, only the `result` event is sent.
+    Heartbeats and waiting work as in `/api/results/{id}/events`.
+    Parameters:
+        id (str): The task ID to wait for.
+    Returns:
+        StreamingResponse: A `text/event-stream` response.
+    """
+
+    # Register before reading the buffer and the database, so nothing in between is missed
+    results = broadcaster.register(id)
+    tokens = broadcaster.register_tokens(id)
+
+    async def stream():
+        sent = 0
+        next_result: asyncio.Future | None = None
+        next_token: asyncio.Future | None = None
+        try:
+            payload = await lookup_result(id)
+            if payload is None:
+                text = await aget_token_buffer(id)
+                if text:
+                    sent = len(text)
+                    yield format_sse("tokens", {"text": text})
+            while payload is None:
+                next_result = next_result or asyncio.ensure_future(results.get())
+                next_token = next_token or asyncio.ensure_future(tokens.get())
+                done, _ = await asyncio.wait(
+                    {next_result, next_token},
+                    timeout=settings.SSE_HEARTBEAT_SECONDS,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    yield ": keep-alive\n\n"
+                    continue
+                if next_token in done:
+                    message, next_token = next_token.result(), None
+                    if message.get("reset"):
+                        sent = 0
+                        yield format_sse("reset", {})
+                    elif message["offset"] + len(message["text"]) > sent:
+                        if message["offset"] > sent:
+                            # A message was missed, e.g. while the subscription reconnected
+                            text = (await aget_token_buffer(id))[sent:]
+                        else:
+                            text = message["text"][sent - message["offset"]:]
+                        sent += len(text)
+                        if text:
+                            yield format_sse("tokens", {"text": text})
+                if next_result in done:
+                    payload, next_result = next_result.result(), None
+                    if payload is None:
+                        # The subscription reconnected and may have missed the event
+                        payload = await lookup_result(id)
+            yield format_sse("result", payload)
+        finally:
+            for waiter in (next_result, next_token):
+                if waiter is not None:
+                    waiter.cancel()
+            broadcaster.unregister(id, results)
+            broadcaster.unregister_tokens(id, tokens)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/stream/{camera_id}")
+async def stream_frames(websocket: WebSocket, camera_id: str, email: str = "", prompt_set: str = "") -> None:
+    """
+    Ingests a stream of camera frames over one WebSocket connection.
+    The client sends each frame as a binary message without waiting for earlier ones.
+    Frames whose dHash is within STREAM_CHANGE_THRESHOLD bits of the last annotated
+    frame are skipped; significant frames go through the regular annotation workflow,
+    and their results are pushed back on the same connection. See `app.stream.CameraStream`
+    for the messages sent to the client.
+    Parameters:
+        websocket (WebSocket): The WebSocket connection.
+        camera_id (str): Identifier of the camera.
+        email (str, optional): Email address notified of every annotation.
+        prompt_set (str, optional): Name of a prompt set of PROMPT_SETS to annotate every
+            frame with, DEFAULT_PROMPT otherwise.
+    """
+
+    await websocket.accept()
+    try:
+        prompts = resolve_prompts(None, prompt_set)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await CameraStream(websocket, camera_id, prompts, email, lookup_result).run()
\ No newline at end of file
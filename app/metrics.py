@@ -0,0 +1,185 @@
+import os
+import time
+from contextlib import contextmanager
+from collections.abc import Iterator
+from datetime import datetime
+import httpx
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, multiprocess, start_http_server
+from app.logging import logger
+
+# Latency buckets from 5ms to 5min: database writes sit at the low end, VLM calls at the high end
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = tuple(2 ** exponent for exponent in range(8, 28, 2))
+
+TASK_RUNTIME = Histogram(
+    "pipeline_task_runtime_seconds",
+    "Runtime of Celery tasks",
+    ["task", "queue", "state"],
+    buckets=LATENCY_BUCKETS,
+)
+TASK_QUEUE_WAIT = Histogram(
+    "pipeline_task_queue_wait_seconds",
+    "Time between publishing a Celery task (or its ETA) and a worker starting it",
+    ["task", "queue"],
+    buckets=LATENCY_BUCKETS,
+)
+TASK_RETRIES = Counter("pipeline_task_retries_total", "Retries of Celery tasks", ["task"])
+PAYLOAD_BYTES = Histogram(
+    "pipeline_payload_bytes",
+    "Size of uploads as received, as staged after normalization, and of stored annotations",
+    ["kind"],
+    buckets=SIZE_BUCKETS,
+)
+FLOW_STAGE_SECONDS = Histogram(
+    "pipeline_flow_stage_seconds",
+    "Time spent in the API-side stages of an annotation flow",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+OUTBOUND_CALLS = Histogram(
+    "pipeline_outbound_call_seconds",
+    "Duration and outcome of calls to external services (Cloudinary, Ollama, SMTP, PostgreSQL), HTTP calls up to the end of the response body",
+    ["service", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CIRCUIT_OPEN = Gauge(
+    "pipeline_circuit_open",
+    "Whether the circuit breaker of an external service is open (1) or closed (0)",
+    ["service"],
+    multiprocess_mode="max",
+)
+FIRST_TOKEN_SECONDS = Histogram(
+    "pipeline_inference_first_token_seconds",
+    "Time from sending a streamed VLM call to its first token",
+    buckets=LATENCY_BUCKETS,
+)
+OLLAMA_ENDPOINT_UP = Gauge(
+    "pipeline_ollama_endpoint_up",
+    "Whether an Ollama host is in the rotation of the inference pool (1) or not (0)",
+    ["endpoint"],
+    multiprocess_mode="min",
+)
+OLLAMA_ENDPOINT_OUTSTANDING = Gauge(
+    "pipeline_ollama_endpoint_outstanding",
+    "Requests in flight to an Ollama host",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+OLLAMA_ENDPOINT_LATENCY = Gauge(
+    "pipeline_ollama_endpoint_latency_seconds",
+    "Exponentially weighted moving average of the request latency of an Ollama host",
+    ["endpoint"],
+    multiprocess_mode="max",
+)
+HTTP_REQUESTS = Histogram(
+    "pipeline_http_request_seconds",
+    "Duration of API requests by route template and status code",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+def exposition_registry() -> CollectorRegistry:
+    """
+    Returns the registry to export.
+    With PROMETHEUS_MULTIPROC_DIR set, e.g. for prefork workers or several uvicorn
+    workers, the samples of every process are collected from that directory.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def start_exporter(port: int) -> None:
+    """Serves the metrics of this (worker) process on `port`, 0 disables the exporter."""
+    if port <= 0:
+        return
+    try:
+        start_http_server(port, registry=exposition_registry())
+        logger.info(f"Metrics exporter listening on port {port}")
+    except OSError as e:
+        logger.warning(f"Metrics exporter not started on port {port}: {e}")
+
+
+def observe_queue_wait(task: str, queue: str, published_at: float, eta: str | datetime | None = None) -> None:
+    """Records the queue wait of a task, counted from its ETA for delayed tasks."""
+    ready_at = published_at
+    if eta is not None:
+        eta_at = (eta if isinstance(eta, datetime) else datetime.fromisoformat(eta)).timestamp()
+        ready_at = max(ready_at, eta_at)
+    TASK_QUEUE_WAIT.labels(task, queue).observe(max(time.time() - ready_at, 0.0))
+
+
+@contextmanager
+def observe_call(service: str) -> Iterator[None]:
+    """Times a call to an external service and records whether it raised."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        OUTBOUND_CALLS.labels(service, outcome).observe(time.perf_counter() - started)
+
+
+class _TimedStream(httpx.AsyncByteStream):
+    """Response body that records its call in OUTBOUND_CALLS once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, service: str, outcome: str, started: float):
+        self._stream = stream
+        self._service = service
+        self._outcome = outcome
+        self._started = started
+        self._recorded = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except Exception:
+            self._outcome = "error"
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._recorded:
+                self._recorded = True
+                OUTBOUND_CALLS.labels(self._service, self._outcome).observe(time.perf_counter() - self._started)
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records every request of an outbound service in OUTBOUND_CALLS.
+    The outcome is the status class ("2xx", "4xx", ...) or "error" if no response arrived,
+    e.g. on a connect error or timeout, or if the body broke off. The duration ends when
+    the response body is closed, so streamed Ollama generations are timed to their last
+    token, not to their headers.
+    Args:
+        service (str): Service label, e.g. "cloudinary"
+        transport (httpx.AsyncBaseTransport): The transport doing the actual work
+    """
+
+    def __init__(self, service: str, transport: httpx.AsyncBaseTransport):
+        self.service = service
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            OUTBOUND_CALLS.labels(self.service, "error").observe(time.perf_counter() - started)
+            raise
+        response.stream = _TimedStream(
+            response.stream, self.service, f"{response.status_code // 100}xx", started  # type: ignore[arg-type]
+        )
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
\ No newline at end of file
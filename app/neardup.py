@@ -0,0 +1,212 @@
+import json
+import time
+import threading
+from array import array
+from collections import deque
+from itertools import combinations
+import numpy as np
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.cache import redis, result_cache_key
+from app.config import settings
+from app.db import engine
+from app.logging import logger
+from app.repository import get_file_annotation, aiter_phash_entries
+
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+CHUNK_MASK = (1 << CHUNK_BITS) - 1
+
+
+def to_signed64(value: int) -> int:
+    """Maps an unsigned 64-bit hash onto PostgreSQL's signed BIGINT range."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+def _flip_masks(radius: int) -> list[int]:
+    """Returns every CHUNK_BITS-bit mask with at most `radius` bits set."""
+    masks = [0]
+    for bits in range(1, radius + 1):
+        for positions in combinations(range(CHUNK_BITS), bits):
+            mask = 0
+            for position in positions:
+                mask |= 1 << position
+            masks.append(mask)
+    return masks
+
+
+class MultiIndexHashTable:
+    """
+    Index of 64-bit hashes for Hamming-radius search (multi-index hashing).
+    Each hash is split into CHUNKS substrings of CHUNK_BITS bits, and each substring
+    position has its own table from substring value to entry ids. Two hashes within
+    `max_distance` bits of each other must, by pigeonhole, agree on at least one
+    substring up to `max_distance // CHUNKS` bits, so a search only probes those few
+    buckets and verifies their entries with numpy instead of scanning the whole index,
+    which keeps lookups well under a millisecond at millions of entries. Hashes and
+    bucket entries are kept in typed arrays, about 24 bytes per entry plus its task id.
+    Args:
+        max_distance (int): Largest Hamming distance a search has to find
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self._masks = _flip_masks(max_distance // CHUNKS)
+        self._hashes = array("Q")
+        self._ids: list[str] = []
+        self._tables: list[dict[int, array]] = [{} for _ in range(CHUNKS)]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, value: int, task_id: str) -> None:
+        with self._lock:
+            entry = len(self._ids)
+            self._hashes.append(value)
+            self._ids.append(task_id)
+            for chunk, table in enumerate(self._tables):
+                key = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+                bucket = table.get(key)
+                if bucket is None:
+                    table[key] = bucket = array("I")
+                bucket.append(entry)
+
+    def search(self, value: int) -> tuple[str, int] | None:
+        """
+        Finds the closest indexed hash within `max_distance` bits.
+        Returns:
+            tuple[str, int] | None: The task id of the closest entry and its distance
+        """
+
+        with self._lock:
+            if not self._ids:
+                return None
+            buckets = []
+            for chunk, table in enumerate(self._tables):
+                key = (value >> (chunk * CHUNK_BITS)) & CHUNK_MASK
+                for mask in self._masks:
+                    bucket = table.get(key ^ mask)
+                    if bucket is not None:
+                        buckets.append(np.frombuffer(bucket, dtype=np.uint32))
+            if not buckets:
+                return None
+            # Candidates are verified in one vectorized pass; entries found through several
+            # substrings are simply checked twice
+            entries = np.concatenate(buckets)
+            hashes = np.frombuffer(self._hashes, dtype=np.uint64)
+            distances = np.bitwise_count(hashes[entries] ^ np.uint64(value))
+            # Views pin the arrays' buffers, release them before `add` may grow the arrays
+            del hashes, buckets
+        best = int(distances.argmin())
+        if distances[best] > self.max_distance:
+            return None
+        return self._ids[int(entries[best])], int(distances[best])
+
+
+class NearDuplicateCache:
+    """
+    Near-duplicate annotation cache keyed on perceptual hashes.
+    Entries are grouped per prompt and model, so an annotation is only reused for the
+    same question asked of the same model. Each API process holds its own index, filled
+    from PostgreSQL at startup (`load`) and with the uploads it enqueues afterwards.
+    Hit rate and lookup latency are tracked per process, see `stats`.
+    Args:
+        max_distance (int): Largest Hamming distance between the pHashes of two images
+            that are treated as the same scene
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        self._indexes: dict[tuple[str, str], MultiIndexHashTable] = {}
+        self._lock = threading.Lock()
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self.hits = 0
+        self.misses = 0
+
+    def _index(self, prompt: str, model: str) -> MultiIndexHashTable:
+        index = self._indexes.get((prompt, model))
+        if index is None:
+            with self._lock:
+                index = self._indexes.setdefault((prompt, model), MultiIndexHashTable(self.max_distance))
+        return index
+
+    def add(self, value: int, prompt: str, model: str, task_id: str) -> None:
+        self._index(prompt, model).add(value, task_id)
+
+    def lookup(self, value: int, prompt: str, model: str) -> tuple[str, int] | None:
+        """
+        Finds an indexed image within `max_distance` bits of `value` for the same prompt and model.
+        Returns:
+            tuple[str, int] | None: The task id of the closest image and its distance
+        """
+
+        started = time.perf_counter()
+        index = self._indexes.get((prompt, model))
+        match = index.search(value) if index is not None else None
+        self._latencies.append(time.perf_counter() - started)
+        return match
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> dict[str, float | int]:
+        """
+        Returns the cache counters of this process.
+        Returns:
+            dict[str, float | int]: Dictionary containing:
+                - hits: Uploads that reused the annotation of a near-duplicate
+                - misses: Uploads that were sent to the model
+                - hit_rate: hits / (hits + misses), 0.0 before any lookup
+                - entries: Number of indexed images
+                - lookup_p50_ms, lookup_p99_ms, lookup_max_ms: Index lookup latency
+                  over the last 1000 lookups
+        """
+
+        total = self.hits + self.misses
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": sum(len(index) for index in self._indexes.values()),
+            "lookup_p50_ms": percentile(0.5),
+            "lookup_p99_ms": percentile(0.99),
+            "lookup_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        }
+
+    async def load(self, session: AsyncSession) -> None:
+        """Indexes every annotated FileAnnotation that has a perceptual hash."""
+        started = time.perf_counter()
+        count = 0
+        async for value, prompt, model, task_id in aiter_phash_entries(session):
+            self.add(to_unsigned64(value), prompt or "", model or "", task_id)
+            count += 1
+        logger.info(f"Loaded {count} near-duplicate cache entries in {time.perf_counter() - started:.2f}s")
+
+
+def stored_annotation(task_id: str) -> str | None:
+    """Returns the annotation of a task from the result cache or the database, None if pending."""
+    cached = redis.get(result_cache_key(task_id))
+    if cached:
+        return json.loads(cached).get("annotation")
+    with Session(engine) as session:
+        result = get_file_annotation(session, task_id)
+    return result.annotation if result is not None else None
+
+
+near_duplicates = NearDuplicateCache(settings.NEAR_DUP_MAX_DISTANCE)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import re
+from app.cache import redis
+from app.config import settings
+
+NOTIFY_PREFIX = "notify"
+EMAIL_REGEX = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+
+
+def is_valid_email(email: str) -> bool:
+    """
+    Validates an email address format using a regular expression pattern.
+    Args:
+        email (str): The email address to validate.
+    Returns:
+        bool: True if the email format is valid, False otherwise.
+    Example:
+        >>> is_valid_email("user@example.com")
+        True
+        >>> is_valid_email("invalid-email")
+        False
+    """
+
+    return re.match(EMAIL_REGEX, email) is not None
+
+
+def _queue_key(email: str) -> str:
+    return f"{NOTIFY_PREFIX}:{email.lower()}"
+
+
+def _scheduled_key(email: str) -> str:
+    return f"{NOTIFY_PREFIX}:{email.lower()}:scheduled"
+
+
+def _window_key(email: str) -> str:
+    return f"{NOTIFY_PREFIX}:{email.lower()}:window"
+
+
+def open_digest_window(email: str) -> bool:
+    """
+    Opens the digest window of a recipient unless one is already open.
+    The notification that opens the window is sent right away, so a lone result is not
+    held back; only the results that follow it within EMAIL_DIGEST_WINDOW_SECONDS are
+    queued and coalesced into one digest.
+    Args:
+        email (str): Recipient's email address
+    Returns:
+        bool: True if the caller opened the window and must send its notification now
+    """
+
+    return bool(redis.set(_window_key(email), 1, nx=True, ex=settings.EMAIL_DIGEST_WINDOW_SECONDS))
+
+
+def queue_notification(email: str, link: str) -> bool:
+    """
+    Adds a result link to the pending digest of a recipient.
+    The first link of a digest claims a short-lived marker, and its caller is the one
+    that schedules the flush. The marker outlives the digest window by a grace period,
+    so a flush that was lost lets the next link schedule a new one instead of leaving
+    the queue stuck.
+    Args:
+        email (str): Recipient's email address
+        link (str): Link to the result page
+    Returns:
+        bool: True if the caller must schedule the flush of this recipient's digest
+    """
+
+    pipe = redis.pipeline()
+    pipe.rpush(_queue_key(email), link)
+    pipe.set(_scheduled_key(email), 1, nx=True, ex=settings.EMAIL_DIGEST_WINDOW_SECONDS * 2 + 60)
+    _, claimed = pipe.execute()
+    return bool(claimed)
+
+
+def take_notifications(email: str) -> list[str]:
+    """
+    Removes and returns every pending link of a recipient in one MULTI/EXEC.
+    Links queued afterwards start a new digest.
+    """
+
+    pipe = redis.pipeline()
+    pipe.lrange(_queue_key(email), 0, -1)
+    pipe.delete(_queue_key(email), _scheduled_key(email))
+    links, _ = pipe.execute()
+    return [link.decode("utf-8") for link in links]
\ No newline at end of file
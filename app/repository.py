@@ -0,0 +1,205 @@
+from collections.abc import AsyncIterator
+from typing import Any
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
+from app.config import settings
+from app.db import FileAnnotation, engine, STATUS_PENDING, STATUS_COMPLETED, STATUS_FAILED
+from app.runtime import MicroBatcher
+from app.metrics import observe_call
+
+# Every FileAnnotation query lives here, with a sync variant for the workers and an async
+# variant for the API routes built from the same statement.
+
+UPSERT_COLUMNS = (
+    "task_id", "file_url", "annotation", "batch_id", "image_id", "phash", "prompt", "model", "status", "error",
+)
+
+
+def _file_annotation_by_task_id(task_id: str) -> SelectOfScalar[FileAnnotation]:
+    return select(FileAnnotation).where(FileAnnotation.task_id == task_id)
+
+
+async def aget_image_annotations(session: AsyncSession, image_id: str) -> list[FileAnnotation]:
+    """Returns the FileAnnotation of every prompt an image was annotated with, ordered by prompt."""
+    statement = select(FileAnnotation).where(FileAnnotation.image_id == image_id).order_by(FileAnnotation.prompt)
+    return list((await session.exec(statement)).all())
+
+
+def get_file_annotation(session: Session, task_id: str) -> FileAnnotation | None:
+    """Returns the FileAnnotation of a task, or None if it has not been written yet."""
+    return session.exec(_file_annotation_by_task_id(task_id)).first()
+
+
+async def aget_file_annotation(session: AsyncSession, task_id: str) -> FileAnnotation | None:
+    """Async counterpart of `get_file_annotation`."""
+    return (await session.exec(_file_annotation_by_task_id(task_id))).first()
+
+
+def _merge_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # One statement may not touch a row twice, so fold rows of the same task together
+    merged: dict[str, dict[str, Any]] = {}
+    for row in rows:
+        current = merged.setdefault(row["task_id"], {column: None for column in UPSERT_COLUMNS})
+        current.update({column: value for column, value in row.items() if value is not None})
+    # Lock rows in a stable order, so concurrent multi-row upserts cannot deadlock
+    return [merged[task_id] for task_id in sorted(merged)]
+
+
+def upsert_file_annotations(session: Session, rows: list[dict[str, Any]]) -> None:
+    """
+    Writes FileAnnotation rows with a single `INSERT ... ON CONFLICT DO UPDATE` and commits.
+    A row is created if its task has none yet, e.g. for single uploads, and merged into
+    the existing one otherwise, e.g. the pending row of a batch item. Columns that are
+    None in the new row keep their stored value, so writing the same row again after a
+    task retry is a no-op, and a partial write never blanks a stored annotation.
+    Args:
+        session (Session): Database session
+        rows (list[dict[str, Any]]): Rows with task_id and any other column of `UPSERT_COLUMNS`
+    """
+
+    if not rows:
+        return
+    statement = pg_insert(FileAnnotation).values(_merge_rows(rows))
+    table = FileAnnotation.__table__.c  # type: ignore[attr-defined]
+    session.exec(  # type: ignore[call-overload]
+        statement.on_conflict_do_update(
+            index_elements=[table.task_id],
+            set_={
+                column: func.coalesce(statement.excluded[column], table[column])
+                for column in UPSERT_COLUMNS if column != "task_id"
+            },
+        )
+    )
+    session.commit()
+
+
+def add_pending_file_annotations(session: Session, *, batch_id: str, rows: list[dict[str, Any]]) -> None:
+    """
+    Inserts the pending FileAnnotation rows of a batch in one multi-row INSERT and commits.
+    Rows that already exist are left untouched, so repeating the insert is harmless.
+    Args:
+        session (Session): Database session
+        batch_id (str): ID of the batch
+        rows (list[dict[str, Any]]): task_id, image_id and prompt of every (image, prompt) pair
+    """
+
+    session.exec(  # type: ignore[call-overload]
+        pg_insert(FileAnnotation)
+        .values([{**row, "batch_id": batch_id, "status": STATUS_PENDING} for row in rows])
+        .on_conflict_do_nothing(index_elements=["task_id"])
+    )
+    session.commit()
+
+
+async def aiter_phash_entries(session: AsyncSession, batch_size: int = 10000) -> AsyncIterator[tuple[int, str, str, str]]:
+    """
+    Streams the perceptual hash, prompt, model and task_id of every annotated FileAnnotation.
+    Rows are fetched `batch_size` at a time through a server-side cursor, so loading
+    millions of entries does not hold them all in memory at once.
+    """
+
+    statement = (
+        select(FileAnnotation.phash, FileAnnotation.prompt, FileAnnotation.model, FileAnnotation.task_id)
+        .where(FileAnnotation.phash.is_not(None), FileAnnotation.annotation.is_not(None))  # type: ignore[union-attr]
+        .execution_options(yield_per=batch_size)
+    )
+    result = await session.stream(statement)
+    async for row in result:
+        yield row  # type: ignore[misc]
+
+
+async def aget_batch_annotations(session: AsyncSession, batch_id: str) -> list[FileAnnotation]:
+    """Returns every FileAnnotation of a batch, grouped by image and ordered by prompt."""
+    statement = (
+        select(FileAnnotation)
+        .where(FileAnnotation.batch_id == batch_id)
+        .order_by(FileAnnotation.image_id, FileAnnotation.prompt)
+    )
+    return list((await session.exec(statement)).all())
+
+
+async def aget_batch_progress(session: AsyncSession, batch_id: str) -> tuple[int, int, int]:
+    """
+    Counts the items of a batch in one aggregate query.
+    Returns:
+        tuple[int, int, int]: Number of items, of items with an annotation and of failed items
+    """
+
+    statement = select(  # type: ignore[call-overload]
+        func.count(),
+        func.count(FileAnnotation.annotation),
+        func.count().filter(FileAnnotation.status == STATUS_FAILED),
+    ).where(FileAnnotation.batch_id == batch_id)
+    total, completed, failed = (await session.exec(statement)).one()
+    return total, completed, failed
+
+
+def _write_annotation_batch(rows: list[dict[str, Any]]) -> list[None]:
+    """Flushes the rows buffered by `annotation_writer` in one transaction."""
+    with observe_call("postgres"), Session(engine) as session:
+        upsert_file_annotations(session, rows)
+    return [None] * len(rows)
+
+
+annotation_writer = MicroBatcher(
+    _write_annotation_batch,
+    max_batch_size=settings.DB_WRITE_BATCH_SIZE,
+    window=settings.DB_WRITE_BATCH_WINDOW_MS / 1000,
+    name="db-writer",
+)
+
+
+def save_file_annotations(rows: list[dict[str, Any]]) -> None:
+    """
+    Persists the results of an annotation task, one row per (image, prompt) pair.
+    With DB_WRITE_BUFFER_ENABLED, the rows join the `annotation_writer` buffer, which
+    commits the rows of many concurrent tasks in one transaction once DB_WRITE_BATCH_SIZE
+    rows are pending or DB_WRITE_BATCH_WINDOW_MS has passed. Either way this returns only
+    after every row is committed, so a task never reports success for a lost write.
+    Args:
+        rows (list[dict[str, Any]]): Rows with task_id, file_url, annotation and any
+            other column of `UPSERT_COLUMNS`, e.g. image_id, batch_id, phash, prompt and model
+    Raises:
+        sqlalchemy.exc.SQLAlchemyError: If the write fails; every row of the failed flush
+        raises, and `db_commit_file_annotation` retries each of their tasks on its own
+    """
+
+    rows = [{**row, "status": STATUS_COMPLETED} for row in rows]
+    if settings.DB_WRITE_BUFFER_ENABLED:
+        for future in [annotation_writer.submit(row) for row in rows]:
+            future.result()
+        return
+    with observe_call("postgres"), Session(engine) as session:
+        upsert_file_annotations(session, rows)
+
+
+def mark_file_annotations_failed(
+    *, task_ids: list[str], error: str, image_id: str | None = None, batch_id: str | None = None
+) -> None:
+    """
+    Records that the annotations of an image gave up, creating the rows of a single upload.
+    A stored annotation is never replaced, so a late failure cannot undo a result.
+    Args:
+        task_ids (list[str]): IDs of the failed (image, prompt) pairs
+        error (str): Description of the failure, shown to the client
+        image_id (str | None, optional): ID of the image the tasks belong to
+        batch_id (str | None, optional): ID of the batch the image belongs to
+    """
+
+    statement = pg_insert(FileAnnotation).values([
+        {"task_id": task_id, "image_id": image_id, "batch_id": batch_id, "status": STATUS_FAILED, "error": error}
+        for task_id in sorted(task_ids)
+    ])
+    table = FileAnnotation.__table__.c  # type: ignore[attr-defined]
+    with observe_call("postgres"), Session(engine) as session:
+        session.exec(  # type: ignore[call-overload]
+            statement.on_conflict_do_update(
+                index_elements=[table.task_id],
+                set_={"status": statement.excluded.status, "error": statement.excluded.error},
+                where=table.annotation.is_(None),
+            )
+        )
+        session.commit()
\ No newline at end of file
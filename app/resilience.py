@@ -0,0 +1,164 @@
+import time
+import random
+import socket
+import smtplib
+import threading
+from contextlib import contextmanager
+from collections.abc import Iterator
+from typing import NoReturn
+import httpx
+from celery import Task
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from app.config import settings
+from app.logging import logger
+from app.metrics import CIRCUIT_OPEN
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Failures that may succeed when tried again later; anything else fails the task at once
+TRANSIENT_ERRORS = (
+    httpx.TransportError, ConnectionError, TimeoutError, socket.gaierror, smtplib.SMTPServerDisconnected,
+    OperationalError, PoolTimeoutError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+    def __init__(self, service: str, retry_after: float):
+        super().__init__(f"Circuit breaker of {service} is open, retry in {retry_after:.1f}s")
+        self.service = service
+        self.retry_after = retry_after
+
+
+def is_transient(exc: BaseException) -> bool:
+    """
+    Tells whether a failed call is worth retrying.
+    Connection errors, timeouts, open circuits, HTTP 5xx, 408 and 429 responses, SMTP
+    4xx replies and database errors that dropped the connection (OperationalError, pool
+    timeouts) are transient; invalid input, 4xx responses, constraint violations and
+    missing blobs are not.
+    """
+
+    if isinstance(exc, (CircuitOpenError, *TRANSIENT_ERRORS)):
+        return True
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    # Cloudinary (app.file.CloudinaryError) and Ollama (ollama.ResponseError) errors carry the HTTP status
+    status = getattr(exc, "status_code", None)
+    return isinstance(status, int) and (status >= 500 or status in (408, 429))
+
+
+class CircuitBreaker:
+    """
+    Fails calls to an external service fast while the service is down.
+    After `failure_threshold` consecutive transient failures the circuit opens, and every
+    call raises CircuitOpenError without touching the service. After `reset_seconds` one
+    probe call is let through (half-open): if it succeeds the circuit closes, otherwise it
+    opens for another `reset_seconds`. Errors that are not transient, e.g. a rejected
+    upload, mean the service answered and count as successes.
+    The state is kept per worker process and shared by all of its threads.
+    Args:
+        service (str): Service name, used in errors, logs and the `pipeline_circuit_open` gauge
+        failure_threshold (int): Consecutive failures that open the circuit
+        reset_seconds (float): Seconds the circuit stays open before a probe
+    """
+
+    def __init__(self, service: str, failure_threshold: int, reset_seconds: float):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        CIRCUIT_OPEN.labels(service).set(0)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.reset_seconds - time.monotonic()
+            if self._state == OPEN and remaining <= 0:
+                self._state = HALF_OPEN
+                logger.info(f"Circuit breaker of {self.service} half-open, probing")
+                return
+            # While the probe is in flight, other calls wait for its outcome
+            raise CircuitOpenError(self.service, max(remaining, 0.0) if self._state == OPEN else self.reset_seconds)
+
+    def _record(self, failed: bool) -> None:
+        with self._lock:
+            if not failed:
+                if self._state != CLOSED:
+                    logger.info(f"Circuit breaker of {self.service} closed")
+                    CIRCUIT_OPEN.labels(self.service).set(0)
+                self._state, self._failures = CLOSED, 0
+                return
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    logger.warning(f"Circuit breaker of {self.service} open after {self._failures} failures")
+                    CIRCUIT_OPEN.labels(self.service).set(1)
+                self._state, self._opened_at = OPEN, time.monotonic()
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """
+        Wraps one call to the service.
+        Raises:
+            CircuitOpenError: If the circuit is open; the call is not made
+        """
+
+        self._acquire()
+        try:
+            yield
+        except BaseException as e:
+            self._record(failed=is_transient(e))
+            raise
+        self._record(failed=False)
+
+
+breakers = {
+    service: CircuitBreaker(service, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_SECONDS)
+    for service in ("cloudinary", "ollama", "smtp")
+}
+
+
+def retry_countdown(retries: int, exc: BaseException | None = None) -> float:
+    """
+    Returns the delay before retry number `retries + 1`.
+    The delay doubles with every retry up to TASK_RETRY_BACKOFF_MAX_SECONDS, and is drawn
+    from its upper half, so tasks that failed together do not come back together. A task
+    stopped by an open circuit waits at least until the circuit lets a probe through.
+    """
+
+    ceiling = min(settings.TASK_RETRY_BACKOFF_MAX_SECONDS, settings.TASK_RETRY_BACKOFF_SECONDS * 2 ** retries)
+    countdown = random.uniform(ceiling / 2, ceiling)
+    if isinstance(exc, CircuitOpenError):
+        countdown = max(countdown, exc.retry_after + random.uniform(0, settings.TASK_RETRY_BACKOFF_SECONDS))
+    return countdown
+
+
+def retry_or_raise(task: Task, exc: Exception) -> NoReturn:
+    """
+    Schedules a bound task to run again if `exc` is transient, or re-raises it.
+    The retry is a new message with a countdown, so the worker slot is free while waiting.
+    After TASK_MAX_RETRIES retries, `exc` is raised and the task fails.
+    Raises:
+        celery.exceptions.Retry: If the task was scheduled again
+        Exception: `exc`, if it is not transient or the retries are used up
+    """
+
+    if not is_transient(exc):
+        raise exc
+    countdown = retry_countdown(task.request.retries, exc)
+    logger.warning(f"{task.name} failed ({exc!r}), retry {task.request.retries + 1} in {countdown:.1f}s")
+    raise task.retry(exc=exc, countdown=countdown, max_retries=settings.TASK_MAX_RETRIES)
\ No newline at end of file
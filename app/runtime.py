@@ -0,0 +1,206 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import functools
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Sequence, TypeVar
+import httpx
+from app.config import settings
+from app.logging import logger
+from app.metrics import InstrumentedTransport
+
+T = TypeVar("T")
+
+
+class WorkerRuntime:
+    """
+    Long-lived event loop and shared clients for one Celery worker process.
+    The loop runs in a background thread for the lifetime of the process. Tasks
+    submit coroutines to it with `run`, so no event loop is created per task and
+    the keep-alive connections of the pooled HTTP clients are reused across tasks.
+    Blocking SDK calls are offloaded to a bounded thread pool with `run_blocking`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._executor: ThreadPoolExecutor | None = None
+        self._clients: dict[str, httpx.AsyncClient] = {}
+
+    def start(self) -> None:
+        """Starts the loop thread for the current process. Calling it again is a no-op."""
+        # A runtime inherited through fork has no running loop thread, so start a fresh one
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.WORKER_BLOCKING_THREADS,
+                thread_name_prefix="runtime-blocking",
+            )
+            self._clients = {}
+            threading.Thread(target=self._loop.run_forever, name="runtime-loop", daemon=True).start()
+            self._pid = os.getpid()
+            logger.info(f"Worker runtime started in process {self._pid}")
+
+    def stop(self) -> None:
+        """Closes the pooled clients, stops the loop and shuts the thread pool down."""
+        if self._pid != os.getpid() or self._loop is None:
+            return
+        try:
+            self.run(self._close_clients(), timeout=10)
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._pid = None
+            logger.info("Worker runtime stopped")
+
+    async def _close_clients(self) -> None:
+        for client in self._clients.values():
+            await client.aclose()
+        self._clients = {}
+
+    def run(self, coro: Awaitable[T], timeout: float | None = None) -> T:
+        """
+        Runs a coroutine on the runtime loop and waits for its result.
+        Args:
+            coro (Awaitable): The coroutine to run
+            timeout (float, optional): Seconds to wait for the result
+        Returns:
+            The coroutine's result
+        Raises:
+            Exception: Whatever the coroutine raised
+        """
+
+        return self.submit(coro).result(timeout)
+
+    def submit(self, coro: Awaitable[T]) -> Future:
+        """Schedules a coroutine on the runtime loop without waiting, and returns a Future for its result."""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)  # type: ignore[arg-type]
+
+    async def run_blocking(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Runs a blocking callable in the runtime's bounded thread pool and awaits it."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def http(self, name: str) -> httpx.AsyncClient:
+        """
+        Returns the pooled HTTP client for an outbound service, creating it on first use.
+        Must be called from the runtime loop, which owns the client's connections.
+        Args:
+            name (str): Service name, e.g. "cloudinary"
+        Returns:
+            httpx.AsyncClient: Keep-alive client shared by all tasks of this process
+        """
+
+        client = self._clients.get(name)
+        if client is None:
+            client = httpx.AsyncClient(timeout=settings.HTTP_TIMEOUT_SECONDS, transport=http_transport(name))
+            self._clients[name] = client
+        return client
+
+
+def http_limits() -> httpx.Limits:
+    """Connection pool limits shared by the outbound HTTP clients."""
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    )
+
+
+def http_transport(service: str) -> httpx.AsyncBaseTransport:
+    """Pooled transport for an outbound service whose calls are recorded in the metrics."""
+    return InstrumentedTransport(service, httpx.AsyncHTTPTransport(limits=http_limits()))
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests whose dispatch has a fixed cost, e.g. database writes
+    committed in one transaction, into micro-batches.
+    Callers submit one input at a time and get a Future back. A dispatcher thread
+    collects pending inputs until the batch holds `max_batch_size` items or
+    `window` seconds have passed since its first item, then hands the whole batch
+    to `dispatch` and resolves each Future with its own result. Inputs that arrive
+    while a batch is being dispatched form the next batch, so batches grow with load.
+    The window is what a lone request pays to share that fixed cost with the requests
+    arriving just after it; requests that are sent one by one anyway, like VLM calls,
+    should not go through a batcher.
+    Args:
+        dispatch (Callable): Function taking a list of inputs and returning a list of
+            results (or exceptions) in the same order
+        max_batch_size (int): Maximum number of inputs per batch
+        window (float): Maximum time in seconds a batch stays open
+        name (str): Name used for the dispatcher thread and in logs
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[list[Any]], Sequence[Any]],
+        max_batch_size: int,
+        window: float,
+        name: str = "batcher",
+    ):
+        self.dispatch = dispatch
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.window = window
+        self._queue: queue.Queue[tuple[Any, Future]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+
+    def submit(self, item: Any) -> Future:
+        """Queues an input for the next batch and returns a Future for its result."""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_started(self) -> None:
+        # Threads do not survive a fork, so start one dispatcher per (worker) process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _collect(self) -> list[tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.dispatch(items)
+            except Exception as e:
+                results = [e] * len(batch)
+            logger.info(f"Dispatched {self.name} batch of {len(batch)} in {time.perf_counter() - started:.3f}s")
+            for (_, future), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+runtime = WorkerRuntime()
\ No newline at end of file
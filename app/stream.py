@@ -0,0 +1,197 @@
+import io
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from app.admission import admission
+from app.config import settings
+from app.db import STATUS_FAILED
+from app.events import broadcaster
+from app.image import dhash, hamming_distance
+from app.ingest import ingest_fileobj
+from app.logging import logger
+from app.flows import full_annotation_flow
+
+
+class FrameFilter:
+    """
+    Tracks the dHash of the last annotated frame of a stream.
+    A frame is significant if it is the first one, or if its hash differs from the last
+    annotated frame in at least `threshold` bits. Comparing against the last annotated
+    frame rather than the previous frame means slow drift still triggers an annotation
+    once it adds up.
+    Args:
+        threshold (int): Minimum Hamming distance of a significant frame
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self.last_hash: int | None = None
+
+    def distance(self, frame_hash: int) -> int | None:
+        """Returns the distance to the last annotated frame, None if there is none yet."""
+        if self.last_hash is None:
+            return None
+        return hamming_distance(self.last_hash, frame_hash)
+
+    def is_significant(self, distance: int | None) -> bool:
+        return distance is None or distance >= self.threshold
+
+
+class CameraStream:
+    """
+    Serves one camera over a WebSocket connection.
+    Every binary message is a JPEG or PNG frame; text messages are answered with an
+    error and otherwise ignored. Frames are validated like uploads, and
+    only frames that differ enough from the last annotated one are enqueued with
+    `full_annotation_flow`. The client can keep sending while earlier frames are being
+    annotated; each result is pushed back on the same connection as soon as it is stored.
+    Messages sent to the client are JSON objects with a `type` and the frame's `seq`:
+        - accepted: the frame was enqueued, with the task `id` of the first prompt, the
+          `ids` of all prompts, the hash `distance` and the `estimated_wait` of the pipeline
+          in seconds
+        - skipped: the frame was dropped, with the `reason` ("unchanged", "busy", or
+          "saturated" and "rate_limited" from admission control, which add `retry_after`)
+        - result: the `annotation`, `file_url` and `prompt` of an accepted frame, one per prompt
+        - error: the frame was rejected, sent as text or could not be enqueued, its
+          annotation failed or its result did not arrive, with a `detail`; the stream
+          stays open
+    Args:
+        websocket (WebSocket): The accepted connection
+        camera_id (str): Identifier of the camera, used to name the frames
+        prompts (list[str]): The prompts every significant frame is annotated with
+        email (str): Email address notified of every annotation, may be empty
+        lookup (Callable): Returns the stored result of a task ID, or None if pending
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        camera_id: str,
+        prompts: list[str],
+        email: str,
+        lookup: Callable[[str], Awaitable[dict[str, Any] | None]],
+    ):
+        self.websocket = websocket
+        self.camera_id = camera_id
+        self.prompts = prompts
+        self.email = email
+        self.lookup = lookup
+        self.filter = FrameFilter(settings.STREAM_CHANGE_THRESHOLD)
+        self._send_lock = asyncio.Lock()
+        self._deliveries: set[asyncio.Task] = set()
+        self.received = 0
+        self.accepted = 0
+
+    async def run(self) -> None:
+        """Receives frames until the client disconnects."""
+        logger.info(f"Stream {self.camera_id}: connected")
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                self.received += 1
+                if message.get("bytes") is None:
+                    detail = "Frames must be sent as binary messages"
+                    await self._send({"type": "error", "seq": self.received, "detail": detail})
+                    continue
+                await self._handle_frame(self.received, message["bytes"])
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in self._deliveries:
+                task.cancel()
+            logger.info(f"Stream {self.camera_id}: closed, {self.accepted} of {self.received} frames annotated")
+
+    async def _send(self, message: dict[str, Any]) -> None:
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+
+    async def _handle_frame(self, seq: int, data: bytes) -> None:
+        try:
+            upload = await run_in_threadpool(ingest_fileobj, io.BytesIO(data), f"{self.camera_id}-{seq}.jpg")
+        except HTTPException as e:
+            await self._send({"type": "error", "seq": seq, "detail": e.detail})
+            return
+
+        try:
+            try:
+                # cv2 releases the GIL while decoding, so hashing in a thread is enough
+                frame_hash = await run_in_threadpool(dhash, data)
+            except ValueError as e:
+                await self._send({"type": "error", "seq": seq, "detail": str(e)})
+                return
+            distance = self.filter.distance(frame_hash)
+            if not self.filter.is_significant(distance):
+                await self._send({"type": "skipped", "seq": seq, "reason": "unchanged", "distance": distance})
+                return
+            if len(self._deliveries) >= settings.STREAM_MAX_IN_FLIGHT:
+                await self._send({"type": "skipped", "seq": seq, "reason": "busy", "distance": distance})
+                return
+            # A refused or failed frame is reported on its own; the stream stays open
+            try:
+                decision = await admission.admit(self.websocket.client.host if self.websocket.client else self.camera_id)
+                if decision.admitted:
+                    result = await run_in_threadpool(full_annotation_flow, upload, self.prompts, email=self.email)
+            except HTTPException as e:
+                await self._send({"type": "error", "seq": seq, "detail": e.detail})
+                return
+            except Exception as e:
+                logger.error(f"Stream {self.camera_id}: frame {seq} could not be enqueued: {e!r}")
+                await self._send({"type": "error", "seq": seq, "detail": "The frame could not be enqueued, try again"})
+                return
+            if not decision.admitted:
+                await self._send({
+                    "type": "skipped",
+                    "seq": seq,
+                    "reason": decision.reason,
+                    "distance": distance,
+                    "retry_after": decision.retry_after,
+                    "estimated_wait": decision.estimated_wait,
+                })
+                return
+        finally:
+            upload.close()
+
+        self.filter.last_hash = frame_hash
+        self.accepted += 1
+        await self._send({
+            "type": "accepted",
+            "seq": seq,
+            "id": result.id,
+            "ids": result.ids,
+            "distance": distance,
+            "estimated_wait": decision.estimated_wait,
+        })
+        task = asyncio.create_task(self._deliver_all(seq, result.ids, result.prompts))
+        self._deliveries.add(task)
+        task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver_all(self, seq: int, task_ids: list[str], prompts: list[str]) -> None:
+        # One delivery per frame counts towards STREAM_MAX_IN_FLIGHT, however many prompts it has
+        await asyncio.gather(*(self._deliver(seq, task_id, prompt) for task_id, prompt in zip(task_ids, prompts)))
+
+    async def _deliver(self, seq: int, task_id: str, prompt: str) -> None:
+        # Register before checking the database, so a completion between the two is not missed
+        queue = broadcaster.register(task_id)
+        try:
+            async with asyncio.timeout(settings.STREAM_RESULT_TIMEOUT_SECONDS):
+                payload = await self.lookup(task_id)
+                while payload is None:
+                    payload = await queue.get()
+                    if payload is None:
+                        # The subscription reconnected and may have missed the event
+                        payload = await self.lookup(task_id)
+            if payload.get("status") == STATUS_FAILED:
+                await self._send({"type": "error", "seq": seq, "id": task_id, "detail": payload.get("error")})
+                return
+            await self._send({"type": "result", "seq": seq, "id": task_id, "prompt": prompt, **payload})
+        except TimeoutError:
+            await self._send({"type": "error", "seq": seq, "id": task_id, "detail": "Timed out waiting for the annotation"})
+        except (WebSocketDisconnect, RuntimeError):
+            # The client went away while the result was on its way
+            pass
+        finally:
+            broadcaster.unregister(task_id, queue)
\ No newline at end of file
@@ -1,223 +1,405 @@
-import re
 import time
-import uuid
 import base64
-import asyncio
-import requests
-from typing import Any
-from celery import Celery
-from sqlmodel import select, Session
-from langchain_ollama import ChatOllama
-from langchain_core.messages import HumanMessage, BaseMessage
+from typing import Any, TYPE_CHECKING
+from celery.signals import (
+    worker_ready, worker_init, worker_process_init, worker_process_shutdown,
+    task_prerun, task_postrun, task_retry,
+)
 from app.config import settings
-from app.db import engine, FileAnnotation
+from app.logging import logger
+from app.db import STATUS_COMPLETED, STATUS_FAILED
+from app.repository import save_file_annotations, mark_file_annotations_failed
+from app.events import publish_result
 from app.file import upload_picture_to_cloudinary
-from app.email import send_email, generate_reminder_email
+from app.email import send_email, generate_reminder_email, generate_digest_email, smtp_pool
+from app.notifications import open_digest_window, queue_notification, take_notifications, is_valid_email
+from app.cache import release_dedup_entry, cache_result
+from app.blob import open_blob, discard_blob, sweep_spool
+from app.inference import submit_inference, pool
+from app.runtime import runtime
+from app.resilience import breakers, retry_or_raise
+from app.admission import task_started, task_finished
+from app.metrics import TASK_RUNTIME, TASK_RETRIES, PAYLOAD_BYTES, observe_queue_wait, start_exporter
+from app.worker import IO_QUEUE, INFERENCE_QUEUE, NOTIFY_QUEUE
+from app.batch import record_batch_item
+from app.client import celery
+from app.envelope import JobEnvelope
 
-celery = Celery(
-    "tasks",
-    broker=settings.REDIS_URL,
-    backend=settings.REDIS_URL
-)
-celery.autodiscover_tasks(['app.tasks', 'app.main'])
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+# Worker side of the pipeline: the tasks are registered on the thin client app of
+# app/client.py, and the API enqueues them by name, see app/flows.py
+
+@worker_init.connect
+@worker_process_init.connect
+def _start_runtime(**kwargs) -> None:
+    """Starts the long-lived event loop and client pools of this worker process."""
+    runtime.start()
+
+@worker_process_shutdown.connect
+def _stop_runtime(**kwargs) -> None:
+    smtp_pool.close()
+    runtime.stop()
+
+@worker_init.connect
+def _start_metrics_exporter(**kwargs) -> None:
+    """Serves the worker's task metrics on METRICS_WORKER_PORT for Prometheus to scrape."""
+    start_exporter(settings.METRICS_WORKER_PORT)
+
+@worker_ready.connect
+def _sweep_stale_blobs(**kwargs) -> None:
+    """Removes blobs orphaned by chains that died with a previous worker."""
+    sweep_spool()
 
-@celery.task()
-def upload_to_cloudinary_task(file_bytes: bytes, filename: str, task_id: str) -> dict[str, Any]:
+@worker_ready.connect
+def _warm_up_inference(**kwargs) -> None:
+    """Loads the model on every Ollama host before an inference worker takes its first task."""
+    consumed = celery.amqp.queues.consume_from
+    if consumed and INFERENCE_QUEUE not in consumed:
+        return
+    runtime.run(pool.warm_up())
+
+# Start times of the tasks running in this process, by task id
+_task_started_at: dict[str, float] = {}
+
+def _task_queue(task) -> str:
+    return (task.request.delivery_info or {}).get("routing_key") or "unknown"
+
+@task_prerun.connect
+def _track_task_start(task_id: str, task, **kwargs) -> None:
     """
-    Uploads a file to Cloudinary asynchronously and returns the URL.
-    Args:
-        file_bytes (bytes): The binary content of the file to upload.
-        filename (str): Name of the file to be uploaded.
-        task_id (str): Unique identifier for the upload task.
-    Returns:
-        dict[str, Any]: Dictionary containing:
-            - file_url (str): URL of the uploaded file on Cloudinary, empty string if upload fails
-            - task_id (str): The original task ID passed in
-    Note:
-        This function runs an async operation synchronously using asyncio.run()
+    Starts the runtime clock of a task and records how long it waited in its queue.
+    Tasks of the pipeline queues are also reported in flight, for admission control in the API.
     """
+    queue = _task_queue(task)
+    _task_started_at[task_id] = time.perf_counter()
+    published_at = task.request.get("published_at")
+    if published_at is not None:
+        observe_queue_wait(task.name, queue, published_at, task.request.eta)
+    if queue in (IO_QUEUE, INFERENCE_QUEUE, NOTIFY_QUEUE):
+        task_started(queue, task_id)
+
+@task_postrun.connect
+def _track_task_end(task_id: str, task, state: str | None = None, **kwargs) -> None:
+    started = _task_started_at.pop(task_id, None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    queue = _task_queue(task)
+    TASK_RUNTIME.labels(task.name, queue, state or "UNKNOWN").observe(elapsed)
+    if queue in (IO_QUEUE, INFERENCE_QUEUE, NOTIFY_QUEUE):
+        task_finished(queue, task_id, elapsed)
 
-    url = asyncio.run(upload_picture_to_cloudinary(file_bytes, filename, task_id)) or ""
-    return {"file_url": url, "task_id": task_id}
+@task_retry.connect
+def _count_retry(sender=None, **kwargs) -> None:
+    TASK_RETRIES.labels(sender.name if sender is not None else "unknown").inc()
 
-@celery.task()
-def db_commit_file_annotation(prev: dict[str, Any]) -> dict[str, Any]:
+@celery.task(bind=True)
+def upload_to_cloudinary_task(self, blob_ref: str, filename: str, image_id: str) -> list[Any]:
     """
-    Commits file annotation data to the database.
-    This function takes a dictionary containing task and file information and creates a new
-    FileAnnotation record in the database with null annotation.
+    Uploads a file to Cloudinary asynchronously and returns the URL.
+    An image is uploaded once, however many prompts it is annotated with.
+    Transient failures are retried with backoff, see `app.resilience.retry_or_raise`.
     Args:
-        prev (dict[str, Any]): Dictionary containing:
-            - task_id: ID of the associated task
-            - file_url: URL of the file to be annotated
+        blob_ref (str): Reference to the staged file content, see `app.blob.stage_blob`.
+        filename (str): Name of the file to be uploaded.
+        image_id (str): ID of the image, shared by its FileAnnotation rows.
     Returns:
-        dict[str, Any]: The input dictionary unchanged
+        list[Any]: The packed `app.envelope.JobEnvelope`, with the file_url on Cloudinary
+            and the image_id passed in
+    Raises:
+        app.file.CloudinaryError: If the upload was refused, or kept failing
+    Note:
+        The async upload runs on the worker runtime's event loop, see `app.runtime`
     """
 
-    with Session(engine) as session:
-        db_obj = FileAnnotation(
-            task_id=prev["task_id"],
-            file_url=prev["file_url"],
-            annotation=None
-        )
-        session.add(db_obj)
-        session.commit()
-    return prev
-
-vlm = ChatOllama(model="moondream:v2", base_url=settings.OLLAMA_BASE_URL)
+    try:
+        with open_blob(blob_ref) as file_bytes:
+            url = runtime.run(upload_picture_to_cloudinary(file_bytes, filename, image_id))
+    except Exception as e:
+        retry_or_raise(self, e)
+    return JobEnvelope(image_id=image_id, file_url=url).pack()
 
-@celery.task()
-def invoke_llm(prev: dict[str, Any], prompt: str) -> dict[str, Any]:
+@celery.task(bind=True)
+def invoke_llm(self, blob_ref: str, prompts: dict[str, str]) -> list[Any]:
     """
-    Invokes a vision-language model (VLM) with an image and prompt to generate annotations.
-    This function downloads an image from a URL, converts it to base64 format, and passes it along
-    with a text prompt to a VLM for analysis. The results are stored in the input dictionary.
+    Invokes a vision-language model (VLM) with an image and prompts to generate annotations.
+    This function reads the staged upload, converts it to base64 format once, and passes it
+    along with each text prompt to a VLM for analysis. It runs alongside the Cloudinary upload,
+    so the image is never downloaded back from the CDN. Each call starts right away on the
+    worker runtime (`app.inference.submit_inference`), and `app.inference.pool` bounds the
+    calls of all tasks in this worker per Ollama host and balances them over the hosts,
+    behind the Ollama circuit breaker. All prompts of the image are submitted together, so
+    they run back to back on the model kept resident by OLLAMA_KEEP_ALIVE. With INFERENCE_STREAMING,
+    each answer is streamed and its partial text relayed to `/api/results/{id}/tokens` by
+    task ID (`app.events.TokenStream`); only the final text is returned for storage, without
+    the response metadata of the model.
+    Transient failures are retried with backoff instead of holding the worker slot.
     Args:
-        prev (dict[str, Any]): Dictionary containing at minimum a 'file_url' key with the image URL
-        prompt (str): The text prompt to send to the VLM along with the image
+        blob_ref (str): Reference to the staged file content, see `app.blob.stage_blob`
+        prompts (dict[str, str]): The text prompt of every annotation task, by task ID
     Returns:
-        dict[str, Any]: Updated input dictionary with new 'annotation' key containing the VLM response
+        list[Any]: The packed `app.envelope.JobEnvelope`, with the text of every VLM
+            response by task ID
     Raises:
-        ValueError: If the image file cannot be accessed after maximum retry attempts
+        FileNotFoundError: If the staged file content is no longer available
+        ollama.ResponseError: If the model refused a request, or kept failing
     Example:
-        result = invoke_llm({
-            'file_url': 'https://example.com/image.jpg'
-        }, 'Describe this image')
+        result = invoke_llm('spool:0b7c8ed2a5bf41e88fa002a44dd6fc8a', {task_id: 'Describe this image'})
     """
 
-    url = prev["file_url"]
-    max_retries = 5
-    image_bytes = None
+    # LangChain is only needed by inference workers
+    from langchain_core.messages import HumanMessage
 
-    for _ in range(max_retries):
-        try:
-            resp = requests.get(url, timeout=5)
-            if resp.status_code == 200:
-                image_bytes = resp.content
-                break
-        except Exception:
-            pass
-        time.sleep(2)
-    else:
-        raise ValueError(f"File {url} is not accessible after {max_retries} retries.")
-
-    # Encode the image to base64 string as required for input
-    img_b64 = base64.b64encode(image_bytes).decode("utf-8")
+    # Encode the image to base64 string as required for input, once for every prompt
+    with open_blob(blob_ref) as image_bytes:
+        img_b64 = base64.b64encode(image_bytes).decode("utf-8")
     image_data = f"data:image/jpeg;base64,{img_b64}"
 
-    def _invoke():
-        return vlm.invoke(
-            input=[
-                HumanMessage(
-                    content=[
-                        {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": image_data}
-                    ]
-                )
+    messages = {
+        task_id: HumanMessage(
+            content=[
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": image_data}
             ]
         )
-    annotation: BaseMessage = _invoke()
-    prev["annotation"] = annotation.model_dump()
-    return prev
-
-@celery.task()
-def update_file_annotation(prev: dict[str, Any]) -> dict[str, Any]:
-    """Updates the annotation content of a FileAnnotation record.
-    This function takes a task dictionary containing task_id and annotation details,
-    updates the corresponding FileAnnotation record in the database with the new
-    annotation content.
+        for task_id, prompt in prompts.items()
+    }
+    try:
+        with breakers["ollama"].guard():
+            futures = {task_id: submit_inference([message], task_id) for task_id, message in messages.items()}
+            annotations: dict[str, "BaseMessage"] = {task_id: future.result() for task_id, future in futures.items()}
+    except Exception as e:
+        retry_or_raise(self, e)
+    return JobEnvelope(annotations={task_id: annotation.content for task_id, annotation in annotations.items()}).pack()
+
+@celery.task(bind=True, ignore_result=True)
+def db_commit_file_annotation(
+    self,
+    results: list[list[Any]],
+    image_id: str,
+    prompts: dict[str, str],
+    batch_id: str | None = None,
+    columns: dict[str, Any] | None = None,
+    reused: dict[str, str] | None = None,
+) -> list[Any]:
+    """
+    Commits file annotation data to the database.
+    This is the callback of the upload/inference chord: it merges the output of both
+    branches and persists one FileAnnotation per prompt with a single upsert, which
+    creates the rows of a single upload and fills in the pending rows of a batch item.
+    Every row shares the image's file_url and image_id. The write is idempotent, so a
+    retried task cannot duplicate a row; transient database errors, e.g. a dropped
+    connection or a failed flush of the write buffer, are retried with backoff. The item that finishes a batch triggers its
+    notification email. Each result then replaces any pending marker in the result cache
+    and is published, so clients waiting on `/api/results/{id}/events` get it without polling.
+    Its result is handed to the next task of the chain, `send_email_task`, in the task
+    message, so it is not stored in the result backend.
     Args:
-        prev (dict[str, Any]): Dictionary containing:
-            - task_id: ID of the task associated with the file annotation
-            - annotation: Dictionary containing the content to update
+        results (list[list[Any]]): Packed envelopes of the chord header, together containing
+            the file_url of the uploaded file and the VLM response of every task, by task ID
+        image_id (str): ID of the image
+        prompts (dict[str, str]): The prompt of every task of the image, by task ID
+        batch_id (str, optional): ID of the batch the item belongs to
+        columns (dict[str, Any], optional): Further FileAnnotation columns shared by the
+            rows, e.g. phash and model
+        reused (dict[str, str], optional): Annotations standing in for prompts whose LLM
+            call was skipped, e.g. reused from the near-duplicate cache, by task ID
     Returns:
-        dict[str, Any]: The input dictionary unchanged
+        list[Any]: The packed `app.envelope.JobEnvelope`, with the task_ids, image_id and file_url
     Raises:
-        ValueError: If no FileAnnotation is found for the given task_id
+        sqlalchemy.exc.SQLAlchemyError: If the write was refused, or kept failing
     """
 
-    with Session(engine) as session:
-        stmt = select(FileAnnotation).where(FileAnnotation.task_id == prev["task_id"])
-        result = session.exec(stmt)
-        file = result.first()
-        if file is None:
-            raise ValueError(f"No FileAnnotation found for task {prev['task_id']}")
-        file.sqlmodel_update({"annotation": prev["annotation"].get("content")})
-        session.commit()
-    return prev
-
-@celery.task()
-def send_email_task(prev: dict[str, Any], email: str) -> str:
-    """Send an email notification with results link to the specified recipient.
-    This function sends an email containing a link to the annotation results page.
-    It uses the task ID from the previous task's output to generate the results URL.
+    merged = JobEnvelope(annotations=dict(reused or {}))
+    for result in results:
+        merged = merged.merge(JobEnvelope.unpack(result))
+    annotations, file_url = merged.annotations, merged.file_url
+
+    rows = []
+    for task_id, prompt in prompts.items():
+        annotation = annotations.get(task_id)
+        if annotation is not None:
+            PAYLOAD_BYTES.labels("annotation").observe(len(annotation.encode("utf-8")))
+        row = {
+            "task_id": task_id,
+            "file_url": file_url,
+            "annotation": annotation,
+            "image_id": image_id,
+            "batch_id": batch_id,
+            "prompt": prompt,
+            **(columns or {}),
+        }
+        # Reused annotations are not indexed, so matches cannot drift from image to image
+        if reused and task_id in reused:
+            row.pop("phash", None)
+        rows.append(row)
+    try:
+        save_file_annotations(rows)
+    except Exception as e:
+        retry_or_raise(self, e)
+    for row in rows:
+        result = {"annotation": row["annotation"], "file_url": file_url, "status": STATUS_COMPLETED}
+        cache_result(row["task_id"], result)
+        publish_result(row["task_id"], result)
+    if batch_id is not None:
+        _finish_batch_item(batch_id)
+    return JobEnvelope(image_id=image_id, file_url=file_url, task_ids=list(prompts)).pack()
+
+@celery.task(bind=True, ignore_result=True)
+def send_email_task(self, prev: list[Any] | dict[str, Any], email: str) -> str:
+    """Notify the specified recipient that an annotation is ready.
+    The first notification of a recipient is sent right away, and opens a digest window
+    of EMAIL_DIGEST_WINDOW_SECONDS. The links of results that complete within the window
+    are added to the recipient's pending digest instead; the first of them schedules
+    `flush_notifications_task` at the end of the window, so they go out in one email.
+    With a window of 0, every notification is sent immediately. Notifications sent
+    immediately are retried with backoff on transient failures, and a retry within the
+    window joins the digest.
     Args:
-        prev (dict[str, Any]): Dictionary containing the previous task's output,
-            must include 'task_id' key.
+        prev (list[Any] | dict[str, Any]): The packed `app.envelope.JobEnvelope` of the
+            previous task, must include the task IDs.
         email (str): Recipient's email address.
     Returns:
-        str: Confirmation message indicating the email was sent, including recipient
-            email and task ID.
+        str: Confirmation message indicating the notification was sent or queued,
+            including recipient email and task ID.
     Raises:
-        KeyError: If 'task_id' is not present in prev dictionary.
+        IndexError: If the envelope has no task IDs.
         RuntimeError: If email sending fails.
     """
 
-    async def _send():
-        link = f"{settings.FRONTEND_HOST}/results/{prev['task_id']}"
-        content = generate_reminder_email(email_to=email, link=link)
-        await send_email(
-            email_to=email,
-            subject="Your annotation is ready",
-            html_content=content.html_content,
-        )
-        return f"Email sent to {email} for task {prev['task_id']}"
-    return asyncio.run(_send())
+    task_id = JobEnvelope.unpack(prev).task_id
+    link = f"{settings.FRONTEND_HOST}/results/{task_id}"
+    if settings.EMAIL_DIGEST_WINDOW_SECONDS <= 0 or open_digest_window(email):
+        try:
+            _send_notification(email, [link])
+        except Exception as e:
+            retry_or_raise(self, e)
+        return f"Email sent to {email} for task {task_id}"
+    if queue_notification(email, link):
+        flush_notifications_task.apply_async(args=[email], countdown=settings.EMAIL_DIGEST_WINDOW_SECONDS)
+    return f"Notification queued for {email} for task {task_id}"
 
-email_regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+def _send_notification(email: str, links: list[str]) -> None:
+    """Mails one link as a regular notification, several as a digest."""
+    if len(links) == 1:
+        content = generate_reminder_email(email_to=email, link=links[0])
+        subject = "Your annotation is ready"
+    else:
+        content = generate_digest_email(email_to=email, links=links)
+        subject = content.subject
+    runtime.run(send_email(email_to=email, subject=subject, html_content=content.html_content))
 
-def is_valid_email(email: str) -> bool:
+@celery.task(ignore_result=True)
+def flush_notifications_task(email: str) -> str:
     """
-    Validates an email address format using a regular expression pattern.
+    Sends the pending digest of a recipient.
+    If sending fails, the links are queued again, so they go out with the next flush.
     Args:
-        email (str): The email address to validate.
+        email (str): Recipient's email address
     Returns:
-        bool: True if the email format is valid, False otherwise.
-    Example:
-        >>> is_valid_email("user@example.com")
-        True
-        >>> is_valid_email("invalid-email")
-        False
+        str: Confirmation message including recipient email and number of results
     """
 
-    return re.match(email_regex, email) is not None
+    links = take_notifications(email)
+    if not links:
+        return f"No pending notifications for {email}"
+    try:
+        _send_notification(email, links)
+    except Exception:
+        if any([queue_notification(email, link) for link in links]):
+            flush_notifications_task.apply_async(args=[email], countdown=settings.EMAIL_DIGEST_WINDOW_SECONDS)
+        raise
+    return f"Email sent to {email} for {len(links)} result(s)"
 
-def full_annotation_flow(file_bytes: bytes, filename: str, prompt: str, email: str = ""):
+@celery.task(bind=True, ignore_result=True)
+def send_batch_email_task(self, batch_id: str, email: str) -> str:
     """
-    Orchestrates a complete file annotation workflow using Celery task chaining.
-    This function coordinates multiple tasks including file upload, database operations,
-    LLM processing, and optional email notification in a sequential chain.
+    Sends a single email notification once every item of a batch has finished.
+    Transient failures are retried with backoff.
     Args:
-        file_bytes (bytes): The binary content of the file to be processed
-        filename (str): Name of the file being processed
-        prompt (str): The prompt to be used for LLM annotation
-        email (str, optional): Email address for notification. Defaults to empty string
+        batch_id (str): ID of the completed batch
+        email (str): Recipient's email address
     Returns:
-        celery.result.AsyncResult: A Celery result object representing the chained task execution
-    Example:
-        >>> result = full_annotation_flow(file_content, "document.pdf", "Analyze this text", "user@example.com")
-        >>> print(result.id)
+        str: Confirmation message including recipient email and batch ID
     """
 
-    task_id = str(uuid.uuid4())
-    chain_tasks = (
-        upload_to_cloudinary_task.s(file_bytes, filename, task_id)
-        | db_commit_file_annotation.s()
-        | invoke_llm.s(prompt)
-        | update_file_annotation.s()
-    )
+    async def _send():
+        link = f"{settings.FRONTEND_HOST}/batches/{batch_id}"
+        content = generate_reminder_email(email_to=email, link=link)
+        await send_email(
+            email_to=email,
+            subject="Your batch annotation is ready",
+            html_content=content.html_content,
+        )
+        return f"Email sent to {email} for batch {batch_id}"
+    try:
+        return runtime.run(_send())
+    except Exception as e:
+        retry_or_raise(self, e)
+
+def _finish_batch_item(batch_id: str, failed: bool = False) -> None:
+    """Counts a finished batch item and sends the batch email if it was the last one."""
+    email = record_batch_item(batch_id, failed=failed)
+    if email is None:
+        return
+    logger.info(f"Batch {batch_id} finished")
     if is_valid_email(email):
-        chain_tasks |= send_email_task.s(email=email)
-    result = chain_tasks.apply_async()
-    print(f"Full annotation workflow started, chain id = {result.id}")
-    return result
\ No newline at end of file
+        send_batch_email_task.apply_async(args=[batch_id, email], priority=settings.BATCH_TASK_PRIORITY)
+
+@celery.task(ignore_result=True)
+def discard_blob_task(blob_ref: str) -> None:
+    """Deletes the staged file content once the annotation chain has finished."""
+    discard_blob(blob_ref)
+
+# Errors are stored and shown to clients, so keep them to a readable length
+MAX_ERROR_LENGTH = 500
+
+@celery.task(ignore_result=True)
+def annotation_flow_failed(
+    request,
+    exc,
+    traceback,
+    dedup_keys: list[str] | None = None,
+    blob_ref: str | None = None,
+    batch_id: str | None = None,
+    image_id: str | None = None,
+    task_ids: list[str] | None = None,
+) -> None:
+    """
+    Error callback that cleans up after a failed annotation chain.
+    It drops the chain's dedup entries, so later uploads of the same image start a new
+    chain instead of resolving to annotations that never arrive, and it deletes the
+    staged file content. The FileAnnotation of every prompt is marked failed with the
+    error, and the failure is cached and published like a result, so clients waiting on
+    `/api/results/{id}` or its event stream stop waiting. A failed batch item still
+    counts towards its batch, so the batch can finish and send its email.
+    Args:
+        request: Request context of the failed task
+        exc (Exception): The exception raised by the failed task, after its retries
+        traceback: Traceback of the failure
+        dedup_keys (list[str], optional): Dedup keys claimed for the chain
+        blob_ref (str, optional): Reference to the staged file content
+        batch_id (str, optional): ID of the batch the item belongs to
+        image_id (str, optional): ID of the image
+        task_ids (list[str], optional): IDs of the image's FileAnnotation rows
+    """
+
+    logger.warning(f"Task {request.id} failed ({exc!r}), cleaning up annotation flow")
+    for key in dedup_keys or ():
+        release_dedup_entry(key)
+    if blob_ref is not None:
+        discard_blob(blob_ref)
+    if task_ids:
+        error = str(exc)[:MAX_ERROR_LENGTH] or type(exc).__name__
+        try:
+            mark_file_annotations_failed(task_ids=task_ids, error=error, image_id=image_id, batch_id=batch_id)
+        except Exception as e:
+            logger.error(f"Could not record the failure of image {image_id}: {e}")
+        failure = {"annotation": None, "file_url": None, "status": STATUS_FAILED, "error": error}
+        for task_id in task_ids:
+            cache_result(task_id, failure)
+            publish_result(task_id, failure)
+    if batch_id is not None:
+        _finish_batch_item(batch_id, failed=True)
\ No newline at end of file
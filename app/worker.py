@@ -0,0 +1,74 @@
+import os
+import sys
+from app.config import settings
+
+# Queues of the annotation pipeline, see `task_routes` in app/client.py
+IO_QUEUE = "io"
+INFERENCE_QUEUE = "inference"
+NOTIFY_QUEUE = "notify"
+# Redis keeps one list per queue and priority step, named "<queue>:<priority>" ("<queue>" for 0)
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEP = ":"
+
+
+def queue_keys(queue: str) -> list[str]:
+    """Returns the Redis lists that hold the waiting messages of a queue, one per priority step."""
+    return [queue if priority == 0 else f"{queue}{PRIORITY_SEP}{priority}" for priority in PRIORITY_STEPS]
+
+
+def worker_options(queue: str) -> tuple[str, int, int]:
+    """
+    Returns the pool type, concurrency and prefetch multiplier configured for a queue.
+    Args:
+        queue (str): One of IO_QUEUE, INFERENCE_QUEUE and NOTIFY_QUEUE
+    Raises:
+        ValueError: If the queue is unknown
+    """
+
+    options = {
+        IO_QUEUE: (
+            settings.IO_WORKER_POOL,
+            settings.IO_WORKER_CONCURRENCY,
+            settings.IO_WORKER_PREFETCH_MULTIPLIER,
+        ),
+        INFERENCE_QUEUE: (
+            settings.INFERENCE_WORKER_POOL,
+            settings.INFERENCE_WORKER_CONCURRENCY,
+            settings.INFERENCE_WORKER_PREFETCH_MULTIPLIER,
+        ),
+        NOTIFY_QUEUE: (
+            settings.NOTIFY_WORKER_POOL,
+            settings.NOTIFY_WORKER_CONCURRENCY,
+            settings.NOTIFY_WORKER_PREFETCH_MULTIPLIER,
+        ),
+    }
+    if queue not in options:
+        raise ValueError(f"Unknown queue {queue!r}, expected one of {', '.join(options)}")
+    return options[queue]
+
+
+def worker_argv(queue: str, *extra: str) -> list[str]:
+    """Builds the `celery worker` command line that consumes `queue` with its configured pool."""
+    pool, concurrency, prefetch = worker_options(queue)
+    return [
+        "celery", "-A", "app.tasks.celery", "worker",
+        "--queues", queue,
+        "--hostname", f"{queue}@%h",
+        "--pool", pool,
+        "--concurrency", str(concurrency),
+        "--prefetch-multiplier", str(prefetch),
+        "--loglevel", "info",
+        *extra,
+    ]
+
+
+if __name__ == "__main__":
+    # Replace this process with the celery CLI, so pools such as gevent can patch the
+    # interpreter before anything else is imported
+    if len(sys.argv) < 2:
+        sys.exit(f"Usage: python -m app.worker {{{IO_QUEUE}|{INFERENCE_QUEUE}|{NOTIFY_QUEUE}}} [celery options]")
+    try:
+        argv = worker_argv(sys.argv[1], *sys.argv[2:])
+    except ValueError as e:
+        sys.exit(str(e))
+    os.execvp(argv[0], argv)
\ No newline at end of file
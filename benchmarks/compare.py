@@ -0,0 +1,55 @@
+"""
+Compares two load test reports written by benchmarks/loadtest.py.
+
+Usage:
+    python -m benchmarks.compare benchmarks/results/before.json benchmarks/results/after.json
+"""
+
+import sys
+import json
+
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        return json.load(file)
+
+
+def rows(report: dict) -> dict[str, float | None]:
+    results = report["results"]
+    values: dict[str, float | None] = {
+        "throughput/s": results["throughput_per_second"],
+        "completed": results["completed"],
+        "rejected": results["rejected"],
+        "timed_out": results["timed_out"],
+        **{f"latency {name}": value for name, value in results["latency_seconds"].items()},
+        **{f"first token {name}": value for name, value in results.get("first_token_seconds", {}).items()},
+    }
+    for metric, series in report["stages"].items():
+        short = metric.removeprefix("pipeline_").removesuffix("_seconds")
+        for labels, stage in series.items():
+            values[f"{short} {labels}"] = stage["mean_seconds"]
+    return values
+
+
+def change(before: float | None, after: float | None) -> str:
+    if before is None or after is None:
+        return ""
+    if before == 0:
+        return "" if after == 0 else "new"
+    return f"{(after - before) / before:+.1%}"
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    before, after = load(sys.argv[1]), load(sys.argv[2])
+    print(f"{'':48} {before['commit'] or '?':>12} {after['commit'] or '?':>12} {'change':>9}")
+    old, new = rows(before), rows(after)
+    for name in dict.fromkeys([*old, *new]):
+        a, b = old.get(name), new.get(name)
+        fmt = lambda value: "-" if value is None else f"{value:.4g}"
+        print(f"{name[:48]:48} {fmt(a):>12} {fmt(b):>12} {change(a, b):>9}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
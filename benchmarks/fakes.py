@@ -0,0 +1,248 @@
+"""
+Local stand-ins for Ollama, Cloudinary and SMTP, so the whole pipeline can be load-tested
+without calling external services.
+
+One HTTP server answers both the Ollama API (`/api/chat`, `/api/generate`, `/api/ps`,
+`/api/tags`, `/api/version`) and the Cloudinary Upload API (`/v1_1/{cloud}/{resource_type}/upload`), and serves the
+uploaded files back from `/cdn/...`. An aiosmtpd sink accepts and counts every email.
+Point the API and the workers at them with:
+
+    OLLAMA_BASE_URL=http://localhost:11435
+    CLOUDINARY_UPLOAD_PREFIX=http://localhost:11435
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_SSL=False SMTP_TLS=False SMTP_USER= SMTP_PASSWORD=
+
+The fake model is unloaded after `--keep-alive-s` idle seconds, or the request's
+`keep_alive`, and the next request pays `--load-ms` to load it again.
+
+To test the Ollama pool, start more Ollama hosts without the SMTP sink, e.g. a slow one,
+and list them all in OLLAMA_BASE_URLS:
+
+    python -m benchmarks.fakes --port 11436 --smtp-port 0 --prefill-ms 900
+    OLLAMA_BASE_URLS=http://localhost:11435,http://localhost:11436
+
+Usage:
+    python -m benchmarks.fakes --prefill-ms 300 --tokens 20 --token-ms 25 --parallel 4
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import OrderedDict
+from datetime import datetime, timezone
+import uvicorn
+from aiosmtpd.controller import Controller
+from fastapi import FastAPI, Request, UploadFile, Form, File
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+
+class Stats:
+    def __init__(self):
+        self.chat_requests = 0
+        self.chat_errors = 0
+        self.model_loads = 0
+        self.uploads = 0
+        self.upload_errors = 0
+        self.upload_bytes = 0
+        self.emails = 0
+        self.started = time.time()
+
+    def as_dict(self) -> dict:
+        return {**vars(self), "uptime": time.time() - self.started}
+
+
+class SinkHandler:
+    """aiosmtpd handler that accepts every message and only counts it."""
+
+    def __init__(self, stats: Stats):
+        self.stats = stats
+
+    async def handle_DATA(self, server, session, envelope):
+        self.stats.emails += 1
+        return "250 OK"
+
+
+def create_app(args: argparse.Namespace, stats: Stats) -> FastAPI:
+    app = FastAPI()
+    # Ollama serves OLLAMA_NUM_PARALLEL requests at once and queues the rest
+    slots = asyncio.Semaphore(args.parallel)
+    cdn: OrderedDict[str, bytes] = OrderedDict()
+    model = {"loaded_until": 0.0, "lock": asyncio.Lock()}
+
+    def keep_alive_seconds(value) -> float:
+        if value is None:
+            return args.keep_alive_s
+        if isinstance(value, (int, float)):
+            return float("inf") if value < 0 else float(value)
+        match = re.fullmatch(r"(-?[0-9.]+)(ms|s|m|h)?", str(value))
+        if not match:
+            return args.keep_alive_s
+        amount = float(match.group(1))
+        return float("inf") if amount < 0 else amount * {"ms": 0.001, "s": 1, "m": 60, "h": 3600}[match.group(2) or "s"]
+
+    async def load_model(keep_alive) -> None:
+        """Pays --load-ms if the fake model is not resident, then keeps it loaded."""
+        async with model["lock"]:
+            if time.time() >= model["loaded_until"]:
+                stats.model_loads += 1
+                await asyncio.sleep(jitter(args.load_ms))
+            model["loaded_until"] = time.time() + keep_alive_seconds(keep_alive)
+
+    def chunk(model: str, content: str, done: bool, **extra) -> bytes:
+        message = {
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **extra,
+        }
+        return (json.dumps(message) + "\n").encode("utf-8")
+
+    def jitter(ms: float) -> float:
+        return max(0.0, random.gauss(ms, ms * args.jitter)) / 1000
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        stats.chat_requests += 1
+        await slots.acquire()
+        try:
+            await load_model(body.get("keep_alive"))
+            await asyncio.sleep(jitter(args.prefill_ms))
+        except BaseException:
+            slots.release()
+            raise
+        if random.random() < args.ollama_error_rate:
+            slots.release()
+            stats.chat_errors += 1
+            return JSONResponse({"error": "fake model failure"}, status_code=500)
+
+        words = [f"token{index}" for index in range(args.tokens)]
+        done = {
+            "done_reason": "stop",
+            "total_duration": 0,
+            "prompt_eval_count": 1,
+            "eval_count": len(words),
+        }
+
+        async def generate():
+            try:
+                for word in words:
+                    await asyncio.sleep(jitter(args.token_ms))
+                    yield chunk(model, f"{word} ", False)
+                yield chunk(model, "", True, **done)
+            finally:
+                slots.release()
+
+        if body.get("stream", True):
+            return StreamingResponse(generate(), media_type="application/x-ndjson")
+        try:
+            await asyncio.sleep(jitter(args.token_ms) * len(words))
+        finally:
+            slots.release()
+        return Response(chunk(model, " ".join(words), True, **done), media_type="application/json")
+
+    @app.post("/api/generate")
+    async def generate_empty(request: Request):
+        # Only model loading is supported: a request without a prompt loads the model and returns
+        body = await request.json()
+        await load_model(body.get("keep_alive"))
+        return {"model": body.get("model", args.model), "response": "", "done": True, "done_reason": "load"}
+
+    @app.get("/api/ps")
+    async def ps():
+        if time.time() >= model["loaded_until"]:
+            return {"models": []}
+        expires_at = datetime.fromtimestamp(min(model["loaded_until"], 4102444800), timezone.utc).isoformat()
+        return {"models": [{"name": args.model, "model": args.model, "size": 0, "expires_at": expires_at}]}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": args.model, "model": args.model, "size": 0}]}
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-fake"}
+
+    @app.post("/v1_1/{cloud_name}/{resource_type}/upload")
+    async def upload(
+        request: Request,
+        cloud_name: str,
+        resource_type: str,
+        file: UploadFile = File(...),
+        public_id: str = Form(""),
+        folder: str = Form(""),
+    ):
+        content = await file.read()
+        await asyncio.sleep(jitter(args.upload_ms))
+        if random.random() < args.cloudinary_error_rate:
+            stats.upload_errors += 1
+            return JSONResponse({"error": {"message": "fake upload failure"}}, status_code=500)
+        stats.uploads += 1
+        stats.upload_bytes += len(content)
+        path = f"{cloud_name}/{resource_type}/{folder}/{public_id}.jpg".replace("//", "/")
+        cdn[path] = content
+        while len(cdn) > args.cdn_max_items:
+            cdn.popitem(last=False)
+        return {
+            "public_id": f"{folder}/{public_id}",
+            "resource_type": resource_type,
+            "format": "jpg",
+            "bytes": len(content),
+            "secure_url": f"{str(request.base_url).rstrip('/')}/cdn/{path}",
+        }
+
+    @app.get("/cdn/{path:path}")
+    async def serve(path: str):
+        content = cdn.get(path)
+        if content is None:
+            return Response(status_code=404)
+        return Response(content, media_type="image/jpeg")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats.as_dict()
+
+    return app
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Fake Ollama, Cloudinary and SMTP servers for benchmarks")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=11435, help="HTTP port of the fake Ollama and Cloudinary APIs")
+    parser.add_argument("--smtp-port", type=int, default=8025, help="Port of the SMTP sink, 0 disables it")
+    parser.add_argument("--model", default="moondream:v2")
+    parser.add_argument("--load-ms", type=float, default=0, help="Time to load the model when it is not resident")
+    parser.add_argument("--keep-alive-s", type=float, default=300, help="Idle seconds before the model is unloaded")
+    parser.add_argument("--prefill-ms", type=float, default=300, help="Time before the first token")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per answer")
+    parser.add_argument("--token-ms", type=float, default=25, help="Time per generated token")
+    parser.add_argument("--parallel", type=int, default=4, help="Chat requests served at once, like OLLAMA_NUM_PARALLEL")
+    parser.add_argument("--upload-ms", type=float, default=80, help="Latency of a Cloudinary upload")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative standard deviation of every latency")
+    parser.add_argument("--ollama-error-rate", type=float, default=0.0)
+    parser.add_argument("--cloudinary-error-rate", type=float, default=0.0)
+    parser.add_argument("--cdn-max-items", type=int, default=10000, help="Uploaded files kept for /cdn")
+    return parser.parse_args(argv)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    stats = Stats()
+    smtp = Controller(SinkHandler(stats), hostname=args.host, port=args.smtp_port) if args.smtp_port else None
+    if smtp is not None:
+        smtp.start()
+    server = uvicorn.Server(uvicorn.Config(create_app(args, stats), host=args.host, port=args.port, log_level="warning"))
+    print(f"Fake Ollama/Cloudinary on {args.host}:{args.port}, SMTP sink on {args.host}:{args.smtp_port or 'off'}")
+    try:
+        await server.serve()
+    finally:
+        if smtp is not None:
+            smtp.stop()
+        print(json.dumps(stats.as_dict()))
+
+
+if __name__ == "__main__":
+    asyncio.run(serve(parse_args()))
\ No newline at end of file
@@ -0,0 +1,139 @@
+"""
+Cold-start benchmark of the PIPELINE entry points.
+
+Every entry point is imported in a fresh interpreter, several times, and the report
+gives the median wall time of the whole process, the time of the import itself, the
+peak resident memory and the number of loaded modules. One more run with
+`python -X importtime` lists the packages that cost the most to import, adding up the
+self time of each of their modules.
+The report is written as JSON like the load test reports, named after the commit.
+
+Entry points:
+    web        app.main, what uvicorn loads
+    client     app.client, the Celery client the API enqueues with
+    worker     app.tasks, what every Celery worker loads
+    inference  app.tasks plus the first Ollama client, what an inference worker loads
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time web worker --runs 10 --top 15
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from benchmarks.loadtest import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = {
+    "web": "import app.main",
+    "client": "import app.client",
+    "worker": "import app.tasks",
+    "inference": "import app.tasks; from app.inference import pool; pool.endpoints[0].client",
+}
+
+# Runs in the child interpreter; ru_maxrss is in KiB on Linux and in bytes on macOS
+PROBE = """
+import sys, json, time, resource
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "import_seconds": elapsed,
+    "max_rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    "modules": len(sys.modules),
+}}))
+"""
+
+
+def measure(code: str) -> dict:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(code=code)],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return {"process_seconds": wall, **json.loads(result.stdout.strip().splitlines()[-1])}
+
+
+def top_imports(code: str, top: int) -> list[dict]:
+    """Returns the top-level packages whose modules take the most time to import, excluding their dependencies."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    packages: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line.removeprefix("import time:").split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + int(own) / 1e6
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": package, "seconds": seconds} for package, seconds in ranked]
+
+
+def run(args: argparse.Namespace) -> dict:
+    entries: dict[str, dict] = {}
+    for name in args.entry_points:
+        code = ENTRY_POINTS[name]
+        runs = [measure(code) for _ in range(args.runs)]
+        entries[name] = {
+            **{key: statistics.median(run[key] for run in runs) for key in runs[0]},
+            "top_imports": top_imports(code, args.top),
+        }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "entry_points": entries,
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cold-start time and memory of the PIPELINE entry points")
+    parser.add_argument("entry_points", nargs="*", help=f"Any of {', '.join(ENTRY_POINTS)}, all by default")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=10, help="Most expensive packages to list")
+    parser.add_argument("--output", help="Report file, defaults to benchmarks/results/<time>-import-<commit>.json")
+    args = parser.parse_args(argv)
+    unknown = set(args.entry_points) - set(ENTRY_POINTS)
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(sorted(unknown))}")
+    args.entry_points = args.entry_points or list(ENTRY_POINTS)
+    return args
+
+
+def main() -> None:
+    args = parse_args()
+    report = run(args)
+    print(f"{'':10} {'process s':>10} {'import s':>10} {'rss MiB':>8} {'modules':>8}  slowest imports")
+    for name, entry in report["entry_points"].items():
+        slowest = ", ".join(f"{item['package']} {item['seconds']:.2f}s" for item in entry["top_imports"][:3])
+        print(
+            f"{name:10} {entry['process_seconds']:>10.3f} {entry['import_seconds']:>10.3f} "
+            f"{entry['max_rss_mb']:>8.1f} {entry['modules']:>8.0f}  {slowest}"
+        )
+    output = args.output or os.path.join(
+        os.path.dirname(__file__),
+        "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}-import-{report['commit'] or 'unknown'}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
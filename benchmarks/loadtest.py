@@ -0,0 +1,326 @@
+"""
+End-to-end load test of a running PIPELINE deployment, usually against benchmarks/fakes.py.
+
+Jobs are submitted open-loop on the schedule of a load profile, so a slow pipeline does
+not slow the load down and latencies are not under-reported. Each job is timed from
+its submission until `/api/results/{id}/tokens` delivers the stored annotation, and
+the time to its first streamed token is reported as well. The Prometheus
+metrics of the API and the workers are scraped before and after the run, and their
+difference gives the time spent per stage (queue wait and runtime per task, outbound
+calls per service) during the run. The report is written as JSON, named after the
+profile and the current commit, so runs can be compared with benchmarks/compare.py.
+
+Profiles:
+    constant  --rate jobs per second for --duration seconds
+    burst     --bursts bursts of --burst-size jobs, --interval seconds apart
+    batch     --batches batches of --batch-size images via /annotate/batch, --interval seconds apart
+
+Usage:
+    python -m benchmarks.loadtest constant --rate 5 --duration 60
+    python -m benchmarks.loadtest burst --burst-size 50 --bursts 4 --interval 15
+    python -m benchmarks.loadtest batch --batch-size 200 --batches 2
+"""
+
+import io
+import os
+import json
+import time
+import asyncio
+import zipfile
+import argparse
+import subprocess
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import cv2
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+# Histograms whose per-run difference is reported, and the labels they are grouped by
+STAGE_METRICS = {
+    "pipeline_task_queue_wait_seconds": ("task",),
+    "pipeline_task_runtime_seconds": ("task",),
+    "pipeline_outbound_call_seconds": ("service", "outcome"),
+    "pipeline_flow_stage_seconds": ("stage",),
+}
+
+
+@dataclass
+class Job:
+    submitted_at: float
+    ids: list[str] = field(default_factory=list)
+    status: int | None = None
+    accepted_at: float | None = None
+    completed_at: dict[str, float] = field(default_factory=dict)
+    first_token_at: dict[str, float] = field(default_factory=dict)
+    failed: int = 0
+    error: str | None = None
+
+
+def make_images(count: int, side: int, duplicates: float, seed: int = 0) -> list[bytes]:
+    """
+    Generates distinct JPEG images up front, so encoding does not compete with the load.
+    A `duplicates` fraction of them repeats an earlier image, to exercise the caches.
+    """
+    rng = np.random.default_rng(seed)
+    images: list[bytes] = []
+    for index in range(count):
+        if images and rng.random() < duplicates:
+            images.append(images[int(rng.integers(len(images)))])
+            continue
+        noise = (rng.random((side // 8, side // 8, 3)) * 255).astype(np.uint8)
+        image = cv2.resize(noise, (side, side), interpolation=cv2.INTER_CUBIC)
+        images.append(cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return images
+
+
+def make_archive(images: list[bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for index, image in enumerate(images):
+            archive.writestr(f"image-{index}.jpg", image)
+    return buffer.getvalue()
+
+
+def schedule(args: argparse.Namespace) -> list[float]:
+    """Returns the submission offset of every request of the profile, in seconds."""
+    if args.profile == "constant":
+        return [index / args.rate for index in range(int(args.rate * args.duration))]
+    if args.profile == "burst":
+        return [burst * args.interval for burst in range(args.bursts) for _ in range(args.burst_size)]
+    return [batch * args.interval for batch in range(args.batches)]
+
+
+async def wait_for_result(client: httpx.AsyncClient, job: Job, task_id: str, timeout: float) -> None:
+    try:
+        async with asyncio.timeout(timeout):
+            async with client.stream("GET", f"/api/results/{task_id}/tokens") as response:
+                event = None
+                async for line in response.aiter_lines():
+                    if line.startswith("event: "):
+                        event = line.removeprefix("event: ")
+                        continue
+                    if not line.startswith("data: "):
+                        continue
+                    if event == "tokens":
+                        job.first_token_at.setdefault(task_id, time.perf_counter())
+                        continue
+                    if event != "result":
+                        continue
+                    if json.loads(line.removeprefix("data: ")).get("status") == "failed":
+                        job.failed += 1
+                        job.error = job.error or f"Annotation of {task_id} failed"
+                    else:
+                        job.completed_at[task_id] = time.perf_counter()
+                    return
+    except (TimeoutError, httpx.HTTPError) as e:
+        job.error = job.error or f"{type(e).__name__} waiting for {task_id}"
+
+
+async def run_job(client: httpx.AsyncClient, args: argparse.Namespace, job: Job, payload: bytes) -> None:
+    data = {"email": args.email}
+    try:
+        if args.profile == "batch":
+            files = [("files", ("images.zip", payload, "application/zip"))]
+            response = await client.post("/annotate/batch", files=files, data=data)
+        else:
+            response = await client.post("/annotate", files={"file": ("image.jpg", payload, "image/jpeg")}, data=data)
+    except httpx.HTTPError as e:
+        job.error = f"{type(e).__name__} submitting"
+        return
+    job.status = response.status_code
+    job.accepted_at = time.perf_counter()
+    if response.status_code != 200:
+        return
+    body = response.json()
+    job.ids = body["ids"] if args.profile == "batch" else [body["id"]]
+    await asyncio.gather(*(wait_for_result(client, job, task_id, args.timeout) for task_id in job.ids))
+
+
+async def scrape(client: httpx.AsyncClient, urls: list[str]) -> dict[tuple, tuple[float, float]]:
+    """Returns (sum, count) of every STAGE_METRICS series, added up over all endpoints."""
+    series: dict[tuple, tuple[float, float]] = {}
+    for url in urls:
+        try:
+            text = (await client.get(url)).text
+        except httpx.HTTPError as e:
+            print(f"Could not scrape {url}: {e}")
+            continue
+        for family in text_string_to_metric_families(text):
+            if family.name not in STAGE_METRICS:
+                continue
+            for sample in family.samples:
+                if sample.name not in (f"{family.name}_sum", f"{family.name}_count"):
+                    continue
+                key = (family.name, *(sample.labels.get(label, "") for label in STAGE_METRICS[family.name]))
+                total, count = series.get(key, (0.0, 0.0))
+                if sample.name.endswith("_sum"):
+                    total += sample.value
+                else:
+                    count += sample.value
+                series[key] = (total, count)
+    return series
+
+
+def stage_report(before: dict, after: dict) -> dict:
+    report: dict[str, dict] = {}
+    for key, (total, count) in sorted(after.items()):
+        previous_total, previous_count = before.get(key, (0.0, 0.0))
+        calls = count - previous_count
+        if calls <= 0:
+            continue
+        name, *labels = key
+        report.setdefault(name, {})["/".join(labels)] = {
+            "count": int(calls),
+            "mean_seconds": (total - previous_total) / calls,
+            "total_seconds": total - previous_total,
+        }
+    return report
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    return float(np.percentile(values, p))
+
+
+def summarize(jobs: list[Job], wall: float) -> dict:
+    latencies = [
+        completed - job.submitted_at
+        for job in jobs
+        for completed in job.completed_at.values()
+    ]
+    first_token = [
+        first - job.submitted_at
+        for job in jobs
+        for first in job.first_token_at.values()
+    ]
+    submit = [job.accepted_at - job.submitted_at for job in jobs if job.accepted_at is not None]
+    items = sum(len(job.ids) for job in jobs)
+    failed_items = sum(job.failed for job in jobs)
+    return {
+        "requests": len(jobs),
+        "accepted": sum(job.status == 200 for job in jobs),
+        "rejected": sum(job.status == 429 for job in jobs),
+        "failed": sum(job.status not in (200, 429) for job in jobs),
+        "items": items,
+        "completed": len(latencies),
+        "annotation_failed": failed_items,
+        "timed_out": items - len(latencies) - failed_items,
+        "wall_seconds": wall,
+        "throughput_per_second": len(latencies) / wall if wall else 0.0,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies) if latencies else None,
+        },
+        "first_token_seconds": {
+            "p50": percentile(first_token, 50),
+            "p95": percentile(first_token, 95),
+            "p99": percentile(first_token, 99),
+        },
+        "submit_seconds": {
+            "p50": percentile(submit, 50),
+            "p95": percentile(submit, 95),
+            "p99": percentile(submit, 99),
+        },
+        "errors": sorted({job.error for job in jobs if job.error})[:20],
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> dict:
+    offsets = schedule(args)
+    per_request = args.batch_size if args.profile == "batch" else 1
+    images = make_images(len(offsets) * per_request, args.image_size, args.duplicates)
+    payloads = (
+        [make_archive(images[index * per_request:(index + 1) * per_request]) for index in range(len(offsets))]
+        if args.profile == "batch" else images
+    )
+    metrics_urls = [f"{args.url}/metrics", *args.worker_metrics]
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.connections)
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+        before = await scrape(client, metrics_urls)
+        jobs: list[Job] = []
+        tasks = []
+        started = time.perf_counter()
+        for offset, payload in zip(offsets, payloads):
+            delay = started + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            job = Job(submitted_at=time.perf_counter())
+            jobs.append(job)
+            tasks.append(asyncio.create_task(run_job(client, args, job, payload)))
+        await asyncio.gather(*tasks)
+        wall = time.perf_counter() - started
+        # Give the exporters a moment to record the last tasks
+        await asyncio.sleep(1)
+        after = await scrape(client, metrics_urls)
+
+    profile = {
+        key: value for key, value in vars(args).items()
+        if key not in ("output", "worker_metrics")
+    }
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "profile": profile,
+        "results": summarize(jobs, wall),
+        "stages": stage_report(before, after),
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="End-to-end load test of the annotation pipeline")
+    parser.add_argument("profile", choices=("constant", "burst", "batch"))
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    parser.add_argument(
+        "--worker-metrics",
+        default="http://localhost:9101/metrics,http://localhost:9102/metrics,http://localhost:9103/metrics",
+        type=lambda value: [url for url in value.split(",") if url],
+        help="Comma-separated metrics endpoints of the workers",
+    )
+    parser.add_argument("--rate", type=float, default=5, help="constant: jobs per second")
+    parser.add_argument("--duration", type=float, default=60, help="constant: seconds")
+    parser.add_argument("--burst-size", type=int, default=50, help="burst: jobs per burst")
+    parser.add_argument("--bursts", type=int, default=3, help="burst: number of bursts")
+    parser.add_argument("--batch-size", type=int, default=100, help="batch: images per batch")
+    parser.add_argument("--batches", type=int, default=1, help="batch: number of batches")
+    parser.add_argument("--interval", type=float, default=10, help="burst/batch: seconds between bursts or batches")
+    parser.add_argument("--image-size", type=int, default=1024, help="Side of the generated images in pixels")
+    parser.add_argument("--duplicates", type=float, default=0.0, help="Fraction of repeated images")
+    parser.add_argument("--email", default="", help="Notify this address of every result")
+    parser.add_argument("--timeout", type=float, default=300, help="Seconds to wait for each result")
+    parser.add_argument("--connections", type=int, default=100, help="Keep-alive connections to the API")
+    parser.add_argument("--output", help="Report file, defaults to benchmarks/results/<time>-<profile>-<commit>.json")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    report = asyncio.run(run(args))
+    output = args.output or os.path.join(
+        os.path.dirname(__file__),
+        "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}-{args.profile}-{report['commit'] or 'unknown'}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
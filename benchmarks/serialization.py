@@ -0,0 +1,272 @@
+"""
+Size and serialization cost of the task messages and results of one annotation job.
+
+The messages of one image's chain are built with Celery's own message protocol: the
+upload and inference chord header, the database write, the blob cleanup and the
+notification email. They are framed like the Redis transport stores them in the queue
+lists, and every result the worker keeps is encoded like the Redis result backend does.
+Two formats are compared:
+
+    before  JSON, the whole LangChain message of every annotation, every result stored
+    after   CELERY_SERIALIZER (msgpack), the compact envelopes of app/envelope.py,
+            only the chord header results stored
+
+Nothing needs to run for the sizes and timings. With --redis-url, the messages and
+results are also written to that Redis, under a throwaway prefix, to read their memory
+usage with MEMORY USAGE, and deleted again.
+The report is written as JSON like the load test reports, named after the commit.
+
+Usage:
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --prompts 3 --annotation-chars 2000 --redis-url redis://localhost:6379/0
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import argparse
+import statistics
+from datetime import datetime, timezone
+from celery import Celery
+from kombu.serialization import dumps, loads
+from app.envelope import JobEnvelope
+from benchmarks.loadtest import git_commit
+
+# Task names as registered by app/tasks.py; the benchmark does not load the app settings
+UPLOAD_TASK = "app.tasks.upload_to_cloudinary_task"
+INVOKE_LLM_TASK = "app.tasks.invoke_llm"
+DB_COMMIT_TASK = "app.tasks.db_commit_file_annotation"
+DISCARD_BLOB_TASK = "app.tasks.discard_blob_task"
+FLOW_FAILED_TASK = "app.tasks.annotation_flow_failed"
+SEND_EMAIL_TASK = "app.tasks.send_email_task"
+
+PROMPT = "Describe this image in detail, listing the objects, people and text you can see."
+
+FORMATS = {
+    "before": {
+        "serializer": "json",
+        "compact": False,
+        "stored": {UPLOAD_TASK, INVOKE_LLM_TASK, DB_COMMIT_TASK, DISCARD_BLOB_TASK, SEND_EMAIL_TASK},
+    },
+    "after": {"serializer": "msgpack", "compact": True, "stored": {UPLOAD_TASK, INVOKE_LLM_TASK}},
+}
+
+
+def annotation_message(text: str) -> dict:
+    """The serialized LangChain message that invoke_llm used to return for every prompt."""
+    from langchain_core.messages import AIMessage
+
+    return AIMessage(
+        content=text,
+        id=f"run-{uuid.uuid4()}-0",
+        response_metadata={
+            "model": "llava:7b",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": 4_812_345_678,
+            "load_duration": 12_345_678,
+            "prompt_eval_count": 601,
+            "prompt_eval_duration": 1_234_567_890,
+            "eval_count": 180,
+            "eval_duration": 3_456_789_012,
+            "model_name": "llava:7b",
+        },
+        usage_metadata={"input_tokens": 601, "output_tokens": 180, "total_tokens": 781},
+    ).model_dump()
+
+
+def job(args: argparse.Namespace, compact: bool) -> tuple[list[tuple[str, tuple, dict, dict]], dict[str, object]]:
+    """
+    Returns the task messages of one job, as (name, args, kwargs, options), and the result of every task.
+    """
+
+    image_id, blob_ref = str(uuid.uuid4()), f"spool:{uuid.uuid4().hex}"
+    prompts = {str(uuid.uuid4()): PROMPT for _ in range(args.prompts)}
+    text = ("A red bicycle leans against a brick wall next to a wooden door. " * 64)[:args.annotation_chars]
+    file_url = f"https://res.cloudinary.com/demo/image/upload/v1/{image_id}.jpg"
+    task_ids = list(prompts)
+
+    if compact:
+        uploaded = JobEnvelope(image_id=image_id, file_url=file_url).pack()
+        annotated = JobEnvelope(annotations={task_id: text for task_id in prompts}).pack()
+        committed = JobEnvelope(image_id=image_id, file_url=file_url, task_ids=task_ids).pack()
+    else:
+        uploaded = {"file_url": file_url, "image_id": image_id}
+        annotated = {"annotations": {task_id: annotation_message(text) for task_id in prompts}}
+        committed = {"task_id": task_ids[0], "task_ids": task_ids, "image_id": image_id, "file_url": file_url}
+
+    commit_kwargs = {
+        "image_id": image_id, "prompts": prompts, "batch_id": None,
+        "columns": {"model": "llava:7b", "phash": -4_311_227_511_312_654_321}, "reused": None,
+    }
+    cleanup = {"task": DISCARD_BLOB_TASK, "args": [blob_ref], "kwargs": {}, "options": {}, "subtask_type": None, "immutable": True}
+    notify = {"task": SEND_EMAIL_TASK, "args": [], "kwargs": {"email": "user@example.com"}, "options": {}, "subtask_type": None, "immutable": False}
+    failed = {
+        "task": FLOW_FAILED_TASK, "args": [], "options": {}, "subtask_type": None, "immutable": False,
+        "kwargs": {"dedup_keys": [f"dedup:{uuid.uuid4().hex}"], "blob_ref": blob_ref, "batch_id": None, "image_id": image_id, "task_ids": task_ids},
+    }
+    callback = {
+        "task": DB_COMMIT_TASK, "args": [], "kwargs": commit_kwargs, "subtask_type": None, "immutable": False,
+        "options": {"link": [cleanup, notify], "link_error": [failed]},
+    }
+    header = {"chord": callback, "group_id": str(uuid.uuid4())}
+    messages = [
+        (UPLOAD_TASK, (blob_ref, "photo.jpg", image_id), {}, header),
+        (INVOKE_LLM_TASK, (blob_ref, prompts), {}, header),
+        (DB_COMMIT_TASK, ([uploaded, annotated],), commit_kwargs, {"callbacks": [cleanup, notify], "errbacks": [failed]}),
+        (DISCARD_BLOB_TASK, (blob_ref,), {}, {}),
+        (SEND_EMAIL_TASK, (committed,), {"email": "user@example.com"}, {}),
+    ]
+    results = {
+        UPLOAD_TASK: uploaded,
+        INVOKE_LLM_TASK: annotated,
+        DB_COMMIT_TASK: committed,
+        DISCARD_BLOB_TASK: None,
+        SEND_EMAIL_TASK: f"Notification queued for user@example.com for task {task_ids[0]}",
+    }
+    return messages, results
+
+
+def frame(message, serializer: str) -> tuple[bytes, bytes]:
+    """Returns the serialized body of a task message and the message as stored in the Redis queue list."""
+    content_type, encoding, body = dumps(message.body, serializer=serializer)
+    raw = body.encode() if isinstance(body, str) else body
+    # Like kombu's virtual transport: the body is base64 encoded inside a JSON envelope
+    stored = json.dumps({
+        "body": base64.b64encode(raw).decode(),
+        "content-encoding": encoding,
+        "content-type": content_type,
+        "headers": message.headers,
+        "properties": {
+            **message.properties,
+            "delivery_mode": 2,
+            "delivery_info": {"exchange": "", "routing_key": "io"},
+            "priority": 0,
+            "body_encoding": "base64",
+            "delivery_tag": str(uuid.uuid4()),
+        },
+    })
+    return raw, stored.encode()
+
+
+def measure(args: argparse.Namespace, name: str, spec: dict) -> dict:
+    app = Celery("benchmark", broker="redis://", backend="redis://")
+    app.conf.update(result_serializer=spec["serializer"], accept_content=["json", "msgpack"])
+    backend = app.backend
+    messages, results = job(args, spec["compact"])
+
+    built = [
+        app.amqp.as_task_v2(str(uuid.uuid4()), task_name, args=task_args, kwargs=task_kwargs, **options)
+        for task_name, task_args, task_kwargs, options in messages
+    ]
+    framed = [frame(message, spec["serializer"]) for message in built]
+    metas, stored = [], {}
+    for task_name, result in results.items():
+        if task_name in spec["stored"]:
+            task_id = str(uuid.uuid4())
+            meta = backend._get_result_meta(result=result, state="SUCCESS", traceback=None, request=None)
+            metas.append({**meta, "task_id": task_id})
+            stored[backend.get_key_for_task(task_id)] = backend.encode(metas[-1])
+    # The chord callback collects the header results from a list that is deleted once it ran
+    chord_bytes = sum(len(backend.encode([1, str(uuid.uuid4()), "SUCCESS", results[task]])) for task in (UPLOAD_TASK, INVOKE_LLM_TASK))
+
+    # Every message is encoded by its producer and decoded by a worker, every result once each way
+    timings = []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        for message in built:
+            content_type, encoding, body = dumps(message.body, serializer=spec["serializer"])
+            loads(body, content_type, encoding, accept={content_type})
+        for meta in metas:
+            backend.decode(backend.encode(meta))
+        timings.append(time.perf_counter() - started)
+
+    report = {
+        "serializer": spec["serializer"],
+        "messages": len(framed),
+        "body_bytes": sum(len(body) for body, _ in framed),
+        "broker_bytes": sum(len(message) for _, message in framed),
+        "broker_bytes_by_task": {task_name.rsplit(".", 1)[-1]: len(message) for (task_name, *_), (_, message) in zip(messages, framed)},
+        "stored_results": len(stored),
+        "result_bytes": sum(len(key) + len(value) for key, value in stored.items()),
+        "chord_bytes": chord_bytes,
+        "serialization_us": statistics.median(timings) * 1e6,
+    }
+    if args.redis_url:
+        report["redis_memory_bytes"] = redis_memory(args.redis_url, name, [message for _, message in framed], stored)
+    return report
+
+
+def redis_memory(url: str, name: str, messages: list[bytes], results: dict[bytes, bytes]) -> dict[str, int]:
+    """Writes the messages and results of one job to Redis and returns their MEMORY USAGE."""
+    import redis
+
+    client = redis.Redis.from_url(url)
+    prefix = f"benchmark:serialization:{name}:{uuid.uuid4().hex}:"
+    keys = {"queue": [], "results": []}
+    try:
+        for index, message in enumerate(messages):
+            key = f"{prefix}queue:{index}"
+            client.lpush(key, message)
+            keys["queue"].append(key)
+        for key, value in results.items():
+            key = prefix + key.decode()
+            client.set(key, value, ex=60)
+            keys["results"].append(key)
+        return {kind: sum(client.memory_usage(key) or 0 for key in kind_keys) for kind, kind_keys in keys.items()}
+    finally:
+        if keys["queue"] or keys["results"]:
+            client.delete(*keys["queue"], *keys["results"])
+
+
+def run(args: argparse.Namespace) -> dict:
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "prompts": args.prompts,
+        "annotation_chars": args.annotation_chars,
+        "formats": {name: measure(args, name, spec) for name, spec in FORMATS.items()},
+    }
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Broker bytes, stored results and serialization time of one annotation job")
+    parser.add_argument("--prompts", type=int, default=1, help="Prompts of the image")
+    parser.add_argument("--annotation-chars", type=int, default=600, help="Length of every annotation")
+    parser.add_argument("--rounds", type=int, default=200, help="Decode/encode rounds to time")
+    parser.add_argument("--redis-url", help="Redis to read MEMORY USAGE from, e.g. redis://localhost:6379/0")
+    parser.add_argument("--output", help="Report file, defaults to benchmarks/results/<time>-serialization-<commit>.json")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    report = run(args)
+    before, after = report["formats"]["before"], report["formats"]["after"]
+    rows = ["broker_bytes", "body_bytes", "stored_results", "result_bytes", "chord_bytes", "serialization_us"]
+    print(f"{'per job':22} {'before':>10} {'after':>10} {'change':>8}")
+    for row in rows:
+        change = f"{(after[row] - before[row]) / before[row]:+.0%}" if before[row] else ""
+        print(f"{row:22} {before[row]:>10.0f} {after[row]:>10.0f} {change:>8}")
+    if "redis_memory_bytes" in after:
+        for kind in ("queue", "results"):
+            old, new = before["redis_memory_bytes"][kind], after["redis_memory_bytes"][kind]
+            print(f"{'redis ' + kind + ' bytes':22} {old:>10.0f} {new:>10.0f} {(new - old) / old if old else 0:>+8.0%}")
+    output = args.output or os.path.join(
+        os.path.dirname(__file__),
+        "results",
+        f"{datetime.now():%Y%m%d-%H%M%S}-serialization-{report['commit'] or 'unknown'}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,57 +1,108 @@
-import requests
+import json
+import asyncio
+from urllib.parse import quote
 import cv2
-import time
+import websockets
 
-# Open the camera
-cap = cv2.VideoCapture(0)
+port = 8000
+url = "ws://localhost"
+camera_id = "camera-0"
+email = ""
+prompt_set = "" # name of a PROMPT_SETS entry, empty for DEFAULT_PROMPT
+rate = 2 # fps, unchanged frames are skipped by the server
+max_interval = 10 # seconds between frames when the server is busy
+jpeg_quality = 85
 
-# Check if camera opened successfully
-if not cap.isOpened():
-    print("Error: Could not open camera.")
-    exit()
+# Seconds between captured frames, stretched while the server reports a backlog
+pacing = {"interval": 1 / rate}
 
 
-port = 8000
-url = "http://localhost"
-rate = 0.25 # fps
+def adapt_rate(message: dict) -> None:
+    """Slows the capture down to the server's estimated wait, and backs off when refused."""
+    if message.get("retry_after"):
+        pacing["interval"] = min(max(1 / rate, message["retry_after"]), max_interval)
+    elif "estimated_wait" in message:
+        # A few frames may wait at once, so pace by a fraction of the backlog
+        pacing["interval"] = min(max(1 / rate, message["estimated_wait"] / 4), max_interval)
 
-is_configured = False
 
-try:
-    print("Starting continuous frame capture. Press Ctrl+C to stop.")
-    
+async def capture_frames(cap: cv2.VideoCapture, frames: asyncio.Queue) -> None:
+    """Captures and encodes frames off the event loop, keeping only the newest if sending lags."""
     while True:
-        # Capture frame from camera
-        ret, frame = cap.read()
-        
+        ret, frame = await asyncio.to_thread(cap.read)
         if not ret:
             print("Error: Failed to capture frame")
+            await asyncio.sleep(pacing["interval"])
             continue
-        
+
         # Encode the frame as JPEG
-        _, img_encoded = cv2.imencode('.jpg', frame)
-        
-        # Send to the server
-        files = {'file': ('image.jpg', img_encoded.tobytes(), 'image/jpeg')}
-        
-        try:
-            # Using port 80 instead of 8000
-            response = requests.post(
-                f'{url}:{port}/annotate', 
-                files=files,
-                timeout=600  # Add timeout to prevent blocking
-            )
-            print(f"Frame sent. Response: {response.json()}")
-        except requests.exceptions.RequestException as e:
-            print(f"Error sending frame: {e}")
+        _, img_encoded = await asyncio.to_thread(
+            cv2.imencode, '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        )
+        if frames.full():
+            frames.get_nowait()
+        frames.put_nowait(img_encoded.tobytes())
 
-        
-        
         # Control frame rate
-        time.sleep(1/rate) 
+        await asyncio.sleep(pacing["interval"])
+
+
+async def send_frames(ws, frames: asyncio.Queue) -> None:
+    """Sends frames as soon as they are captured, without waiting for earlier results."""
+    while True:
+        await ws.send(await frames.get())
+
+
+async def receive_results(ws) -> None:
+    """Prints the messages the server pushes back for the frames of this stream."""
+    async for raw in ws:
+        message = json.loads(raw)
+        kind, seq = message["type"], message.get("seq")
+        adapt_rate(message)
+        if kind == "accepted":
+            print(
+                f"Frame {seq} accepted (distance {message['distance']}), task {message['id']}, "
+                f"estimated wait {message['estimated_wait']:.1f}s"
+            )
+        elif kind == "skipped":
+            print(f"Frame {seq} skipped ({message['reason']}), next frame in {pacing['interval']:.1f}s")
+        elif kind == "result":
+            print(f"Frame {seq} annotated [{message['prompt']}]: {message['annotation']} ({message['file_url']})")
+        else:
+            print(f"Frame {seq} error: {message.get('detail')}")
+
+
+async def main() -> None:
+    # Open the camera
+    cap = cv2.VideoCapture(0)
+
+    # Check if camera opened successfully
+    if not cap.isOpened():
+        print("Error: Could not open camera.")
+        return
+
+    frames: asyncio.Queue = asyncio.Queue(maxsize=2)
+    endpoint = f"{url}:{port}/ws/stream/{quote(camera_id)}?email={quote(email)}&prompt_set={quote(prompt_set)}"
+    try:
+        print("Starting continuous frame capture. Press Ctrl+C to stop.")
+        capture = asyncio.create_task(capture_frames(cap, frames))
+        while True:
+            try:
+                # One connection for the whole stream instead of a request per frame
+                async with websockets.connect(endpoint, max_size=None) as ws:
+                    print(f"Connected to {endpoint}")
+                    await asyncio.gather(send_frames(ws, frames), receive_results(ws))
+            except (OSError, websockets.ConnectionClosed) as e:
+                print(f"Connection lost: {e}, reconnecting in 2s")
+                await asyncio.sleep(2)
+    finally:
+        capture.cancel()
+        # Release the camera
+        cap.release()
+
 
-except KeyboardInterrupt:
-    print("\nStopping frame capture")
-finally:
-    # Release the camera
-    cap.release()
\ No newline at end of file
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nStopping frame capture")
\ No newline at end of file
@@ -0,0 +1,128 @@
+import time
+import asyncio
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+from app import admission as admission_module
+from app.admission import TOKEN_BUCKET_SCRIPT, AdmissionController, task_finished, task_started
+from app.config import settings
+from app.main import app
+from app.worker import INFERENCE_QUEUE
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+@pytest.fixture
+def server(monkeypatch) -> fakeredis.FakeServer:
+    """Points admission control at a fakeredis server, with the load re-read on every request."""
+    server = fakeredis.FakeServer()
+    aredis = fakeredis.aioredis.FakeRedis(server=server)
+    monkeypatch.setattr(admission_module, "redis", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(admission_module, "aredis", aredis)
+    monkeypatch.setattr(admission_module, "token_bucket", aredis.register_script(TOKEN_BUCKET_SCRIPT))
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(settings, "ADMISSION_REFRESH_MS", 0)
+    monkeypatch.setattr(settings, "ADMISSION_RATE_PER_SECOND", 0)
+    return server
+
+
+def load_inference(server, depth: int, in_flight: int, runtime: float) -> None:
+    """Queues `depth` inference messages while `in_flight` tasks of `runtime` seconds are running."""
+    task_finished(INFERENCE_QUEUE, "finished", runtime)
+    for n in range(in_flight):
+        task_started(INFERENCE_QUEUE, f"running-{n}")
+    if depth:
+        fakeredis.FakeRedis(server=server).rpush(INFERENCE_QUEUE, *[b"message"] * depth)
+
+
+def test_deep_queue_is_refused(server, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_QUEUE_DEPTH", 5)
+    load_inference(server, depth=6, in_flight=2, runtime=0.5)
+
+    decision = asyncio.run(AdmissionController().admit("client"))
+
+    assert not decision.admitted
+    assert decision.reason == "saturated"
+    # One message over the limit, drained by two slots at 0.5s each
+    assert decision.retry_after == pytest.approx(0.25)
+    assert decision.estimated_wait == pytest.approx(1.5)
+
+
+def test_bucket_refills_over_time(server, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_RATE_PER_SECOND", 20)
+    monkeypatch.setattr(settings, "ADMISSION_BURST", 2)
+    controller = AdmissionController()
+
+    async def admit_after(delay: float):
+        await asyncio.sleep(delay)
+        return await controller.admit("client")
+
+    async def run():
+        return [await admit_after(delay) for delay in (0, 0, 0, 0.1)]
+
+    first, second, refused, refilled = asyncio.run(run())
+
+    assert first.admitted and second.admitted
+    assert not refused.admitted
+    assert refused.reason == "rate_limited"
+    assert 0 < refused.retry_after <= 1 / 20
+    assert refilled.admitted
+
+
+def test_buckets_are_per_client(server, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_RATE_PER_SECOND", 1)
+    monkeypatch.setattr(settings, "ADMISSION_BURST", 1)
+    controller = AdmissionController()
+
+    async def run():
+        return [(await controller.admit(client)).admitted for client in ("a", "a", "b")]
+
+    assert asyncio.run(run()) == [True, False, True]
+
+
+@pytest.fixture
+def client() -> TestClient:
+    return TestClient(app)
+
+
+def post(client: TestClient):
+    return client.post("/annotate", files={"file": ("photo.jpg", JPEG, "image/jpeg")}, data={"email": "user@example.com"})
+
+
+def test_admitted_upload_reports_the_estimated_wait(server, client, sent):
+    load_inference(server, depth=4, in_flight=2, runtime=3.0)
+
+    response = post(client)
+
+    assert response.status_code == 200
+    assert response.headers["X-Estimated-Wait"] == "6.0"
+
+
+def test_saturated_upload_is_refused_with_retry_after(server, client, sent, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_MAX_WAIT_SECONDS", 10)
+    load_inference(server, depth=10, in_flight=2, runtime=3.0)
+
+    response = post(client)
+
+    assert response.status_code == 429
+    # 15s of backlog against a 10s limit
+    assert response.headers["Retry-After"] == "5"
+    assert response.json()["reason"] == "saturated"
+    assert response.json()["estimated_wait"] == pytest.approx(15.0)
+    assert sent == []
+
+
+def test_rate_limited_upload_is_refused_with_retry_after(server, client, sent, monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_RATE_PER_SECOND", 0.5)
+    monkeypatch.setattr(settings, "ADMISSION_BURST", 1)
+
+    assert post(client).status_code == 200
+    started = time.monotonic()
+    response = post(client)
+
+    assert response.status_code == 429
+    assert response.json()["reason"] == "rate_limited"
+    # One token at 0.5 tokens/s, less the time since the first request
+    assert response.json()["retry_after"] == pytest.approx(2.0 - (time.monotonic() - started), abs=0.2)
+    assert response.headers["Retry-After"] == "2"
+    assert len(sent) == 1
\ No newline at end of file
@@ -0,0 +1,105 @@
+import socket
+from email import message_from_bytes, policy
+import fakeredis
+import pytest
+from aiosmtpd.controller import Controller
+from app import notifications, tasks
+from app.config import settings
+from app.email import SMTPPool, smtp_pool
+from app.envelope import JobEnvelope
+from app.runtime import runtime
+
+EMAIL = "user@example.com"
+
+
+class Sink:
+    """aiosmtpd handler that keeps every message with the session it arrived on."""
+
+    def __init__(self):
+        self.messages: list[tuple[int, bytes]] = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((id(session), envelope.content))
+        return "250 OK"
+
+    @property
+    def sessions(self) -> int:
+        return len({session for session, _ in self.messages})
+
+    def html(self, n: int) -> str:
+        return message_from_bytes(self.messages[n][1], policy=policy.default).get_body(("html",)).get_content()
+
+    def subject(self, n: int) -> str:
+        return message_from_bytes(self.messages[n][1], policy=policy.default)["Subject"]
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    handler = Sink()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", port)
+    monkeypatch.setattr(settings, "SMTP_TLS", False)
+    monkeypatch.setattr(settings, "SMTP_SSL", False)
+    monkeypatch.setattr(settings, "SMTP_USER", None)
+    monkeypatch.setattr(settings, "EMAILS_FROM_EMAIL", "pipeline@example.com")
+    yield handler
+    smtp_pool.close()
+    controller.stop()
+
+
+def test_pool_reuses_its_connection(sink):
+    pool = SMTPPool(size=2, max_idle=60, max_messages=100)
+    for n in range(3):
+        pool.send("pipeline@example.com", [EMAIL], f"Subject: {n}\r\n\r\nbody")
+    pool.close()
+
+    assert len(sink.messages) == 3
+    assert sink.sessions == 1
+
+
+def test_pool_retires_a_connection_after_max_messages(sink):
+    pool = SMTPPool(size=2, max_idle=60, max_messages=2)
+    for n in range(3):
+        pool.send("pipeline@example.com", [EMAIL], f"Subject: {n}\r\n\r\nbody")
+    pool.close()
+
+    assert sink.sessions == 2
+
+
+@pytest.fixture
+def digest(monkeypatch, sink):
+    """Runs the notification tasks against fakeredis, and records the scheduled flushes."""
+    monkeypatch.setattr(notifications, "redis", fakeredis.FakeRedis())
+    monkeypatch.setattr(settings, "EMAIL_DIGEST_WINDOW_SECONDS", 30)
+    scheduled: list = []
+    monkeypatch.setattr(tasks.flush_notifications_task, "apply_async", lambda **kwargs: scheduled.append(kwargs))
+    yield scheduled
+    runtime.stop()
+
+
+def test_first_notification_is_sent_right_away(sink, digest):
+    tasks.send_email_task.run(JobEnvelope(task_ids=["first"]).pack(), email=EMAIL)
+
+    assert len(sink.messages) == 1
+    assert "/results/first" in sink.html(0)
+    assert digest == []
+
+
+def test_notifications_within_the_window_are_coalesced(sink, digest):
+    for task_id in ["first", "second", "third"]:
+        tasks.send_email_task.run(JobEnvelope(task_ids=[task_id]).pack(), email=EMAIL)
+
+    assert len(sink.messages) == 1
+    assert digest == [{"args": [EMAIL], "countdown": 30}]
+
+    tasks.flush_notifications_task.run(EMAIL)
+
+    assert len(sink.messages) == 2
+    assert sink.subject(1).endswith("2 results ready")
+    assert "/results/second" in sink.html(1) and "/results/third" in sink.html(1)
+    assert sink.sessions == 1
\ No newline at end of file
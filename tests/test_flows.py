@@ -0,0 +1,78 @@
+import io
+import time
+import threading
+import contextlib
+import pytest
+from celery import group
+from fastapi import HTTPException
+from app import flows
+from app.client import DB_COMMIT_TASK, DISCARD_BLOB_TASK, SEND_EMAIL_TASK, FLOW_FAILED_TASK
+from app.config import settings
+from app.ingest import IngestedUpload
+
+
+def upload() -> IngestedUpload:
+    return IngestedUpload(file=io.BytesIO(b"\xff\xd8\xff"), filename="photo.jpg", size=3, digest="0" * 64, extension=".jpg")
+
+
+@pytest.mark.parametrize("email", ["", "user@example.com"])
+def test_header_failure_runs_errback(sent, cleanup, fail_header, email):
+    flow = flows.full_annotation_flow(upload(), ["Describe this image"], email)
+
+    fail_header(sent[0])
+
+    assert cleanup["released"] and cleanup["discarded"] == ["spool:0b7c8ed2a5bf41e88fa002a44dd6fc8a"]
+    assert [call["task_ids"] for call in cleanup["failed"]] == [flow.ids]
+    assert [task_id for task_id, _ in cleanup["published"]] == flow.ids
+    assert all(result["status"] == "failed" for _, result in cleanup["published"])
+
+
+def test_email_is_linked_to_the_write(sent):
+    flows.full_annotation_flow(upload(), ["Describe this image"], "user@example.com")
+
+    body = sent[0].body
+    assert body.task == DB_COMMIT_TASK
+    assert [link.task for link in body.options["link"]] == [DISCARD_BLOB_TASK, SEND_EMAIL_TASK]
+    assert [errback.task for errback in body.options["link_error"]] == [FLOW_FAILED_TASK]
+
+
+def test_batch_entries_are_normalized_concurrently(monkeypatch):
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def prepare(upload: IngestedUpload) -> IngestedUpload:
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.1)
+        with lock:
+            running -= 1
+        if upload.filename == "broken.jpg":
+            raise HTTPException(status_code=400, detail="Invalid image.")
+        return upload
+
+    staged: list[str] = []
+    monkeypatch.setattr(settings, "IMAGE_PROCESS_WORKERS", 2)
+    monkeypatch.setattr(flows, "prepare_upload", prepare)
+    monkeypatch.setattr(flows, "stage_blob", lambda file: f"spool:{len(staged)}")
+    monkeypatch.setattr(flows, "reuse_near_duplicates", lambda upload, prompts: staged.append(upload.filename) or {})
+    monkeypatch.setattr(flows, "index_near_duplicates", lambda *args: None)
+    monkeypatch.setattr(flows, "Session", lambda engine: contextlib.nullcontext())
+    monkeypatch.setattr(flows, "add_pending_file_annotations", lambda session, batch_id, rows: None)
+    monkeypatch.setattr(flows, "start_batch_progress", lambda *args: None)
+    monkeypatch.setattr(group, "apply_async", lambda self, *args, **kwargs: None)
+
+    names = [f"{index}.jpg" for index in range(8)]
+    entries = [(name, io.BytesIO(b"\xff\xd8\xff" + bytes(64))) for name in names]
+    entries.insert(3, ("broken.jpg", io.BytesIO(b"\xff\xd8\xff" + bytes(64))))
+    entries.insert(5, ("notes.txt", io.BytesIO(b"not an image")))
+    started = time.perf_counter()
+    batch = flows.batch_annotation_flow(entries, ["Describe this image"])
+    elapsed = time.perf_counter() - started
+
+    assert staged == names
+    assert [image["filename"] for image in batch["images"]] == names
+    assert sorted(item["filename"] for item in batch["rejected"]) == ["broken.jpg", "notes.txt"]
+    assert peak == 4
+    assert elapsed < 9 * 0.1 / 2
\ No newline at end of file
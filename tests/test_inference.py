@@ -0,0 +1,62 @@
+import time
+import asyncio
+import pytest
+from app import inference
+from app.config import settings
+from app.inference import OllamaPool, submit_inference
+from app.runtime import WorkerRuntime
+
+
+@pytest.fixture
+def calls(monkeypatch) -> list[float]:
+    """Runs inference on a fresh runtime, with a pool whose calls sleep for their input in seconds."""
+    runtime = WorkerRuntime()
+    monkeypatch.setattr(inference, "runtime", runtime)
+    started: list[float] = []
+
+    async def ainvoke(seconds: float, tokens=None) -> float:
+        started.append(time.perf_counter())
+        if seconds < 0:
+            raise ConnectionError("Ollama host went away")
+        await asyncio.sleep(seconds)
+        return seconds
+
+    monkeypatch.setattr(inference.pool, "ainvoke", ainvoke)
+    yield started
+    runtime.stop()
+
+
+def test_lone_call_starts_right_away(calls):
+    submitted = time.perf_counter()
+    assert submit_inference(0.0).result(timeout=1) == 0.0
+    # No batch window to wait out before the call is made
+    assert calls[0] - submitted < 0.01
+
+
+def test_calls_do_not_wait_for_each_other(calls):
+    started = time.perf_counter()
+    slow = submit_inference(1.0)
+    fast = submit_inference(0.05)
+    failed = submit_inference(-1)
+
+    assert fast.result(timeout=2) == 0.05
+    assert time.perf_counter() - started < 0.5
+    assert not slow.done()
+    with pytest.raises(ConnectionError):
+        failed.result(timeout=1)
+    assert slow.result(timeout=2) == 1.0
+
+
+@pytest.mark.parametrize("interval, in_rotation", [(0, [True, True]), (3600, [True, False])])
+def test_failed_warm_up_waits_for_a_health_check(monkeypatch, interval, in_rotation):
+    # Without health checks nothing could bring a host back, so it must stay in rotation
+    monkeypatch.setattr(settings, "OLLAMA_HEALTH_INTERVAL_SECONDS", interval)
+    pool = OllamaPool(["http://ollama-a:11434", "http://ollama-b:11434"], max_concurrency=2)
+
+    async def warm(endpoint) -> bool:
+        return endpoint.url == "http://ollama-a:11434"
+
+    monkeypatch.setattr(pool, "_warm", warm)
+    asyncio.run(pool.warm_up())
+
+    assert [endpoint.in_rotation for endpoint in pool.endpoints] == in_rotation
\ No newline at end of file
@@ -0,0 +1,59 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+@pytest.fixture
+def client(monkeypatch) -> TestClient:
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", False)
+    return TestClient(app)
+
+
+def test_failed_web_upload_is_recorded(client, sent, cleanup, fail_header):
+    # The web form always sends an email, which used to drop the errback of the chord
+    response = client.post(
+        "/annotate",
+        files={"file": ("photo.jpg", JPEG, "image/jpeg")},
+        data={"email": "user@example.com"},
+    )
+    assert response.status_code == 200
+
+    fail_header(sent[0])
+
+    ids = response.json()["ids"]
+    assert [call["task_ids"] for call in cleanup["failed"]] == [ids]
+    assert [(task_id, result["status"]) for task_id, result in cleanup["published"]] == [(task_id, "failed") for task_id in ids]
+
+
+def test_chunked_upload_over_limit_is_refused(client, sent, monkeypatch):
+    # Without a Content-Length only the bytes counted off the request stream can stop it
+    monkeypatch.setattr(settings, "MAX_UPLOAD_SIZE", 1024)
+    boundary = "upload-boundary"
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"photo.jpg\"\r\n"
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode()
+
+    def body():
+        yield head + JPEG
+        for _ in range(64):
+            yield b"\x00" * 4096
+        yield f"\r\n--{boundary}--\r\n".encode()
+
+    response = client.post(
+        "/annotate",
+        content=body(),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    assert response.status_code == 413
+    assert response.json()["detail"].startswith("File too large")
+    assert sent == []
+
+def test_batch_page_renders(client):
+    response = client.get("/batches/batch")
+
+    assert response.status_code == 200
+    assert "/api/batches/batch" in response.text
\ No newline at end of file
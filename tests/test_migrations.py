@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from app.db import FileAnnotation, run_migrations
+
+# The table as the first release created it with `create_all`
+BASELINE = """
+CREATE TABLE fileannotation (
+    task_id VARCHAR NOT NULL PRIMARY KEY UNIQUE,
+    file_url VARCHAR NOT NULL,
+    annotation VARCHAR
+)
+"""
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pipeline.db'}")
+    yield engine
+    engine.dispose()
+
+
+def columns(engine) -> dict[str, dict]:
+    return {column["name"]: column for column in inspect(engine).get_columns("fileannotation")}
+
+
+def test_baseline_table_is_upgraded(engine):
+    with engine.begin() as connection:
+        connection.execute(text(BASELINE))
+        connection.execute(text("INSERT INTO fileannotation VALUES ('done', 'https://cdn/a.jpg', 'A cat')"))
+    with engine.begin() as connection:
+        run_migrations(connection)
+
+    assert set(columns(engine)) == set(FileAnnotation.__table__.columns.keys())
+    assert columns(engine)["file_url"]["nullable"]
+    with engine.begin() as connection:
+        assert connection.execute(text("SELECT status FROM fileannotation")).scalar_one() == "completed"
+        # Pending batch rows have no file_url yet
+        connection.execute(text("INSERT INTO fileannotation (task_id, status) VALUES ('pending', 'pending')"))
+
+
+def test_new_database_gets_the_current_schema(engine):
+    with engine.begin() as connection:
+        run_migrations(connection)
+    with engine.begin() as connection:
+        run_migrations(connection)
+
+    assert set(columns(engine)) == set(FileAnnotation.__table__.columns.keys())
+    assert {index["name"] for index in inspect(engine).get_indexes("fileannotation")} == {
+        index.name for index in FileAnnotation.__table__.indexes
+    }
\ No newline at end of file
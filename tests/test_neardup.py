@@ -0,0 +1,67 @@
+import random
+import pytest
+from app.neardup import HASH_BITS, MultiIndexHashTable, NearDuplicateCache, to_signed64, to_unsigned64
+
+
+def flip(value: int, bits: int, rng: random.Random) -> int:
+    for position in rng.sample(range(HASH_BITS), bits):
+        value ^= 1 << position
+    return value
+
+
+def linear_scan(hashes: list[int], value: int) -> int:
+    return min((entry ^ value).bit_count() for entry in hashes)
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 4, 7, 10])
+def test_search_matches_a_linear_scan(max_distance):
+    rng = random.Random(max_distance)
+    index = MultiIndexHashTable(max_distance)
+    hashes = [rng.getrandbits(HASH_BITS) for _ in range(2000)]
+    for n, value in enumerate(hashes):
+        index.add(value, f"task-{n}")
+
+    for distance in range(max_distance + 2):
+        for _ in range(50):
+            query = flip(rng.choice(hashes), distance, rng)
+            expected = linear_scan(hashes, query)
+            match = index.search(query)
+            if expected > max_distance:
+                assert match is None
+            else:
+                task_id, found = match
+                assert found == expected
+                assert (hashes[int(task_id.removeprefix("task-"))] ^ query).bit_count() == found
+
+
+@pytest.mark.parametrize("max_distance", [4, 10])
+def test_search_stops_at_max_distance(max_distance):
+    rng = random.Random(1)
+    value = rng.getrandbits(HASH_BITS)
+    index = MultiIndexHashTable(max_distance)
+    index.add(value, "task")
+
+    for distance in range(max_distance + 1):
+        assert index.search(flip(value, distance, rng)) == ("task", distance)
+    assert index.search(flip(value, max_distance + 1, rng)) is None
+
+
+def test_empty_index_finds_nothing():
+    assert MultiIndexHashTable(10).search(0) is None
+
+
+@pytest.mark.parametrize("value", [0, 1, 2**63 - 1, 2**63, 2**64 - 1, 0x8F3C_0000_1234_ABCD])
+def test_signed_round_trip(value):
+    signed = to_signed64(value)
+    assert -(2**63) <= signed < 2**63
+    assert to_unsigned64(signed) == value
+    assert to_signed64(to_unsigned64(signed)) == signed
+
+
+def test_entries_are_isolated_per_prompt_and_model():
+    cache = NearDuplicateCache(max_distance=10)
+    cache.add(0xFFFF_0000_FFFF_0000, "Describe this image", "llava", "task")
+
+    assert cache.lookup(0xFFFF_0000_FFFF_0001, "Describe this image", "llava") == ("task", 1)
+    assert cache.lookup(0xFFFF_0000_FFFF_0001, "Count the people", "llava") is None
+    assert cache.lookup(0xFFFF_0000_FFFF_0001, "Describe this image", "gemma3") is None
\ No newline at end of file
@@ -0,0 +1,29 @@
+import pytest
+from app.runtime import MicroBatcher
+
+
+def test_inputs_within_the_window_share_one_dispatch():
+    batches: list[list[int]] = []
+
+    def dispatch(items: list[int]) -> list[int]:
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(dispatch, max_batch_size=4, window=0.05)
+    futures = [batcher.submit(item) for item in range(5)]
+
+    assert [future.result(timeout=1) for future in futures] == [0, 2, 4, 6, 8]
+    # A full batch is dispatched without waiting out the window
+    assert batches == [[0, 1, 2, 3], [4]]
+
+
+def test_failed_input_only_fails_its_own_future():
+    batcher = MicroBatcher(
+        lambda items: [ValueError(item) if item < 0 else item for item in items], max_batch_size=8, window=0.05
+    )
+    futures = [batcher.submit(item) for item in (1, -1, 2)]
+
+    assert futures[0].result(timeout=1) == 1
+    assert futures[2].result(timeout=1) == 2
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=1)
\ No newline at end of file
@@ -0,0 +1,84 @@
+import asyncio
+import itertools
+from fastapi import HTTPException
+from kombu.exceptions import OperationalError
+from app import stream
+from app.config import settings
+from app.flows import AnnotationFlow
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 64
+
+
+class FakeWebSocket:
+    """Plays back frames (bytes) and text messages (str), then disconnects, and records what is sent."""
+
+    client = None
+
+    def __init__(self, frames: list[bytes | str]):
+        self.frames = list(frames)
+        self.sent: list[dict] = []
+
+    async def receive(self) -> dict:
+        if not self.frames:
+            return {"type": "websocket.disconnect", "code": 1000}
+        frame = self.frames.pop(0)
+        if isinstance(frame, str):
+            return {"type": "websocket.receive", "text": frame}
+        return {"type": "websocket.receive", "bytes": frame}
+
+    async def send_json(self, message: dict) -> None:
+        self.sent.append(message)
+
+
+def test_failed_frames_keep_the_stream_open(monkeypatch):
+    outcomes = iter([
+        HTTPException(status_code=413, detail="File too large."),
+        OperationalError("Error 111 connecting to redis:6379. Connection refused."),
+        AnnotationFlow(image_id="image", ids=["task"], prompts=["Describe this image"]),
+    ])
+
+    def flow(upload, prompts, email=""):
+        outcome = next(outcomes)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    hashes = itertools.count(step=2**32 - 1)
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", False)
+    monkeypatch.setattr(stream, "dhash", lambda data: next(hashes))
+    monkeypatch.setattr(stream, "full_annotation_flow", flow)
+
+    async def lookup(task_id: str) -> dict:
+        return {"annotation": "A cat", "file_url": "https://cdn/image.jpg", "status": "completed"}
+
+    websocket = FakeWebSocket([JPEG] * 3)
+    camera = stream.CameraStream(websocket, "camera", ["Describe this image"], "", lookup)  # type: ignore[arg-type]
+
+    asyncio.run(camera.run())
+
+    assert [(message["type"], message["seq"]) for message in websocket.sent[:3]] == [
+        ("error", 1), ("error", 2), ("accepted", 3),
+    ]
+    assert websocket.sent[0]["detail"] == "File too large."
+    assert camera.received == 3 and camera.accepted == 1
+
+
+def test_text_message_keeps_the_stream_open(monkeypatch):
+    monkeypatch.setattr(settings, "ADMISSION_ENABLED", False)
+    monkeypatch.setattr(stream, "dhash", lambda data: 0)
+    monkeypatch.setattr(
+        stream, "full_annotation_flow",
+        lambda upload, prompts, email="": AnnotationFlow(image_id="image", ids=["task"], prompts=prompts),
+    )
+
+    async def lookup(task_id: str) -> dict:
+        return {"annotation": "A cat", "file_url": "https://cdn/image.jpg", "status": "completed"}
+
+    websocket = FakeWebSocket(['{"prompt": "hello"}', JPEG])
+    camera = stream.CameraStream(websocket, "camera", ["Describe this image"], "", lookup)  # type: ignore[arg-type]
+
+    asyncio.run(camera.run())
+
+    assert [(message["type"], message["seq"]) for message in websocket.sent[:2]] == [("error", 1), ("accepted", 2)]
+    assert websocket.sent[0]["detail"] == "Frames must be sent as binary messages"
+    assert camera.accepted == 1
\ No newline at end of file
@@ -0,0 +1,58 @@
+import pytest
+from celery.exceptions import Retry
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import tasks
+from app.envelope import JobEnvelope
+
+
+@pytest.fixture
+def commit(monkeypatch):
+    """Runs `db_commit_file_annotation` in a task context, with a database write that raises."""
+    retries: list[dict] = []
+
+    def retry(**kwargs):
+        retries.append(kwargs)
+        raise Retry()
+
+    monkeypatch.setattr(tasks.db_commit_file_annotation, "retry", retry)
+    monkeypatch.setattr(tasks, "cache_result", lambda task_id, result: None)
+    monkeypatch.setattr(tasks, "publish_result", lambda task_id, result: None)
+
+    def run(error: Exception):
+        def save(rows):
+            raise error
+
+        monkeypatch.setattr(tasks, "save_file_annotations", save)
+        results = [JobEnvelope(image_id="image", file_url="https://cdn/image.jpg").pack(), JobEnvelope(annotations={"task": "A cat"}).pack()]
+        tasks.db_commit_file_annotation.push_request(retries=0)
+        try:
+            tasks.db_commit_file_annotation.run(results, image_id="image", prompts={"task": "Describe this image"})
+        finally:
+            tasks.db_commit_file_annotation.pop_request()
+
+    run.retries = retries
+    return run
+
+
+def test_lost_connection_is_retried(commit):
+    with pytest.raises(Retry):
+        commit(OperationalError("INSERT", {}, Exception("server closed the connection unexpectedly")))
+    assert len(commit.retries) == 1
+
+
+def test_refused_write_is_not_retried(commit):
+    with pytest.raises(IntegrityError):
+        commit(IntegrityError("INSERT", {}, Exception("violates not-null constraint")))
+    assert commit.retries == []
+
+def test_batch_email_links_to_the_batch_page(monkeypatch):
+    sent: list[dict] = []
+
+    async def send_email(**kwargs):
+        sent.append(kwargs)
+
+    monkeypatch.setattr(tasks, "send_email", send_email)
+    tasks.send_batch_email_task.run("batch", "user@example.com")
+    tasks.runtime.stop()
+
+    assert f"{tasks.settings.FRONTEND_HOST}/batches/batch" in sent[0]["html_content"]
\ No newline at end of file